@@ -0,0 +1,85 @@
+"""
+Measures what LLMAgent's cache_prefix saves per decision: tokenizer time and encoder
+cost (tokens and time) with and without the cached rules/instructions/strategy prefix.
+
+    uv run python -m benchmarks.prefix_cache --model /path/to/model --tokenizer /path/to/tokenizer
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+
+import torch
+
+import uno
+from uno.agents.model_registry import DEFAULT_MODEL_PATH, DEFAULT_TOKENIZER_PATH
+
+def sample_prompts(n: int, seed: int) -> list[dict]:
+    "Prompts from the current player's point of view in random games of bots."
+    random.seed(seed)
+    prompts = []
+    while len(prompts) < n:
+        server = uno.UnoServer(
+            [uno.RandomAgent(seed=len(prompts) + i) for i in range(4)], log_level=logging.ERROR
+        )
+        for _ in range(random.randint(0, 30)):
+            server.tick(headless=True)
+        if not server.playing:
+            continue
+        p = server.next_player
+        prompts.append(p.create_prompt(server.build_context(p, True)))
+    return prompts
+
+def _time(f, prompts: list[dict]) -> float:
+    "Milliseconds per prompt."
+    start = time.perf_counter()
+    for d in prompts:
+        f(d)
+    return (time.perf_counter() - start) * 1000 / len(prompts)
+
+def run(model_path: str, tokenizer_path: str, n: int=200, seed: int=0) -> dict:
+    full = uno.LLMAgent(model_path=model_path, tokenizer_path=tokenizer_path)
+    cached = uno.LLMAgent(
+        model_path=model_path, tokenizer_path=tokenizer_path, cache_prefix="encoder"
+    )
+    prompts = [d | {"strategy": full.strategy} for d in sample_prompts(n, seed)]
+    tokenizer, encoder = full.tokenizer, full.model.get_encoder()
+
+    def full_ids(d):
+        return tokenizer(full.build_prompt(d), return_tensors="pt").input_ids
+
+    def suffix_ids(d):
+        return tokenizer(full.build_suffix(d).rstrip(), return_tensors="pt").input_ids
+
+    def encode(ids):
+        with torch.no_grad():
+            encoder(input_ids=ids.to(full.model.device))
+
+    # warm up the prefix cache
+    cached.cached_inputs(prompts[0])
+
+    full_tokens = sum(full_ids(d).shape[1] for d in prompts) / n
+    suffix_tokens = sum(suffix_ids(d).shape[1] for d in prompts) / n
+    results = {
+        "decisions": n,
+        "tokenizer_ms": {"full": _time(full_ids, prompts), "suffix": _time(suffix_ids, prompts)},
+        "encoder_tokens": {"full": full_tokens, "suffix": suffix_tokens},
+        "encoder_ms": {
+            "full": _time(lambda d: encode(full_ids(d)), prompts),
+            "cached_prefix": _time(cached.cached_inputs, prompts),
+        },
+    }
+    full.close()
+    cached.close()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--tokenizer", default=DEFAULT_TOKENIZER_PATH)
+    parser.add_argument("-n", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.model, args.tokenizer, args.n, args.seed), indent=2))
@@ -0,0 +1,329 @@
+"""
+Fixed-seed, fixed-workload benchmarks for the engine, the deck, prompt building and
+training data generation (plus LLMAgent decisions if a model is given). Results are
+written as JSON so runs can be diffed against a saved baseline.
+
+    uv run python -m benchmarks.suite --out benchmarks/baselines/main.json
+    uv run python -m benchmarks.suite --compare benchmarks/baselines/main.json
+    uv run python -m benchmarks.suite --only deck prompt --scale .1
+
+Every benchmark reports how many operations per second it managed, using the best of
+a few repeats since noise only ever makes things slower. Workloads are built before
+the clock starts.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import time
+from typing import Callable
+
+import uno
+from uno.deck import Deck
+from uno.events import ListSink
+from uno.agents.model_registry import DEFAULT_TOKENIZER_PATH
+from uno.prompt import PromptBuilder
+
+# benchmark name -> function(scale, repeats) -> {label: result}
+BENCHMARKS: dict[str, Callable[[float, int], dict[str, dict]]] = {}
+
+def benchmark(f):
+    BENCHMARKS[f.__name__.removeprefix("bench_")] = f
+    return f
+
+def _best(run: Callable[[], int], repeats: int, setup: Callable[[], None] | None=None) -> dict:
+    """Times run, which returns how many operations it did. setup is called before
+    every repeat, outside of the timing.
+    """
+    best = None
+    ops = 0
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        ops = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"ops": ops, "seconds": round(best, 6), "ops_per_sec": round(ops / best, 2)}
+
+def _n(n: int, scale: float) -> int:
+    return max(1, int(n * scale))
+
+def _server(n_players: int, seed: int, **kwargs) -> uno.UnoServer:
+    return uno.UnoServer(n_players, log_level=logging.ERROR, seed=seed, **kwargs)
+
+@benchmark
+def bench_games(scale: float, repeats: int) -> dict:
+    "Whole headless games between RandomAgents."
+    n_games = _n(20, scale)
+    ticks = 0
+
+    def run():
+        nonlocal ticks
+        ticks = 0
+        for seed in range(n_games):
+            random.seed(seed)
+            agents = [uno.RandomAgent(seed=seed * 4 + i) for i in range(4)]
+            server = uno.UnoServer(agents, log_level=logging.ERROR)
+            ticks += server.play_game(headless=True, max_ticks=5000)
+        return n_games
+
+    result = _best(run, repeats)
+    result["ticks_per_sec"] = round(ticks / result["seconds"], 2)
+    return {"games": result}
+
+@benchmark
+def bench_replay(scale: float, repeats: int) -> dict:
+    "Rebuilding logged games from their events, see uno.replay."
+    n_games = _n(20, scale)
+    games = []
+    for seed in range(n_games):
+        random.seed(seed)
+        sink = ListSink()
+        agents = [uno.RandomAgent(seed=seed * 4 + i) for i in range(4)]
+        uno.UnoServer(agents, events=sink).play_game(headless=True, max_ticks=5000)
+        games.append(sink.events)
+
+    def run():
+        for events in games:
+            uno.Replay(events).seek(len(events))
+        return sum(len(events) for events in games)
+
+    return {"events": _best(run, repeats)}
+
+def _requests(action: str, n: int) -> list[tuple[uno.UnoServer, dict]]:
+    "n (server, request) pairs which make process_request do a given thing."
+    jobs = []
+    for seed in range(n):
+        server = _server(3, seed, forced_top_card="R5")
+        p = server.next_player
+        match action:
+            case "play":
+                p.hand[0] = "R7"
+                p.hand.remove("R7")
+                r = {"playerID": p.id, "action": "Play card", "card": "R7"}
+            case "play_wild":
+                p.hand[0] = "WW"
+                p.hand.remove("WW")
+                r = {"playerID": p.id, "action": "Play card", "card": "WW", "nextColor": "B"}
+            case "play_invalid":
+                p.hand[0] = "B7"
+                p.hand.remove("B7")
+                r = {"playerID": p.id, "action": "Play card", "card": "B7"}
+            case "play_not_turn":
+                other = server.players[1]
+                c = other.hand.pop()
+                r = {"playerID": other.id, "action": "Play card", "card": c}
+            case "draw":
+                r = {"playerID": p.id, "action": "Draw card"}
+            case "uno_shield":
+                del p.hand[1:]
+                r = {"playerID": p.id, "action": "Yell UNO"}
+            case "uno_catch":
+                del server.players[1].hand[1:]
+                r = {"playerID": p.id, "action": "Yell UNO"}
+            case "uno_nothing":
+                r = {"playerID": p.id, "action": "Yell UNO"}
+        jobs.append((server, r))
+    return jobs
+
+@benchmark
+def bench_process_request(scale: float, repeats: int) -> dict:
+    "process_request per kind of request, each on a fresh server."
+    n = _n(2000, scale)
+    results = {}
+    for action in (
+        "play", "play_wild", "play_invalid", "play_not_turn", "draw",
+        "uno_shield", "uno_catch", "uno_nothing"
+    ):
+        jobs = []
+
+        def setup(action=action):
+            jobs[:] = _requests(action, n)
+
+        def run():
+            for server, r in jobs:
+                server.process_request(r)
+            return len(jobs)
+
+        results[action] = _best(run, repeats, setup)
+    return results
+
+@benchmark
+def bench_deck(scale: float, repeats: int) -> dict:
+    "Deck.draw with every card played straight back, so the deck keeps reshuffling."
+    n = _n(200_000, scale)
+    deck = None
+
+    def setup():
+        nonlocal deck
+        random.seed(0)
+        deck = Deck(None)
+
+    def run():
+        draw, play = deck.draw, deck.play
+        for _ in range(n):
+            play(draw())
+        return n
+
+    return {"draw_reshuffle": _best(run, repeats, setup)}
+
+def _game_states(n: int, seed: int) -> list[uno.UnoServer]:
+    "Servers partway through games of bots."
+    random.seed(seed)
+    servers = []
+    while len(servers) < n:
+        server = uno.UnoServer(
+            [uno.RandomAgent(seed=len(servers) + i) for i in range(4)], log_level=logging.ERROR
+        )
+        for _ in range(random.randint(0, 30)):
+            server.tick(headless=True)
+        if server.playing:
+            servers.append(server)
+    return servers
+
+@benchmark
+def bench_prompt(scale: float, repeats: int) -> dict:
+    "build_context plus rendering the full prompt, as LLMAgent and the data generator do."
+    n = _n(2000, scale)
+    servers = _game_states(min(n, 200), seed=0)
+    prompts = PromptBuilder()
+
+    def run():
+        for i in range(n):
+            server = servers[i % len(servers)]
+            p = server.next_player
+            prompts.render(server.build_context(p, True), "Win.")
+        return n
+
+    return {"build_context_render": _best(run, repeats)}
+
+@benchmark
+def bench_scenarios(scale: float, repeats: int) -> dict:
+    "Training scenarios per second, for every scenario type."
+    # only the data generator needs the training package.
+    from training import generate_train_data as gen # pylint: disable=import-outside-toplevel
+
+    n = _n(500, scale)
+    results = {}
+    for k in (
+        "draw_needed_forced", "draw_needed_no_playable", "draw_unneeded",
+        "play_regular_symbol", "play_regular_color", "play_wild",
+        "uno_defense", "uno_offense"
+    ):
+        results[k] = _best(
+            lambda k=k: len(gen.generate_data_for_key(k, n, seed=0, engine="server")), repeats
+        )
+        results[f"{k}.numpy"] = _best(
+            lambda k=k: len(gen.generate_data_for_key(k, n, seed=0, engine="numpy")), repeats
+        )
+    return results
+
+def bench_llm(model_path: str, tokenizer_path: str, scale: float, repeats: int) -> dict:
+    "LLMAgent decisions per second, generating and scoring. Needs a model."
+    n = _n(100, scale)
+    servers = _game_states(n, seed=0)
+    contexts = [
+        (s.next_player, s.build_context(s.next_player, True), s.candidate_actions(s.next_player))
+        for s in servers
+    ]
+
+    results = {}
+    for decoding in ("generate", "score"):
+        with uno.LLMAgent(
+            model_path=model_path, tokenizer_path=tokenizer_path, decoding=decoding
+        ) as agent:
+            def run(agent=agent):
+                for p, context, actions in contexts:
+                    prompt = p.create_prompt(context, actions) | {"strategy": agent.strategy}
+                    agent.act(prompt, True)
+                return len(contexts)
+            results[decoding] = _best(run, repeats)
+    return results
+
+def run(
+    only: list[str] | None=None, scale: float=1., repeats: int=3,
+    model_path: str | None=None, tokenizer_path: str | None=None
+) -> dict:
+    """Runs the benchmarks.
+
+    Args:
+        only (list[str], optional): Names of the benchmarks to run. Defaults to all.
+        scale (float, optional): Multiplies every workload. Defaults to 1.
+        repeats (int, optional): Best of how many runs. Defaults to 3.
+        model_path (str, optional): Also benchmarks LLMAgent with this model.
+        tokenizer_path (str, optional): Tokenizer for the model.
+
+    Returns:
+        dict: Results by benchmark then workload, plus what they ran on.
+    """
+    results = {}
+    for name, f in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        results[name] = f(scale, repeats)
+
+    if model_path and (not only or "llm" in only):
+        results["llm"] = bench_llm(model_path, tokenizer_path or DEFAULT_TOKENIZER_PATH, scale, repeats)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scale": scale,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float=.1) -> list[str]:
+    """Workloads that got slower than the baseline by more than tolerance.
+
+    Returns:
+        list[str]: One line per regression.
+    """
+    regressions = []
+    for name, workloads in current["results"].items():
+        for label, r in workloads.items():
+            old = baseline["results"].get(name, {}).get(label)
+            if not old:
+                continue
+            ratio = r["ops_per_sec"] / old["ops_per_sec"]
+            if ratio < 1 - tolerance:
+                regressions.append(
+                    f"{name}.{label}: {old['ops_per_sec']} -> {r['ops_per_sec']} ops/s ({ratio:.2f}x)"
+                )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Uno engine.")
+    parser.add_argument("--only", nargs="+", choices=[*BENCHMARKS, "llm"])
+    parser.add_argument("--scale", type=float, default=1.)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model", default=None, help="also benchmark LLMAgent with this model")
+    parser.add_argument("--tokenizer", default=None)
+    parser.add_argument("--out", default=None, help="write the results as JSON here")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=.1)
+    args = parser.parse_args()
+
+    results = run(args.only, args.scale, args.repeats, args.model, args.tokenizer)
+    print(json.dumps(results, indent=1))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("SLOWER", line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
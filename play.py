@@ -2,6 +2,8 @@
 Here we can manually trigger some games of uno
 """
 
+import logging
+
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
 import uno
 
@@ -40,6 +42,8 @@ def download_models():
 # we need at least 2000 examples. holy crap! maybe we generate programmatically?
 
 if __name__ == '__main__':
+    # the server only logs, showing it is up to us.
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     # TODO check if LLMs installed? if not, then call download_models?
     download_models()
     #play_one_game()
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+import random
+import time
+
+from uno import Agent, AsyncUnoServer, RandomAgent
+from uno.asyncserver import play_games
+
+class SlowAgent(RandomAgent):
+    "Thinks for a while every time it is asked."
+    async def aact(self, prompt_dict: dict, is_turn: bool) -> str:
+        await asyncio.sleep(.05)
+        return self.act(prompt_dict, is_turn)
+
+class StuckAgent(Agent):
+    timeout = .01
+    async def aact(self, prompt_dict: dict, is_turn: bool) -> str:
+        await asyncio.sleep(10)
+
+def test_async_game():
+    random.seed(1)
+    server = AsyncUnoServer([RandomAgent(seed=1 + i) for i in range(4)], log_level=logging.ERROR)
+    asyncio.run(server.play_game(max_ticks=5000))
+    assert [p.result for p in server.players].count("Winner") == 1
+
+def test_players_are_asked_concurrently():
+    server = AsyncUnoServer([SlowAgent(seed=i) for i in range(4)], log_level=logging.ERROR)
+    # somebody is exposed so everybody has a decision.
+    server.get_player(2).hand = ["R1"]
+    start = time.perf_counter()
+    asyncio.run(server.tick())
+    assert time.perf_counter() - start < .15
+
+def test_timeout():
+    server = AsyncUnoServer([StuckAgent(), RandomAgent()], agent_timeout=5, log_level=logging.ERROR)
+    stuck = server.get_player(1)
+    server.next_player = stuck
+    asyncio.run(server.tick())
+    assert stuck.message_queue == ["You took too long."]
+
+def test_many_games_share_a_loop():
+    random.seed(2)
+    servers = [
+        AsyncUnoServer([SlowAgent(seed=10 * g + i) for i in range(3)], log_level=logging.ERROR)
+        for g in range(8)
+    ]
+    start = time.perf_counter()
+    asyncio.run(play_games(servers, max_ticks=10))
+    # 10 ticks of .05s each. serially this would take 8 times as long.
+    assert time.perf_counter() - start < 2
@@ -0,0 +1,78 @@
+import numpy as np
+
+from uno.card import CARDS, CARD_COLOR, PLAYABLE_ON
+from uno.prompt import PromptBuilder
+from training.batch_scenarios import SCENARIOS, build_batch, render_batch
+
+N = 500
+
+def batch(k, seed=0):
+    return build_batch(k, N, np.random.default_rng(seed))
+
+def hands(b):
+    return [h[:n] for h, n in zip(b.hand.tolist(), b.hand_len.tolist())]
+
+def playable(c, b, i):
+    return PLAYABLE_ON[c][b.top[i]][b.next_color[i]]
+
+def test_states_are_consistent():
+    for k in SCENARIOS:
+        b = batch(k)
+        for i, h in enumerate(hands(b)):
+            assert 2 <= b.n_players[i] <= 6
+            assert len(h) == b.counts[i, b.current[i]] >= 1
+            assert all(c >= 0 for c in h)
+            assert b.counts[i, :b.n_players[i]].min() >= 1
+            assert b.counts[i, b.n_players[i]:].sum() == 0
+            assert b.draw_count[i] >= 0
+            # the chosen color of a wild top card is a real color.
+            assert b.next_color[i] < 4
+
+def test_draws():
+    b = batch("draw_needed_forced")
+    assert all(CARDS[t] in ("WF", "RD", "YD", "GD", "BD") for t in b.top)
+    assert b.must_draw.min() >= 1
+
+    b = batch("draw_needed_no_playable")
+    for i, h in enumerate(hands(b)):
+        assert not any(playable(c, b, i) for c in h)
+
+    b = batch("draw_unneeded")
+    for i, h in enumerate(hands(b)):
+        assert any(playable(c, b, i) for c in h)
+
+def test_plays():
+    for k in ("play_regular_symbol", "play_regular_color", "play_wild"):
+        b = batch(k)
+        for i, h in enumerate(hands(b)):
+            assert b.card[i] in h
+            assert playable(b.card[i], b, i)
+
+    b = batch("play_wild")
+    for i, h in enumerate(hands(b)):
+        colors = {CARD_COLOR[c] for c in h} - {4}
+        assert b.color[i] in (colors or range(4))
+
+def test_uno():
+    b = batch("uno_defense")
+    for i in range(N):
+        me = b.current[i]
+        assert b.counts[i, me] == 1 and not b.shielded[i, me]
+        others = [s for s in range(b.n_players[i]) if s != me and b.counts[i, s] == 1]
+        assert all(b.shielded[i, s] for s in others)
+
+    b = batch("uno_offense")
+    for i in range(N):
+        exposed = [
+            s for s in range(b.n_players[i]) if b.counts[i, s] == 1 and not b.shielded[i, s]
+        ]
+        assert len(exposed) == 1 and exposed[0] != b.current[i]
+
+def test_render_and_seed():
+    samples = render_batch(batch("play_wild", seed=3), PromptBuilder(), "win")
+    assert samples == render_batch(batch("play_wild", seed=3), PromptBuilder(), "win")
+    assert samples != render_batch(batch("play_wild", seed=4), PromptBuilder(), "win")
+
+    s = samples[0]
+    assert s["output"]["card"] in ("WW", "WF") and s["output"]["nextColor"] in "RYGB"
+    assert f"Cards\n{' '.join(CARDS[c] for c in hands(batch('play_wild', seed=3))[0])}\n" in s["input"]
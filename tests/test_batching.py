@@ -0,0 +1,42 @@
+import numpy as np
+
+from training.modules.batching import TokenBudgetBatchSampler, probe_max_tokens
+
+def lengths(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(50, 400, n), rng.integers(3, 15, n)
+
+def cost(batch, inputs, labels):
+    return len(batch) * (inputs[batch].max() + labels[batch].max())
+
+def test_batches_fit_budget_and_cover_everything():
+    inputs, labels = lengths()
+    sampler = TokenBudgetBatchSampler(inputs, labels, 2048, pool_size=200)
+    batches = list(sampler)
+    assert len(sampler) == len(batches)
+    assert sorted(i for b in batches for i in b) == list(range(1000))
+    assert all(cost(b, inputs, labels) <= 2048 for b in batches)
+
+    # similar lengths are batched together, so far fewer batches than one per example.
+    assert len(batches) < 1000 / 4
+
+def test_long_examples_get_their_own_batch():
+    sampler = TokenBudgetBatchSampler(np.array([10, 5000, 10]), np.array([2, 2, 2]), 100)
+    assert sorted(map(sorted, sampler)) == [[0, 2], [1]]
+
+def test_epochs():
+    inputs, labels = lengths()
+    sampler = TokenBudgetBatchSampler(inputs, labels, 2048, seed=3)
+    first = list(sampler)
+    assert list(sampler) == first
+    sampler.set_epoch(1)
+    assert list(sampler) != first
+
+    # without shuffling, the whole dataset is sorted by length.
+    ordered = TokenBudgetBatchSampler(inputs, labels, 2048, shuffle=False)
+    flat = [i for b in ordered for i in b]
+    assert np.all(np.diff((inputs + labels)[flat]) >= 0)
+
+def test_probe_without_gpu(monkeypatch):
+    monkeypatch.setattr("torch.cuda.is_available", lambda: False)
+    assert probe_max_tokens(None, None, None, np.array([5]), start=512) == 512
@@ -0,0 +1,17 @@
+from benchmarks.suite import run, compare
+
+def test_suite_runs():
+    results = run(only=["deck", "process_request"], scale=.001, repeats=1)
+    assert set(results["results"]) == {"deck", "process_request"}
+    for workloads in results["results"].values():
+        for r in workloads.values():
+            assert r["ops"] > 0 and r["ops_per_sec"] > 0
+
+def test_compare():
+    def results(ops_per_sec):
+        return {"results": {"deck": {"draw_reshuffle": {"ops_per_sec": ops_per_sec}}}}
+
+    assert compare(results(95), results(100)) == []
+    assert len(compare(results(80), results(100))) == 1
+    # workloads missing from the baseline are not regressions.
+    assert compare(results(80), {"results": {}}) == []
@@ -0,0 +1,27 @@
+from uno.card import (
+    CARDS, NO_COLOR, PLAYABLE_ON, card_id, card_str, color, value, is_wild, color_str
+)
+from uno.deck import STANDARD_DECK, STANDARD_DECK_IDS, Deck
+
+def test_card_ids_round_trip():
+    assert len(CARDS) == 54
+    assert len(STANDARD_DECK_IDS) == 108
+    assert [card_str(i) for i in STANDARD_DECK_IDS] == STANDARD_DECK
+    for c in CARDS:
+        assert card_str(card_id(c)) == c
+
+def test_playable_on_matches_string_rules():
+    for c in CARDS:
+        for t in CARDS:
+            for nc in range(NO_COLOR + 1):
+                next_color = color_str(nc)
+                expected = is_wild(c) or color(c) == next_color or value(c) == value(t) or next_color == "W"
+                assert PLAYABLE_ON[card_id(c)][card_id(t)][nc] == expected, (c, t, next_color)
+
+def test_deck_hands_out_strings():
+    deck = Deck(forced_top_card="G3")
+    assert deck.top_card_on_discard_pile() == "G3"
+    c = deck.draw()
+    assert c in STANDARD_DECK
+    deck.play(c)
+    assert deck.top_card_on_discard_pile() == c
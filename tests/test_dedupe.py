@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+import pytest
+
+from training.batch_scenarios import build_batch
+from training.dedupe import DedupeIndex, state_hashes
+from training.generate_train_data import generate_training_data
+from training.shards import Shard, iter_samples, read_manifest
+
+def test_state_hashes():
+    b = build_batch("play_wild", 200, np.random.default_rng(0))
+    hashes = state_hashes(b)
+    assert len(set(hashes)) == 200
+
+    # the order of the hand and the size of the draw deck do not matter.
+    b.hand[:, :2] = b.hand[:, 1::-1].copy()
+    b.draw_count += 3
+    assert state_hashes(b) == hashes
+
+    # the answer does.
+    b.color = (b.color + 1) % 4
+    assert not set(state_hashes(b)) & set(hashes)
+
+def test_index(tmp_path):
+    a, b = Shard("a", "k", 3, 0), Shard("b", "k", 3, 0)
+    with DedupeIndex(str(tmp_path / "index.sqlite")) as index:
+        assert index.add(a, [b"1", b"2", b"1", b"3", b"4"], 3) == ([0, 1, 3], 4)
+        assert index.add(b, [b"3", b"5"], 3) == ([1], 2)
+
+        # starting a shard again forgets what it kept before.
+        index.begin_shard(a)
+        assert index.add(b, [b"1"], 3) == ([0], 1)
+
+        index.finish_shard(b, 3, 2)
+        assert index.yields() == {"k": {"generated": 3, "unique": 2, "yield": 2 / 3}}
+
+def test_index_transactions(tmp_path):
+    a = Shard("a", "k", 3, 0)
+    with DedupeIndex(str(tmp_path / "index.sqlite")) as index:
+        index.add(a, [b"1", b"2"], 3)
+        index.finish_shard(a, 2, 2)
+
+        # a failure halfway through forgetting a shard forgets nothing.
+        with pytest.raises(KeyboardInterrupt):
+            with index._transaction(): # pylint: disable=protected-access
+                index.db.execute("DELETE FROM seen WHERE shard = ?", ("a",))
+                raise KeyboardInterrupt
+        assert not index.db.in_transaction
+        assert index.db.execute("SELECT COUNT(*) FROM seen").fetchone() == (2,)
+
+        index.begin_shard(a)
+        assert index.db.execute("SELECT COUNT(*) FROM seen").fetchone() == (0,)
+        assert index.db.execute("SELECT COUNT(*) FROM shards").fetchone() == (0,)
+
+def test_unique_dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    out_dir = generate_training_data(
+        400, "set", seed=1, shard_size=50, unique=True,
+        ratios={"uno_defense": .5, "draw_needed_forced": .5}
+    )
+    samples = [json.dumps(s, sort_keys=True) for s in iter_samples(out_dir)]
+    assert len(samples) == len(set(samples)) == 400
+
+    manifest = read_manifest(out_dir)
+    assert manifest["plan"]["unique"]
+    assert manifest["yield"]["uno_defense"]["unique"] == 200
+    assert 0 < manifest["yield"]["uno_defense"]["yield"] <= 1
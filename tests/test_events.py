@@ -0,0 +1,59 @@
+import io
+import json
+import logging
+import random
+
+from uno import UnoServer, RandomAgent
+from uno.events import ListSink, JsonlSink
+
+def _game(events, seed: int=3) -> UnoServer:
+    random.seed(seed)
+    server = UnoServer([RandomAgent(seed=seed + i) for i in range(4)], events=events)
+    server.play_game(headless=True, max_ticks=5000)
+    return server
+
+def test_events_follow_the_game():
+    sink = ListSink()
+    server = _game(sink)
+    events = sink.events
+
+    assert events[0][:4] == ("start", 4, 7, 7)
+    winner = next(p for p in server.players if p.result == "Winner")
+    assert events[-1] == ("win", winner.id)
+
+    kinds = {e[0] for e in events}
+    assert {"play", "draw"} <= kinds
+    plays = [e for e in events if e[0] == "play"]
+    # the winner's last card never lands, the one before it is on top.
+    assert plays[-1][1] == winner.id
+    assert plays[-2][2] == server.deck.top_card_on_discard_pile()
+
+def test_jsonl_sink():
+    f = io.StringIO()
+    sink = ListSink()
+    _game(sink)
+    _game(JsonlSink(f))
+    lines = f.getvalue().splitlines()
+    assert [tuple(json.loads(line)) for line in lines] == sink.events
+
+def test_no_global_handlers(caplog):
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    level = root.level
+    for _ in range(3):
+        UnoServer(2)
+    assert root.handlers == handlers
+    assert root.level == level
+
+    # the server's logs go through its module logger.
+    with caplog.at_level(logging.INFO, logger="uno.unoserver"):
+        server = UnoServer(2, forced_top_card="R0")
+        server.process_request({"playerID": 1, "action": "Draw card"})
+    assert any(r.name == "uno.unoserver" and "drew a card" in r.message for r in caplog.records)
+
+    # unless it was asked to keep quiet.
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger="uno.unoserver"):
+        server = UnoServer(2, forced_top_card="R0", log_level=logging.ERROR)
+        server.process_request({"playerID": 1, "action": "Draw card"})
+    assert not caplog.records
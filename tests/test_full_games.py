@@ -1,4 +1,8 @@
-from uno import UnoServer
+import logging
+import random
+
+from uno import UnoServer, RandomAgent
+from uno.tournament import run_tournament
 
 def test_one_game():
     # TODO this may require trained agents first.
@@ -8,4 +12,39 @@ def test_one_game():
     assert sum(p.result for p in server.players) == 1
 
 def test_one_hundred_games():
-    return
+    results = run_tournament(["random"] * 4, 100, workers=2, seed=0)
+    assert results["games"] == 100
+    assert sum(a["wins"] for a in results["agents"]) + results["unfinished"] == 100
+    assert results["games_per_sec"] > 0
+
+    # same seed, same games, however they are spread over processes.
+    again = run_tournament(["random"] * 4, 100, workers=0, seed=0)
+    assert again["agents"] == results["agents"]
+    assert again["ticks"] == results["ticks"]
+
+def _random_game(headless: bool, seed: int) -> UnoServer:
+    random.seed(seed)
+    agents = [RandomAgent(seed=seed + i) for i in range(4)]
+    server = UnoServer(agents, log_level=logging.ERROR)
+    server.play_game(headless=headless, max_ticks=5000)
+    return server
+
+def test_headless_game():
+    server = _random_game(headless=True, seed=1)
+    assert not server.playing
+    assert [p.result for p in server.players].count("Winner") == 1
+
+def test_headless_matches_polling_loop(monkeypatch):
+    monkeypatch.setattr("uno.unoserver.time.sleep", lambda _: None)
+    for seed in range(5):
+        headless = _random_game(headless=True, seed=seed)
+        polling = _random_game(headless=False, seed=seed)
+        assert [(p.id, p.result, p.hand) for p in headless.players] == \
+            [(p.id, p.result, p.hand) for p in polling.players]
+
+def test_concurrent_game():
+    random.seed(1)
+    agents = [RandomAgent(seed=1 + i) for i in range(4)]
+    server = UnoServer(agents, log_level=logging.ERROR)
+    server.play_game(headless=True, max_ticks=5000, concurrent=True)
+    assert [p.result for p in server.players].count("Winner") == 1
@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+from uno.card import CARD_ID, PLAYABLE_ON, color_id
+import training.generate_train_data as gtd
+from training.generate_train_data import (
+    allocate, generate_training_data, interleave, iter_data_for_key, DEFAULT_RATIOS
+)
+from training.shards import Shard, iter_samples, read_manifest
+
+def test_allocate():
+    counts = allocate(1001, DEFAULT_RATIOS)
+    assert sum(counts.values()) == 1001
+    assert counts["play_regular_symbol"] in (250, 251)
+
+def test_sharded_output_and_resume(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    out_dir = generate_training_data(300, "set", seed=4, shard_size=40)
+    manifest = read_manifest(out_dir)
+    assert manifest["complete"]
+    samples = list(iter_samples(out_dir))
+    assert len(samples) == 300
+    assert set(samples[0]) == {"input", "output"}
+
+    # lose a couple of shards, as if the run was interrupted.
+    files = [s["file"] for s in manifest["shards"]]
+    for f in files[:2]:
+        os.remove(os.path.join(out_dir, f))
+    manifest["complete"] = False
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    generate_training_data(300, "set", seed=4, shard_size=40)
+    assert list(iter_samples(out_dir)) == samples
+
+    # the same directory can not be reused for a different dataset.
+    with pytest.raises(ValueError):
+        generate_training_data(300, "set", seed=5, shard_size=40)
+
+def test_interleave():
+    shards = [Shard(f"{k}-{i}", k, 10, 0) for k in "ab" for i in range(3)] + [Shard("c-0", "c", 10, 0)]
+    assert [s.file for s in interleave(shards)] == ["a-0", "b-0", "c-0", "a-1", "b-1", "a-2", "b-2"]
+
+def parse_state(prompt: str) -> tuple[list[str], str, str]:
+    "Hand, top card and color to follow shown in a sample's prompt."
+    lines = prompt.splitlines()
+    hand = lines[lines.index("Cards") + 1].split()
+    top = next(line for line in lines if line.startswith("Top card: "))[-2:]
+    chosen = [line.split("Chosen color: ")[1][0] for line in lines if "Chosen color: " in line]
+    return hand, top, chosen[-1] if chosen else top[0]
+
+@pytest.mark.parametrize("engine", ["server", "numpy"])
+def test_draw_needed_no_playable_has_nothing_to_play(engine):
+    for s in iter_data_for_key("draw_needed_no_playable", 300, seed=3, engine=engine):
+        hand, top, color = parse_state(s["input"])
+        assert s["output"] == {"action": "Draw card"}
+        assert not any(PLAYABLE_ON[CARD_ID[c]][CARD_ID[top]][color_id(color)] for c in hand), s["input"]
+
+def test_uno_defense_player_is_exposed(monkeypatch):
+    deciding = []
+    def create_input(server, p):
+        deciding.append(p)
+        return render(server, p)
+    render = gtd.create_input
+    monkeypatch.setattr(gtd, "create_input", create_input)
+
+    for _ in iter_data_for_key("uno_defense", 300, seed=3, engine="server"):
+        p = deciding.pop()
+        assert len(p.hand) == 1 and not p.is_shielded
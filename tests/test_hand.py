@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from uno.card import CARDS, CARD_ID, NO_COLOR, PLAYABLE_ON
+from uno.deck import STANDARD_DECK
+from uno.hand import Hand
+
+def test_behaves_like_a_list():
+    cards = ["R1", "WW", "B7", "R1", "G3"]
+    hand = Hand(cards)
+    assert hand == cards and list(hand) == cards and len(hand) == 5
+    assert repr(hand) == repr(cards)
+    assert hand[0] == "R1" and hand[-1] == "G3" and hand[1:3] == ["WW", "B7"]
+    assert "B7" in hand and "B8" not in hand and None not in hand and ["R1"] not in hand
+    assert hand.count("R1") == 2 and hand.count("B8") == 0
+
+    # every change matches what a list would do.
+    ops = [
+        lambda h: h.remove("R1"),
+        lambda h: h.append("R1"),
+        lambda h: h.__setitem__(0, "Y7"),
+        lambda h: h.__setitem__(-2, "B7"),
+        lambda h: h.pop(),
+        lambda h: h.pop(1),
+        lambda h: h.insert(0, "WF"),
+        lambda h: h.__delitem__(slice(2, None)),
+        lambda h: h.extend(["R1", "R1"]),
+        lambda h: h.remove("R1"),
+    ]
+    for op in ops:
+        assert op(hand) == op(cards)
+        assert hand == cards
+        assert hand.counts() == [cards.count(c) for c in CARDS]
+
+    with pytest.raises(ValueError):
+        hand.remove("G9")
+    with pytest.raises(IndexError):
+        hand[10] # pylint: disable=pointless-statement
+
+def test_playable_matches_rules():
+    rng = random.Random(0)
+    for _ in range(300):
+        hand = Hand(rng.sample(STANDARD_DECK, rng.randint(0, 20)))
+        # some churn, so the buckets have to keep up.
+        for c in rng.sample(list(hand), len(hand) // 3):
+            hand.remove(c)
+        top = rng.randrange(len(CARDS))
+        nc = rng.randrange(NO_COLOR + 1)
+        expected = [c for c in dict.fromkeys(hand) if PLAYABLE_ON[CARD_ID[c]][top][nc]]
+        assert hand.playable(top, nc) == expected
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import torch
+
+from uno.agents.inference import InferenceService
+
+class _Tokenizer:
+    "Each prompt is one token: its length."
+    def __call__(self, prompts, return_tensors, padding):
+        return _Batch(input_ids=torch.tensor([[len(p)] for p in prompts]))
+
+    def batch_decode(self, ids, skip_special_tokens):
+        return [str(int(i[0])) for i in ids]
+
+class _Batch(dict):
+    def to(self, _):
+        return self
+
+class _Model:
+    device = "cpu"
+    def __init__(self):
+        self.batch_sizes = []
+
+    def generate(self, input_ids, **_):
+        self.batch_sizes.append(len(input_ids))
+        return input_ids * 2
+
+def test_responses_go_back_to_callers():
+    model = _Model()
+    with InferenceService(model, _Tokenizer(), max_batch_size=4, max_wait=.5) as service:
+        with ThreadPoolExecutor(8) as ex:
+            responses = list(ex.map(service.generate, ["a" * n for n in range(8)]))
+
+    assert responses == [str(2 * n) for n in range(8)]
+    assert sum(model.batch_sizes) == 8
+    assert max(model.batch_sizes) <= 4
+    assert len(model.batch_sizes) < 8
+
+def test_submit_after_close():
+    service = InferenceService(_Model(), _Tokenizer())
+    pending = service.submit("abc")
+    service.close()
+    # prompts queued before closing still get answered.
+    assert pending.result(timeout=5) == "6"
+    with pytest.raises(RuntimeError):
+        service.submit("abc")
+    service.close()
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import logging
+import random
+
+import pytest
+
+from uno import AsyncUnoServer, UnoServer, RandomAgent, Instrumentation
+from uno.instrumentation import Histogram
+
+def test_histogram():
+    h = Histogram()
+    for _ in range(90):
+        h.add(1e-6)
+    for _ in range(10):
+        h.add(1e-3)
+    assert h.count == 100
+    assert h.percentile(.5) == 1e-6
+    # 1ms lands in the bucket that ends at 2**10 us.
+    assert h.percentile(.99) == 1e-6 * 2 ** 10
+    assert h.snapshot()["max"] == 1e-3
+
+def test_game_metrics(tmp_path):
+    out = tmp_path / "metrics.json"
+    metrics = Instrumentation(out=str(out))
+
+    random.seed(1)
+    server = UnoServer(
+        [RandomAgent(seed=1 + i) for i in range(4)], log_level=logging.ERROR, metrics=metrics
+    )
+    server.play_game(headless=True, max_ticks=5000)
+
+    snapshot = json.loads(out.read_text())
+    counters = snapshot["counters"]
+    assert counters["games"] == 1
+    # every prompt goes through each hook once.
+    assert counters["broadcast_world_state"] == counters["send_context_and_prompt"] \
+        == counters["agent.act"] == counters["build_context"]
+    requests = sum(v for k, v in counters.items() if k.startswith("process_request."))
+    assert requests == sum(
+        h["count"] for k, h in snapshot["latency"].items() if k.startswith("process_request.")
+    )
+    assert counters["process_request.Play card"] > 0
+    assert snapshot == metrics.snapshot()
+
+@pytest.mark.parametrize("mode", ["concurrent", "async"])
+def test_concurrent_and_async_metrics(mode):
+    metrics = Instrumentation()
+    random.seed(1)
+    agents = [RandomAgent(seed=1 + i) for i in range(4)]
+    if mode == "async":
+        server = AsyncUnoServer(agents, log_level=logging.ERROR, metrics=metrics)
+        asyncio.run(server.play_game(max_ticks=5000))
+    else:
+        server = UnoServer(agents, log_level=logging.ERROR, metrics=metrics)
+        server.play_game(headless=True, max_ticks=5000, concurrent=True)
+
+    snapshot = metrics.snapshot()
+    counters = snapshot["counters"]
+    assert counters["games"] == 1
+    # the same hooks as a game prompting one player at a time.
+    assert counters["broadcast_world_state"] == counters["send_context_and_prompt"] \
+        == counters["agent.act"] == counters["build_context"] > 0
+    for k in ("broadcast_world_state", "send_context_and_prompt", "build_context"):
+        assert snapshot["latency"][k]["total"] > 0
+    assert snapshot["latency"]["broadcast_world_state"]["total"] >= \
+        snapshot["latency"]["send_context_and_prompt"]["total"]
+
+def test_metrics_do_not_change_the_game():
+    def play(metrics):
+        random.seed(2)
+        server = UnoServer(
+            [RandomAgent(seed=2 + i) for i in range(4)], log_level=logging.ERROR, metrics=metrics
+        )
+        server.play_game(headless=True, max_ticks=5000)
+        return [(p.id, p.result, p.hand) for p in server.players]
+
+    assert play(None) == play(Instrumentation())
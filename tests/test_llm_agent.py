@@ -0,0 +1,105 @@
+import json
+
+import pytest
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, processors, trainers
+from transformers import PreTrainedTokenizerFast, T5Config, T5ForConditionalGeneration
+
+from uno import UnoServer
+from uno.agents import LLMAgent
+from uno.agents.model_registry import ModelRegistry
+from uno.agents.scoring import action_text, candidate_logprobs, encode_prompts
+from uno.prompt import instructions, rules
+
+@pytest.fixture(scope="module")
+def tiny_t5():
+    "An untrained T5 small enough for tests, with a tokenizer trained on the prompts."
+    server = UnoServer(players=2, seed=0)
+    corpus = [rules(), instructions()] + [
+        "\n".join(server.build_context(p, True)) for p in server.players
+    ] + [action_text(a) for a in server.candidate_actions(server.next_player)]
+
+    tok = Tokenizer(models.Unigram())
+    tok.pre_tokenizer = pre_tokenizers.Sequence(
+        [pre_tokenizers.WhitespaceSplit(), pre_tokenizers.Metaspace()]
+    )
+    tok.decoder = decoders.Metaspace()
+    tok.train_from_iterator(corpus, trainers.UnigramTrainer(
+        vocab_size=300, special_tokens=["<pad>", "</s>", "<unk>"], unk_token="<unk>"
+    ))
+    tok.post_processor = processors.TemplateProcessing(
+        single="$A </s>", special_tokens=[("</s>", tok.token_to_id("</s>"))]
+    )
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tok, pad_token="<pad>", eos_token="</s>", unk_token="<unk>"
+    )
+
+    torch.manual_seed(0)
+    model = T5ForConditionalGeneration(T5Config(
+        vocab_size=tok.get_vocab_size(), d_model=32, d_ff=64, d_kv=8, num_heads=2,
+        num_layers=1, decoder_start_token_id=0, pad_token_id=0, eos_token_id=1
+    )).eval()
+    return tokenizer, model
+
+def agent(tiny_t5, **kwargs) -> LLMAgent:
+    return LLMAgent(models=ModelRegistry(lambda *_: tiny_t5), **kwargs)
+
+def test_scores_are_length_normalized(tiny_t5):
+    tokenizer, model = tiny_t5
+    candidates = [[action_text({"action": "Do nothing"}), action_text({"action": "Play card", "card": "R5"})]]
+    states, mask = encode_prompts(model, tokenizer, ["Cards\nR5 B7"])
+    total = candidate_logprobs(model, tokenizer, states, mask, candidates, length_normalize=False)[0]
+    mean = candidate_logprobs(model, tokenizer, states, mask, candidates)[0]
+    lengths = torch.tensor([len(tokenizer(c).input_ids) for c in candidates[0]])
+    torch.testing.assert_close(mean, total / lengths)
+
+def test_scoring_agent_plays_a_card(tiny_t5):
+    server = UnoServer(players=2, player_starting_hand=7, forced_top_card="B5", seed=0)
+    p = server.next_player
+    p.hand = ["B7", "R5", "G1"]
+    actions = server.candidate_actions(p)
+    assert {"action": "Do nothing"} in actions
+
+    with agent(tiny_t5, decoding="score") as p.agent:
+        response = json.loads(p.prompt_agent(server.build_context(p, True), True, actions))
+    assert response in actions
+    assert response["action"] in ("Play card", "Draw card")
+
+    # without a deck to draw from, that means a card.
+    actions = [r for r in actions if r["action"] != "Draw card"]
+    with agent(tiny_t5, decoding="score") as p.agent:
+        response = json.loads(p.prompt_agent(server.build_context(p, True), True, actions))
+    assert response["action"] == "Play card" and response["card"] in ("B7", "R5")
+
+def prompts(n=3):
+    "Prompts of a few decisions in a game, sharing their prefix."
+    server = UnoServer(players=3, seed=1)
+    with_strategy = {"strategy": "Do what you need to do to win the game."}
+    return [p.create_prompt(server.build_context(p, True)) | with_strategy for p in server.players][:n]
+
+@pytest.mark.parametrize("cache_prefix", ["tokens", "encoder"])
+def test_prefix_cache_matches_full_prompt(tiny_t5, cache_prefix):
+    tokenizer, model = tiny_t5
+    uncached, cached = agent(tiny_t5), agent(tiny_t5, cache_prefix=cache_prefix)
+    for prompt in prompts():
+        ids = tokenizer(uncached.build_prompt(prompt), return_tensors="pt").input_ids
+        inputs = cached.cached_inputs(prompt)
+        prefix_ids, _ = cached._prefix_cache[cached.build_prefix(prompt)] # pylint: disable=protected-access
+        n = prefix_ids.shape[1]
+
+        if cache_prefix == "tokens":
+            assert torch.equal(inputs["input_ids"], ids)
+            continue
+
+        # the same tokens, with the prefix and the rest encoded separately.
+        states = inputs["encoder_outputs"].last_hidden_state
+        assert inputs["attention_mask"].shape == ids.shape
+        with torch.no_grad():
+            expected = torch.cat([
+                model.get_encoder()(input_ids=ids[:, :n]).last_hidden_state,
+                model.get_encoder()(input_ids=ids[:, n:]).last_hidden_state,
+            ], dim=1)
+        torch.testing.assert_close(states, expected)
+
+    # every decision reused the one prefix.
+    assert len(cached._prefix_cache) == 1 # pylint: disable=protected-access
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from uno.agents.model_registry import ModelRegistry
+
+def _registry() -> tuple[ModelRegistry, list]:
+    loads = []
+    def loader(model_path, tokenizer_path, device):
+        loads.append((model_path, tokenizer_path, device))
+        return object(), object()
+    return ModelRegistry(loader), loads
+
+def test_models_load_once_per_key():
+    models, loads = _registry()
+    a = tuple(models.acquire("m", "t"))
+    b = tuple(models.acquire("m", "t"))
+    c = tuple(models.acquire("m", "t", device="cpu"))
+    assert a is not c
+    assert a[0] is b[0] and a[1] is b[1]
+    assert len(loads) == 2
+    assert models.refs() == {("m", "t", None): 2, ("m", "t", "cpu"): 1}
+
+def test_evict():
+    models, loads = _registry()
+    m = models.acquire("m", "t")
+    models.acquire("m2", "t")
+    with pytest.raises(RuntimeError):
+        models.evict("m")
+
+    models.release(m)
+    assert models.evict_unused() == 1
+    assert models.evict("m2", force=True) == 1
+    assert not models.refs()
+
+    models.acquire("m", "t")
+    assert len(loads) == 3
+
+def test_release_without_acquire():
+    models, _ = _registry()
+    handle = models.acquire("m", "t")
+    models.release(handle)
+    with pytest.raises(RuntimeError):
+        models.release(handle)
+
+def test_release_after_forced_evict():
+    models, _ = _registry()
+    old = models.acquire("m", "t")
+    models.evict("m", force=True)
+    new = models.acquire("m", "t")
+    assert new.model is not old.model
+
+    # giving back the evicted copy leaves the new one alone.
+    models.release(old)
+    assert models.refs() == {("m", "t", None): 1}
+    models.release(new)
+    assert models.refs() == {("m", "t", None): 0}
+
+def test_loading_does_not_block_other_models():
+    started, finish = threading.Event(), threading.Event()
+    def loader(model_path, tokenizer_path, device):
+        if model_path == "slow":
+            started.set()
+            assert finish.wait(5)
+        return object(), model_path
+    models = ModelRegistry(loader)
+    models.acquire("fast", "t")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(models.acquire("slow", "t").model))
+        for _ in range(2)
+    ]
+    for t in threads:
+        t.start()
+    assert started.wait(5)
+    # a loaded model is handed out while another one is still loading.
+    assert models.acquire("fast", "t").model == "fast"
+    finish.set()
+    for t in threads:
+        t.join()
+    assert results == ["slow", "slow"]
+    assert models.refs()[("slow", "t", None)] == 2
+
+def test_failed_load():
+    def loader(model_path, tokenizer_path, device):
+        raise OSError("missing")
+    models = ModelRegistry(loader)
+    with pytest.raises(OSError):
+        models.acquire("m", "t")
+    assert not models.refs()
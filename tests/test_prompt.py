@@ -0,0 +1,31 @@
+from uno import UnoServer, LLMAgent
+from uno.prompt import PromptBuilder, render_context
+
+def test_render_matches_llm_agent():
+    server = UnoServer(players=3, player_starting_hand=7, forced_top_card="WW")
+    p = server.next_player
+    context = server.build_context(p, True)
+    # build_prompt does not need a model.
+    agent = object.__new__(LLMAgent)
+    builder = PromptBuilder()
+    for strategy in ("Win.", None):
+        prompt_dict = p.create_prompt(context) | {"strategy": strategy}
+        if strategy is None:
+            del prompt_dict["strategy"]
+        assert builder.render(context, strategy) == agent.build_prompt(prompt_dict)
+        assert builder.prefix(strategy) == agent.build_prefix(prompt_dict)
+
+    # players whose agent has no strategy send it as None.
+    prompt_dict = p.create_prompt(context)
+    assert prompt_dict["strategy"] is None
+    assert agent.build_prompt(prompt_dict) == builder.render(context)
+
+def test_render_context_matches_server():
+    server = UnoServer(players=2, player_starting_hand=7, forced_top_card="B5")
+    p = server.get_player(2)
+    p.message("Hello")
+    expected = render_context(
+        p.hand, [(1, 7, False), (2, 7, False)], len(server.deck.cards), "B5", ["Hello"]
+    )
+    assert server.build_context(p, False) == expected
+    assert expected[-1] == "- Hello"
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from uno import UnoServer, RandomAgent
+from uno.events import ListSink, JsonlSink, read_events, split_games
+from uno.replay import Replay, ReplayError, state_at
+
+class RecordingAgent(RandomAgent):
+    "Remembers every context it was shown."
+    def __init__(self, seed: int, seen: list):
+        super().__init__(seed=seed)
+        self.seen = seen
+
+    def act(self, prompt_dict: dict, is_turn: bool) -> str:
+        self.seen.append(prompt_dict["context"])
+        return super().act(prompt_dict, is_turn)
+
+def _game(seed: int, sink, seen: list | None=None, **kwargs) -> UnoServer:
+    random.seed(seed)
+    seen = [] if seen is None else seen
+    agents = [RecordingAgent(seed + i, seen) for i in range(4)]
+    server = UnoServer(agents, events=sink, **kwargs)
+    server.play_game(headless=True, max_ticks=3000)
+    return server
+
+def _state(server: UnoServer):
+    return (
+        [(p.id, p.hand, p.is_shielded, p.result, p.invalid_actions, p.message_queue)
+            for p in server.players],
+        server.deck.cards, server.deck.discard_pile, server.next_color,
+        server.must_draw_count, server.playing
+    )
+
+@pytest.mark.parametrize("seed", range(6))
+def test_replay_rebuilds_the_game(seed):
+    sink = ListSink()
+    seen = []
+    # a small penalty keeps the deck around so it reshuffles.
+    live = _game(seed, sink, seen, uno_penalty=3)
+
+    replay = Replay(sink.events)
+    contexts = [context for *_, context in replay.decisions()]
+    assert contexts == seen
+    assert _state(replay.server) == _state(live)
+
+def test_state_at_any_index():
+    sink = ListSink()
+    _game(1, sink)
+    events = sink.events
+
+    replay = Replay(events)
+    # going backwards replays from the start.
+    for index in (len(events) // 2, 5, len(events)):
+        assert _state(replay.seek(index)) == _state(state_at(events, index))
+
+def test_replay_from_file(tmp_path):
+    path = str(tmp_path / "games.jsonl")
+    with JsonlSink(path) as sink:
+        live = [_game(seed, sink) for seed in range(3)]
+
+    games = list(split_games(read_events(path)))
+    assert len(games) == 3
+    for events, server in zip(games, live):
+        assert _state(Replay(events).seek(len(events))) == _state(server)
+
+def test_replay_notices_divergence():
+    sink = ListSink()
+    _game(2, sink)
+    events = list(sink.events)
+    i = next(i for i, e in enumerate(events) if e[0] == "draw")
+    events[i] = ("draw", events[i][1], "XX")
+    with pytest.raises(ReplayError):
+        state_at(events, len(events))
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from training.modules.replay_buffer import ReplayBuffer
+from training.modules.rollouts import RolloutEngine, UniformPolicy
+
+@pytest.fixture(scope="module")
+def rollouts():
+    return RolloutEngine(UniformPolicy(), 4, 2, max_steps=30, seed=0).run()
+
+def test_round_trip(rollouts):
+    buffer = ReplayBuffer(1000, rollouts.obs.shape[1])
+    buffer.add(rollouts)
+    assert len(buffer) == len(rollouts)
+    got = buffer[np.arange(len(rollouts))]
+    for name in ("obs", "legal", "actions", "logprobs", "rewards", "dones", "episodes", "seats"):
+        np.testing.assert_array_equal(getattr(got, name), getattr(rollouts, name))
+    np.testing.assert_array_equal(buffer.returns(np.arange(len(rollouts))), rollouts.returns())
+
+    # the next rollouts get new episodes.
+    buffer.add(rollouts)
+    second = buffer[np.arange(len(rollouts), 2 * len(rollouts))]
+    assert second.episodes.min() == rollouts.episodes.max() + 1
+
+def test_ring_overwrites_oldest(rollouts):
+    n = len(rollouts)
+    buffer = ReplayBuffer(n + 3, rollouts.obs.shape[1])
+    buffer.add(rollouts)
+    buffer.add(rollouts)
+    assert len(buffer) == n + 3
+    assert buffer.pos == n - 3
+    # the second add filled the last 3 rows, then wrapped around over the first ones.
+    np.testing.assert_array_equal(buffer[np.arange(n, n + 3)].actions, rollouts.actions[:3])
+    np.testing.assert_array_equal(buffer[np.arange(n - 3)].actions, rollouts.actions[3:])
+    np.testing.assert_array_equal(buffer[np.arange(n - 3, n)].actions, rollouts.actions[-3:])
+
+    # adding more than fits keeps the newest.
+    small = ReplayBuffer(5, rollouts.obs.shape[1])
+    small.add(rollouts)
+    assert sorted(small[np.arange(5)].actions) == sorted(rollouts.actions[-5:])
+
+def test_prioritized_sampling(rollouts):
+    buffer = ReplayBuffer(1000, rollouts.obs.shape[1], alpha=1., beta=1., seed=0)
+    buffer.add(rollouts)
+    idx, weights = buffer.sample(8)
+    assert (weights == 1).all()
+
+    priorities = np.zeros(len(buffer))
+    priorities[2] = 9
+    buffer.update_priorities(np.arange(len(buffer)), priorities)
+    idx, weights = buffer.sample(1000)
+    assert (idx == 2).mean() > .9
+    # rarely sampled rows weigh more.
+    assert weights[idx != 2].min() > weights[idx == 2].max()
+
+    with pytest.raises(ValueError):
+        ReplayBuffer(10, 5).sample(1)
+
+def test_memmap_reopens(rollouts, tmp_path):
+    path = str(tmp_path / "buffer")
+    buffer = ReplayBuffer(1000, rollouts.obs.shape[1], path=path)
+    buffer.add(rollouts)
+    buffer.flush()
+    assert isinstance(buffer.arrays["obs"], np.memmap)
+
+    again = ReplayBuffer(1000, rollouts.obs.shape[1], path=path)
+    assert len(again) == len(rollouts)
+    np.testing.assert_array_equal(again[np.arange(len(again))].obs, rollouts.obs)
+    again.add(rollouts)
+    assert again[np.array([len(rollouts)])].episodes[0] == rollouts.episodes.max() + 1
+
+    with pytest.raises(ValueError):
+        ReplayBuffer(500, rollouts.obs.shape[1], path=path)
@@ -0,0 +1,53 @@
+import numpy as np
+import torch
+
+from training.modules.rollouts import RolloutEngine, Rollouts, UniformPolicy, collect_rollouts
+
+class PlayFirstPolicy:
+    "Much prefers playing a card, so games end quickly."
+    def logprobs(self, prompts, candidates):
+        return [torch.tensor([0. if '"Play card"' in c else -8. for c in cs]) for cs in candidates]
+
+def test_rollouts_record_legal_decisions():
+    engine = RolloutEngine(PlayFirstPolicy(), 16, 3, max_steps=400, seed=0)
+    r = engine.run()
+    assert len(r) > 0
+    assert r.legal[np.arange(len(r)), r.actions].all()
+    assert (r.legal.sum(axis=1) > 1).all()
+    assert (r.logprobs <= 0).all()
+
+    # every finished game rewards each seat's last decision once.
+    finished = np.flatnonzero(engine.vec.winner >= 0)
+    assert len(finished) > 0
+    for e in finished:
+        rows = (r.episodes == e) & r.dones
+        assert sorted(r.seats[rows]) == [0, 1, 2]
+        assert r.rewards[rows].sum() == 1 - 2
+    assert r.rewards[~r.dones].sum() == 0
+
+    # returns spread the outcome over the whole trajectory.
+    returns = r.returns()
+    e = finished[0]
+    winner = engine.vec.winner[e]
+    assert (returns[(r.episodes == e) & (r.seats == winner)] == 1).all()
+
+    # prompts come back from the observations.
+    assert "Question: Which card should you play?" in r.prompts([0])[0]
+
+    # the next run plays new games.
+    assert engine.run().episodes.min() == 16
+
+def test_uniform_log_probs_and_seeds():
+    r = RolloutEngine(UniformPolicy(), 4, 2, max_steps=20, seed=1).run()
+    np.testing.assert_allclose(r.logprobs, -np.log(r.legal.sum(axis=1)), rtol=1e-5)
+
+    again = collect_rollouts(UniformPolicy, 4, 2, max_steps=20, seed=1)
+    other = collect_rollouts(UniformPolicy, 4, 2, max_steps=20, seed=2)
+    assert len(again) == len(collect_rollouts(UniformPolicy, 4, 2, max_steps=20, seed=1))
+    assert not np.array_equal(again.actions, other.actions) or len(again) != len(other)
+
+def test_concat():
+    a = RolloutEngine(UniformPolicy(), 3, 2, max_steps=5, seed=0).run()
+    joined = Rollouts.concat([a, a])
+    assert len(joined) == 2 * len(a)
+    assert set(joined.episodes[len(a):]) == {e + a.episodes.max() + 1 for e in a.episodes}
@@ -0,0 +1,43 @@
+import random
+
+import numpy as np
+
+from uno import UnoServer
+from uno.deck import Deck
+from uno.seeding import split_seed
+from training.generate_train_data import generate_data_for_key
+
+def _deal(seed) -> list:
+    server = UnoServer(4, seed=seed)
+    return [p.hand for p in server.players] + [server.deck.cards]
+
+def test_same_seed_same_game():
+    assert _deal(3) == _deal(3)
+    assert _deal(3) != _deal(4)
+    assert _deal(random.Random(3)) == _deal(3)
+
+def test_numpy_generator():
+    assert _deal(np.random.default_rng(5)) == _deal(np.random.default_rng(5))
+
+def test_global_random_untouched():
+    random.seed(0)
+    expected = random.random()
+    random.seed(0)
+    _deal(7)
+    # drawing and reshuffling only use the deck's generator.
+    deck = Deck(None, rng=7)
+    for _ in range(300):
+        deck.play(deck.draw())
+    assert random.random() == expected
+
+def test_split_seed():
+    seeds = split_seed(0, 8)
+    assert seeds == split_seed(0, 8)
+    assert len(set(seeds)) == 8
+    # asking for more seeds does not change the first ones.
+    assert split_seed(0, 16)[:8] == seeds
+
+def test_scenarios_are_reproducible():
+    for k in ("draw_needed_forced", "play_wild", "uno_offense"):
+        assert generate_data_for_key(k, 20, seed=1) == generate_data_for_key(k, 20, seed=1)
+    assert generate_data_for_key("play_wild", 20, seed=1) != generate_data_for_key("play_wild", 20, seed=2)
@@ -1,4 +1,9 @@
+import numpy as np
+
 from uno import UnoServer
+from uno.vecserver import (
+    ACTION_DRAW, ACTION_NOTHING, ACTION_UNO, N_ACTIONS, action_request, play_action
+)
 
 def test_draw():
     server = UnoServer(players=2, player_starting_hand=7, forced_top_card="R0")
@@ -101,3 +106,55 @@ def test_uno_catch():
     server.process_request(server.request_queue.popleft())
     assert len(server.get_player(1).hand) == 8
     assert server.next_player == server.get_player(1)
+
+def test_candidate_actions():
+    server = UnoServer(players=2, player_starting_hand=7, forced_top_card="B5")
+    p1, p2 = server.get_player(1), server.get_player(2)
+    p1.hand = ["B7", "B7", "R5", "G1", "WF"]
+    actions = server.candidate_actions(p1)
+    assert actions == [
+        {"action": "Play card", "card": "B7"},
+        {"action": "Play card", "card": "R5"},
+    ] + [{"action": "Play card", "card": "WF", "nextColor": c} for c in "RYGB"] + [
+        {"action": "Draw card"},
+        {"action": "Do nothing"},
+    ]
+    assert server.candidate_actions(p2) == [{"action": "Do nothing"}]
+
+    p2.hand = ["G2"]
+    assert {"action": "Yell UNO"} in server.candidate_actions(p1)
+    assert server.candidate_actions(p2) == [{"action": "Yell UNO"}, {"action": "Do nothing"}]
+
+def test_candidate_actions_must_draw():
+    server = UnoServer(players=2, player_starting_hand=7, forced_top_card="B5")
+    server.must_draw_count = 2
+    assert server.candidate_actions(server.next_player) == [
+        {"action": "Draw card"}, {"action": "Do nothing"}
+    ]
+
+def test_legal_actions():
+    server = UnoServer(players=3, player_starting_hand=7, forced_top_card="B5")
+    p1, p2, p3 = server.players
+    p1.hand = ["B7", "R5", "G1", "WW"]
+    legal = server.legal_actions(p1)
+    assert legal.shape == (N_ACTIONS,)
+    assert legal[[play_action("B7"), play_action("R5"), ACTION_DRAW, ACTION_NOTHING]].all()
+    assert legal[[play_action("WW", c) for c in "RYGB"]].all()
+    assert not legal[play_action("G1")] and not legal[ACTION_UNO]
+    assert legal.sum() == 8
+    # the same actions as candidate_actions.
+    assert sorted(map(str, server.candidate_actions(p1))) == \
+        sorted(str(action_request(a)) for a in np.flatnonzero(legal))
+
+    # only the current player plays or draws.
+    assert np.flatnonzero(server.legal_actions(p2)).tolist() == [ACTION_NOTHING]
+
+    # anybody may catch an unshielded player with one card, who may shield themselves.
+    p3.hand = ["G2"]
+    assert server.legal_actions(p2)[ACTION_UNO] and server.legal_actions(p3)[ACTION_UNO]
+    p3.is_shielded = True
+    assert not server.legal_actions(p2)[ACTION_UNO] and not server.legal_actions(p3)[ACTION_UNO]
+
+    # cards stay in hand while there is drawing to do.
+    server.must_draw_count = 2
+    assert np.flatnonzero(server.legal_actions(p1)).tolist() == [ACTION_DRAW, ACTION_NOTHING]
@@ -0,0 +1,127 @@
+import numpy as np
+
+from uno import UnoServer, VecUnoServer
+from uno.deck import STANDARD_DECK
+from uno import vecserver as vs
+
+def _vec_with_deck(monkeypatch, n_players: int, order: list[int]) -> tuple[UnoServer, VecUnoServer]:
+    "Builds an object server and a one game vec server that share a deck order."
+    monkeypatch.setattr("uno.deck.shuffle", lambda cards: cards.__setitem__(
+        slice(None), [cards[i] for i in order]
+    ))
+    server = UnoServer(players=n_players)
+    vec = VecUnoServer(1, n_players)
+    vec.reset(decks=vs.STANDARD_KINDS[order][None, :])
+    return server, vec
+
+def _to_request(a: int) -> dict:
+    if a == vs.ACTION_DRAW:
+        return {"action": "Draw card"}
+    if a == vs.ACTION_UNO:
+        return {"action": "Yell UNO"}
+    if a == vs.ACTION_NOTHING:
+        return {"action": "Do nothing"}
+    r = {"action": "Play card", "card": vs.KINDS[vs.ACTION_KIND[a]]}
+    if a >= vs.N_PLAY_ACTIONS:
+        r["nextColor"] = vs.COLORS[vs.ACTION_COLOR[a]]
+    return r
+
+def _assert_same_state(server: UnoServer, vec: VecUnoServer):
+    for p in server.players:
+        assert sorted(p.hand) == sorted(vec.hand(0, p.id - 1))
+        assert p.is_shielded == vec.is_shielded[0, p.id - 1]
+    assert server.deck.top_card_on_discard_pile() == vs.KINDS[vec.top[0]]
+    assert server.next_color == vs.COLORS[vec.next_color[0]]
+    assert server.must_draw_count == vec.must_draw_count[0]
+    assert server.next_player.id == vec.current[0] + 1
+    assert len(server.deck.cards) == vec.draw_len[0]
+    assert len(server.deck) == vec.draw_len[0] + vec.discard[0].sum()
+
+def test_deal_matches_server(monkeypatch):
+    rng = np.random.default_rng(0)
+    for n_players in (2, 3, 5):
+        server, vec = _vec_with_deck(monkeypatch, n_players, list(rng.permutation(len(STANDARD_DECK))))
+        _assert_same_state(server, vec)
+
+def test_random_games_match_server(monkeypatch):
+    rng = np.random.default_rng(1)
+    for _ in range(30):
+        n_players = int(rng.integers(2, 5))
+        server, vec = _vec_with_deck(monkeypatch, n_players, list(rng.permutation(len(STANDARD_DECK))))
+
+        # stop before a reshuffle since both engines shuffle with their own rng.
+        while vec.playing[0] and vec.draw_len[0] > 10:
+            seat = int(rng.integers(n_players)) if rng.random() < .3 else int(vec.current[0])
+            legal = np.flatnonzero(vec.legal_mask(np.array([seat]))[0])
+            # mostly legal moves with the odd illegal one
+            a = int(rng.choice(legal)) if rng.random() < .9 else int(rng.integers(vs.N_ACTIONS))
+
+            p = server.get_player(seat + 1)
+            p.take_action(_to_request(a))
+            while server.request_queue:
+                server.process_request(server.request_queue.popleft())
+            vec.step(np.array([a]), np.array([seat]))
+
+            if not vec.playing[0]:
+                assert server.playing is False
+                assert p.result == "Winner"
+                assert vec.winner[0] == seat
+                break
+            _assert_same_state(server, vec)
+
+def test_statuses():
+    vec = VecUnoServer(4, 2, seed=3)
+    hand = vec.hands[:, 1].copy()
+    status = vec.step(np.full(4, vs.ACTION_DRAW), seats=(vec.current + 1) % 2)
+    assert (status == vs.NOT_YOUR_TURN).all()
+    assert (vec.hands[:, 1] == hand).all()
+
+    vec.playing[0] = False
+    status = vec.step(np.full(4, vs.N_ACTIONS))
+    assert status[0] == vs.GAME_OVER
+    assert (status[1:] == vs.INVALID_REQUEST).all()
+
+def test_reshuffle_keeps_top_card():
+    vec = VecUnoServer(8, 2, seed=4)
+    top = vec.top.copy()
+    total = vec.draw_len + vec.discard.sum(axis=1) + vec.hand_sizes.sum(axis=1) + 1
+    for _ in range(120):
+        vec.must_draw_count[:] = 0
+        vec.step(np.full(8, vs.ACTION_DRAW))
+    assert (vec.top == top).all()
+    assert (vec.draw_len + vec.discard.sum(axis=1) + vec.hand_sizes.sum(axis=1) + 1 == total).all()
+
+def test_play_action():
+    assert vs.play_action("R0") == 0
+    assert vs.ACTION_KIND[vs.play_action("WF", "B")] == vs.WF
+    assert vs.COLORS[vs.ACTION_COLOR[vs.play_action("WW", "G")]] == "G"
+
+def test_observation_renders_like_server(monkeypatch):
+    rng = np.random.default_rng(2)
+    server, vec = _vec_with_deck(monkeypatch, 3, list(rng.permutation(len(STANDARD_DECK))))
+    for _ in range(40):
+        seat = int(vec.current[0])
+        legal = np.flatnonzero(vec.legal_mask()[0])
+        a = int(rng.choice(legal))
+        server.get_player(seat + 1).take_action(vs.action_request(a))
+        while server.request_queue:
+            server.process_request(server.request_queue.popleft())
+        vec.step(np.array([a]))
+        if not vec.playing[0]:
+            break
+
+        for p in server.players:
+            p.clear_messages()
+            expected = server.build_context(p, p == server.next_player)
+            obs = vec.observe(np.array([p.id - 1]))[0]
+            assert (server.observe(p) == obs).all()
+            got = vs.render_observation(obs)
+            # vec hands are counts, so cards come out in kind order.
+            expected[1] = " ".join(sorted(expected[1].split(), key=vs.KIND_ID.get))
+            assert got == expected
+
+def test_action_request():
+    assert vs.action_request(vs.play_action("WW", "G")) == {
+        "action": "Play card", "card": "WW", "nextColor": "G"
+    }
+    assert vs.action_request(vs.ACTION_UNO) == {"action": "Yell UNO"}
@@ -0,0 +1,291 @@
+"""Training scenarios built in batches with NumPy.
+
+The scenarios in generate_train_data.py set up a whole UnoServer per sample, which
+makes Python do a little work per card. Here thousands of states are sampled at once
+as arrays: player counts, Poisson hand sizes, a shuffled deck per state with the
+hands dealt as slices of it, and the split of what is left between the draw and
+discard piles. Every scenario's constraints are applied with masks over the whole
+batch, and prompt strings are only rendered at the very end.
+
+The states are distributed like random_game_state's and the scenarios ask for the
+same answers, but a seed does not give the same samples as the server engine.
+
+    batch = build_batch("play_wild", 4096, np.random.default_rng(0))
+    samples = render_batch(batch, PromptBuilder(), strategy)
+"""
+
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+
+from uno.card import CARDS, CARD_ID, COLORS
+from uno.prompt import PromptBuilder, render_context
+from uno.vecserver import (
+    KIND_COLOR, KIND_IS_WILD, KIND_VALUE, N_PLAY_ACTIONS, PLAYABLE, STANDARD_KINDS, WF, WW
+)
+
+MAX_PLAYERS = 6
+# poisson(5) hands are capped so every state's hands fit in one deck.
+MAX_HAND = 15
+HAND_MEAN = 5
+N_COLORS = 4
+N_SYMBOLS = N_PLAY_ACTIONS // N_COLORS
+
+DECK = STANDARD_KINDS.astype(np.int64)
+NON_WILD_DECK = DECK[~KIND_IS_WILD[DECK]]
+FORCING = np.array([CARD_ID[c] for c in ("WF", "RD", "YD", "GD", "BD")])
+
+@dataclass
+class Batch:
+    "Game states, one row each, seen by the player about to act."
+    n_players: np.ndarray   # (n,)
+    current: np.ndarray     # (n,) seat of the player to act. seat s is player s + 1.
+    counts: np.ndarray      # (n, MAX_PLAYERS) cards in every hand, 0 for empty seats
+    shielded: np.ndarray    # (n, MAX_PLAYERS)
+    hand: np.ndarray        # (n, MAX_HAND) current player's cards in order, -1 padded
+    deck: np.ndarray        # (n, 108) shuffled deck the hands were dealt from
+    offsets: np.ndarray     # (n, MAX_PLAYERS) where every seat's hand starts in deck
+    top: np.ndarray         # (n,)
+    next_color: np.ndarray  # (n,)
+    draw_count: np.ndarray  # (n,)
+    must_draw: np.ndarray   # (n,)
+    # the answer. card and color are only set for plays.
+    action: str = ""
+    card: np.ndarray | None = None
+    color: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.top)
+
+    @property
+    def rows(self) -> np.ndarray:
+        return np.arange(len(self))
+
+    @property
+    def hand_len(self) -> np.ndarray:
+        return self.counts[self.rows, self.current]
+
+def random_states(n: int, rng: np.random.Generator) -> Batch:
+    "n random game states, like random_game_state makes, without shields."
+    n_players = rng.integers(2, MAX_PLAYERS + 1, n)
+    current = rng.integers(0, n_players)
+    rows = np.arange(n)
+
+    # nobody has 0 cards. seats past n_players are empty.
+    counts = np.clip(rng.poisson(HAND_MEAN, (n, MAX_PLAYERS)), 1, MAX_HAND)
+    counts[np.arange(MAX_PLAYERS) >= n_players[:, None]] = 0
+
+    # deck[0] starts the discard pile, then every hand in seat order.
+    deck = rng.permuted(np.tile(DECK, (n, 1)), axis=1)
+    offsets = 1 + np.cumsum(counts, axis=1) - counts
+    slots = np.arange(MAX_HAND)
+    hand = np.take_along_axis(deck, offsets[rows, current][:, None] + slots, axis=1)
+    hand[slots >= counts[rows, current][:, None]] = -1
+
+    # randomly split leftover cards between discard pile and deck.
+    dealt = 1 + counts.sum(axis=1)
+    left = len(DECK) - dealt
+    split = rng.integers(1, left + 1)
+    top = deck[rows, dealt + split - 1]
+
+    batch = Batch(
+        n_players, current, counts, np.zeros_like(counts, dtype=bool), hand, deck,
+        offsets, top, np.zeros(n, dtype=np.int64), left - split, np.zeros(n, dtype=np.int64)
+    )
+    _set_top(batch, rows, top, rng)
+    return batch
+
+def _set_top(b: Batch, rows: np.ndarray, top: np.ndarray, rng: np.random.Generator):
+    "Puts top on the discard pile. Wild cards get a random chosen color."
+    b.top[rows] = top
+    b.next_color[rows] = np.where(
+        KIND_IS_WILD[top], rng.integers(0, N_COLORS, len(rows)), KIND_COLOR[top]
+    )
+
+def _shield_players(b: Batch):
+    b.shielded = b.counts == 1
+
+def _choose(mask: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    "A uniformly random True column of every row. Every row needs one."
+    return np.argmax(np.where(mask, rng.random(mask.shape), -1), axis=1)
+
+def _random_slot(b: Batch, rng: np.random.Generator) -> np.ndarray:
+    return (rng.random(len(b)) * b.hand_len).astype(np.int64)
+
+def _playable_in_hand(b: Batch) -> np.ndarray:
+    "(n, MAX_HAND) which cards in hand may be played."
+    return (b.hand >= 0) & PLAYABLE[
+        b.hand.clip(0), b.top[:, None], b.next_color[:, None]
+    ]
+
+def _playable_kinds(b: Batch) -> np.ndarray:
+    "(n, 52) which non-wild card kinds may be played."
+    return PLAYABLE[:N_PLAY_ACTIONS, b.top, b.next_color].T
+
+def _keep(b: Batch, keep: np.ndarray):
+    "Drops the current player's cards where keep is False, keeping their order."
+    order = np.argsort(~keep, axis=1, kind="stable")
+    b.hand = np.take_along_axis(np.where(keep, b.hand, -1), order, axis=1)
+    b.counts[b.rows, b.current] = keep.sum(axis=1)
+
+def _non_wild_top(b: Batch, rng: np.random.Generator):
+    "Replaces wild top cards with a card from the deck that is not wild."
+    wild = np.flatnonzero(KIND_IS_WILD[b.top])
+    _set_top(b, wild, rng.choice(NON_WILD_DECK, len(wild)), rng)
+
+def _down_to_one(b: Batch, seat: np.ndarray, rng: np.random.Generator):
+    "Seat plays every card but its first. The last one played ends up on top."
+    rows = np.flatnonzero(b.counts[b.rows, seat] > 1)
+    _set_top(b, rows, b.deck[rows, b.offsets[rows, seat[rows]] + 1], rng)
+    b.counts[rows, seat[rows]] = 1
+    b.hand[b.current == seat, 1:] = -1
+
+# for each of these scenarios, take random game states
+# and then apply custom requirements to all of them at once.
+
+def draw_needed_forced(b: Batch, rng: np.random.Generator):
+    _shield_players(b)
+    # the top card forces draws.
+    _set_top(b, b.rows, rng.choice(FORCING, len(b)), rng)
+    b.must_draw = np.where(
+        KIND_IS_WILD[b.top], rng.integers(1, 5, len(b)), rng.integers(1, 3, len(b))
+    )
+    b.action = "Draw card"
+
+def draw_needed_no_playable(b: Batch, rng: np.random.Generator):
+    _shield_players(b)
+    # nothing in hand is playable.
+    _keep(b, (b.hand >= 0) & ~_playable_in_hand(b))
+
+    # what if all cards in hand were playable? hand them one that is not.
+    empty = np.flatnonzero(b.hand_len == 0)
+    b.hand[empty, 0] = _choose(~_playable_kinds(b)[empty], rng)
+    b.counts[empty, b.current[empty]] = 1
+    b.action = "Draw card"
+
+def draw_unneeded(b: Batch, rng: np.random.Generator):
+    "There is a valid move but you draw anyway."
+    _shield_players(b)
+    # a random card in hand is made playable if it is not.
+    slot = _random_slot(b, rng)
+    ok = _playable_in_hand(b)[b.rows, slot]
+    b.hand[b.rows, slot] = np.where(
+        ok, b.hand[b.rows, slot], _choose(_playable_kinds(b), rng)
+    )
+    b.action = "Draw card"
+
+def play_regular_symbol(b: Batch, rng: np.random.Generator):
+    _shield_players(b)
+    _non_wild_top(b, rng)
+    # a random card in hand matches the symbol of the top card.
+    b.card = rng.integers(0, N_COLORS, len(b)) * N_SYMBOLS + KIND_VALUE[b.top]
+    b.hand[b.rows, _random_slot(b, rng)] = b.card
+    b.action = "Play card"
+
+def play_regular_color(b: Batch, rng: np.random.Generator):
+    _shield_players(b)
+    _non_wild_top(b, rng)
+    # a random card in hand matches the color of the top card.
+    b.card = KIND_COLOR[b.top].astype(np.int64) * N_SYMBOLS + rng.integers(0, N_SYMBOLS, len(b))
+    b.hand[b.rows, _random_slot(b, rng)] = b.card
+    b.action = "Play card"
+
+def play_wild(b: Batch, rng: np.random.Generator):
+    _shield_players(b)
+    # a random card in hand is a wild card. the top card is left alone.
+    b.card = rng.choice([WW, WF], len(b))
+    b.hand[b.rows, _random_slot(b, rng)] = b.card
+
+    # choose a color in hand, or any color if they only have wild cards.
+    held = b.hand.clip(0)
+    colors = (b.hand >= 0)[:, :, None] & (KIND_COLOR[held][:, :, None] == np.arange(N_COLORS))
+    colors = colors.any(axis=1)
+    colors[~colors.any(axis=1)] = True
+    b.color = _choose(colors, rng)
+    b.action = "Play card"
+
+def uno_defense(b: Batch, rng: np.random.Generator):
+    # all OTHER players with one card are shielded.
+    _down_to_one(b, b.current, rng)
+    _shield_players(b)
+    b.shielded[b.rows, b.current] = False
+    b.action = "Yell UNO"
+
+def uno_offense(b: Batch, rng: np.random.Generator):
+    # a different player has one card and no shield. everyone else is shielded.
+    target = (b.current + rng.integers(1, b.n_players)) % b.n_players
+    _down_to_one(b, target, rng)
+    _shield_players(b)
+    b.shielded[b.rows, target] = False
+    b.action = "Yell UNO"
+
+SCENARIOS = {
+    "draw_needed_forced": draw_needed_forced,
+    "draw_needed_no_playable": draw_needed_no_playable,
+    "draw_unneeded": draw_unneeded,
+    "play_regular_symbol": play_regular_symbol,
+    "play_regular_color": play_regular_color,
+    "play_wild": play_wild,
+    "uno_defense": uno_defense,
+    "uno_offense": uno_offense
+}
+
+def build_batch(k: str, n: int, rng: np.random.Generator) -> Batch:
+    """n states of scenario k, with their answers. Nothing is rendered yet.
+
+    Args:
+        k (str): Scenario name, see SCENARIOS.
+        n (int): Number of states.
+        rng (np.random.Generator): Where the randomness comes from.
+
+    Returns:
+        Batch: The states.
+    """
+    if k not in SCENARIOS:
+        raise ValueError(f"Invalid key {k} in ratios.")
+    b = random_states(n, rng)
+    SCENARIOS[k](b, rng)
+    return b
+
+def render_batch(
+    b: Batch, prompts: PromptBuilder, strategy: str | None, rows: Iterable[int] | None=None
+) -> list[dict]:
+    """The batch as training samples: {'input': prompt, 'output': answer}.
+
+    Args:
+        b (Batch): The states.
+        prompts (PromptBuilder): Renders the prompts.
+        strategy (str | None): Strategy shown in every prompt.
+        rows (Iterable[int], optional): Only render these states. Defaults to all.
+    """
+    # plain python values, so samples hold no numpy types.
+    n_players, counts, shielded = b.n_players.tolist(), b.counts.tolist(), b.shielded.tolist()
+    hands, hand_len = b.hand.tolist(), b.hand_len.tolist()
+    tops, next_color = b.top.tolist(), b.next_color.tolist()
+    draw_count, must_draw = b.draw_count.tolist(), b.must_draw.tolist()
+    cards = b.card.tolist() if b.card is not None else None
+    colors = b.color.tolist() if b.color is not None else None
+
+    samples = []
+    for i in range(len(b)) if rows is None else rows:
+        messages = []
+        if must_draw[i]:
+            messages.append(f"You must draw {must_draw[i]} card(s)")
+        if KIND_IS_WILD[tops[i]]:
+            messages.append(f"Chosen color: {COLORS[next_color[i]]}")
+        context = render_context(
+            [CARDS[c] for c in hands[i][:hand_len[i]]],
+            ((s + 1, counts[i][s], shielded[i][s]) for s in range(n_players[i])),
+            draw_count[i],
+            CARDS[tops[i]],
+            messages
+        )
+
+        output = {"action": b.action}
+        if cards is not None:
+            output["card"] = CARDS[cards[i]]
+        if colors is not None:
+            output["nextColor"] = COLORS[colors[i]]
+        samples.append({"input": prompts.render(context, strategy), "output": output})
+    return samples
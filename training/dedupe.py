@@ -0,0 +1,138 @@
+"""Finds duplicate training samples.
+
+Random states repeat a lot: small hands and common top cards come up again and
+again, and every repeat costs generation and fine-tuning time without teaching
+anything. state_hashes gives every state of a batch (see batch_scenarios.py) a
+canonical hash of what the player is shown and the answer: the hand as a multiset,
+the top card, the chosen color, every player's card count and shield, must-draw and
+the answer. Samples which only differ in the order of the hand or the size of the
+draw deck hash the same.
+
+DedupeIndex keeps the hashes on disk, so every shard of a dataset only keeps states
+no shard kept before, in any worker and across resumed runs.
+"""
+
+from contextlib import contextmanager
+from hashlib import blake2b
+import sqlite3
+
+import numpy as np
+
+from training.batch_scenarios import Batch
+from training.shards import Shard
+from uno.vecserver import KIND_IS_WILD, N_KINDS
+
+ACTIONS = ("Draw card", "Play card", "Yell UNO", "Do nothing")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (hash BLOB PRIMARY KEY, shard TEXT NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_shard ON seen (shard);
+CREATE TABLE IF NOT EXISTS shards (
+    file TEXT PRIMARY KEY, key TEXT NOT NULL, generated INTEGER NOT NULL,
+    kept INTEGER NOT NULL
+);
+"""
+
+def state_hashes(b: Batch) -> list[bytes]:
+    "A 16 byte canonical hash of every state in the batch and its answer."
+    n = len(b)
+    rows = np.arange(n)
+
+    # the hand as counts per card kind, so its order does not matter.
+    slots = np.where(b.hand >= 0, rows[:, None] * N_KINDS + b.hand, n * N_KINDS)
+    hand = np.bincount(slots.ravel(), minlength=n * N_KINDS + 1)[:-1].reshape(n, N_KINDS)
+
+    # the chosen color is only shown (and only matters) on wild cards.
+    next_color = np.where(KIND_IS_WILD[b.top], b.next_color, -1)
+    card = b.card if b.card is not None else np.full(n, -1)
+    color = b.color if b.color is not None else np.full(n, -1)
+    features = np.column_stack([
+        hand, b.top, next_color, b.counts, b.shielded, b.must_draw,
+        np.full(n, ACTIONS.index(b.action)), card, color
+    ]).astype(np.int16)
+    return [blake2b(row, digest_size=16).digest() for row in features]
+
+class DedupeIndex:
+    def __init__(self, path: str):
+        """Hashes of the samples already in a dataset, in a sqlite file.
+
+        Args:
+            path (str): Index file. Created if needed. Several processes may share it.
+        """
+        # workers take turns writing, so wait for each other rather than failing.
+        self.db = sqlite3.connect(path, timeout=600, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Runs the statements inside as one transaction, rolled back on errors.
+        Autocommit connections open none on their own, so `with self.db` would not.
+        IMMEDIATE takes the write lock up front, so workers sharing the file queue up
+        instead of failing to upgrade a read.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def begin_shard(self, shard: Shard):
+        "Forgets what an earlier, interrupted attempt at the shard kept."
+        with self._transaction():
+            self.db.execute("DELETE FROM seen WHERE shard = ?", (shard.file,))
+            self.db.execute("DELETE FROM shards WHERE file = ?", (shard.file,))
+
+    def add(self, shard: Shard, hashes: list[bytes], limit: int) -> tuple[list[int], int]:
+        """Keeps the states whose hashes were never seen, up to limit of them.
+
+        Args:
+            shard (Shard): The shard keeping them.
+            hashes (list[bytes]): Hashes of a batch of states, see state_hashes.
+            limit (int): Most states to keep.
+
+        Returns:
+            tuple[list[int], int]: The indices of the kept states and how many states
+                were looked at to find them.
+        """
+        kept = []
+        looked = 0
+        with self._transaction():
+            insert = self.db.cursor()
+            for i, h in enumerate(hashes):
+                if len(kept) == limit:
+                    break
+                insert.execute("INSERT OR IGNORE INTO seen VALUES (?, ?)", (h, shard.file))
+                if insert.rowcount == 1:
+                    kept.append(i)
+                looked = i + 1
+        return kept, looked
+
+    def finish_shard(self, shard: Shard, generated: int, kept: int):
+        "Records how many states the shard went through to keep what it kept."
+        with self._transaction():
+            self.db.execute(
+                "INSERT OR REPLACE INTO shards VALUES (?, ?, ?, ?)",
+                (shard.file, shard.key, generated, kept)
+            )
+
+    def yields(self) -> dict[str, dict]:
+        "Per scenario, states generated, unique samples kept and their ratio."
+        rows = self.db.execute(
+            "SELECT key, SUM(generated), SUM(kept) FROM shards GROUP BY key ORDER BY key"
+        )
+        return {
+            key: {"generated": generated, "unique": kept, "yield": kept / generated if generated else 0.}
+            for key, generated, kept in rows
+        }
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
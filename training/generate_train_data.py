@@ -1,70 +1,218 @@
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import Counter
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
 import logging
-import json
-from math import ceil
+from math import exp, floor, isclose
+import multiprocessing
+import os
 import random
-from typing import get_args
+from typing import Iterator, get_args
 
 import numpy as np
 from tqdm import tqdm
 import uno
-
-def generate_training_data(n: int, out: str, seed: int=None, ratios: dict=None):
+from uno.card import PLAYABLE_ON, color, color_id
+from uno.prompt import PromptBuilder
+from uno.seeding import fresh_seed, split_seed
+from training.batch_scenarios import build_batch, render_batch
+from training.dedupe import DedupeIndex, state_hashes
+from training.shards import (
+    MANIFEST, Shard, finish_manifest, is_done, open_manifest, read_manifest, write_shard
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATIOS = {
+    "draw_needed_forced": .10,
+    "draw_needed_no_playable": .15,
+    "draw_unneeded": .05,
+
+    "play_regular_symbol": .25,
+    "play_regular_color": .25,
+    "play_wild": .1,
+
+    "uno_defense": .05,
+    "uno_offense": .05
+}
+
+def generate_training_data(
+    n: int, out: str, seed: int=None, ratios: dict=None, shard_size: int=10_000,
+    workers: int | None=None, engine: str="numpy", unique: bool=False
+) -> str:
     """Generates training data for our agents to learn from.
 
+    Samples are streamed into JSONL shards under training/{out}/ as they are made, so
+    memory stays flat however large n is. The directory's manifest.json records how
+    every shard is made. Running again with the same arguments resumes an interrupted
+    run, only generating the shards that are missing.
+
+    Every shard is a separate task with its own seed and at most shard_size samples,
+    whatever its scenario, so no one scenario holds up the rest and the work spreads
+    evenly over the workers.
+
     Args:
         n (int): Number of samples to generate.
-        out (str): Filename for json output
-        seed (int, optional): What seed to use.
+        out (str): Name of the dataset directory.
+        seed (int, optional): What seed to use. Every shard gets its own seed split
+            from it, so the same seed gives the same data however the work is
+            spread over processes. Defaults to fresh entropy, saved in the manifest.
         ratios (dict, optional): Custom ratios for each scenario.
+        shard_size (int, optional): Most samples per shard, which is also how much
+            work a worker is handed at a time. Defaults to 10,000.
+        workers (int, optional): Worker processes. Defaults to one per CPU.
+        engine (str, optional): "numpy" builds samples in batches of arrays (see
+            batch_scenarios.py). "server" sets up an UnoServer per sample, which is
+            much slower. Defaults to "numpy".
+        unique (bool, optional): Only keep samples whose state and answer no other
+            sample has (see dedupe.py), so every scenario gets its share of n as
+            unique samples. The hashes are kept in the dataset's index.sqlite and
+            the unique yield of every scenario is logged and saved in the manifest.
+            Which shard keeps a state shared by shards running at the same time
+            depends on timing. Needs the numpy engine. Defaults to False.
+
+    Returns:
+        str: The dataset directory.
     """
-    if seed:
-        random.seed(seed)
-        np.random.seed(seed)
-
-    if not ratios:
-        ratios = {
-            "draw_needed_forced": .10,
-            "draw_needed_no_playable": .15,
-            "draw_unneeded": .05,
-
-            "play_regular_symbol": .25,
-            "play_regular_color": .25,
-            "play_wild": .1,
-
-            "uno_defense": .05,
-            "uno_offense": .05
-        }
-
-    if sum(ratios.values()) != 1:
+    ratios = ratios or DEFAULT_RATIOS
+    if not isclose(sum(ratios.values()), 1):
         raise ValueError("Ratios must add to 1.")
+    for k in ratios:
+        scenario(k)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}, pick one of {ENGINES}.")
+    if unique and engine != "numpy":
+        raise ValueError("Unique samples need the numpy engine.")
+
+    # TODO configure where to save training data
+    out_dir = os.path.join("training", out)
+    manifest = resume_or_plan(out_dir, n, seed, ratios, shard_size, engine, unique)
+
+    todo = interleave([
+        shard for shard in map(lambda s: Shard(**s), manifest["shards"])
+        if not is_done(out_dir, shard)
+    ])
 
-    data: list[dict] = []
+    # samples made so far, shared with the workers.
+    progress = multiprocessing.Value("q", 0)
 
     # generate scenarios
-    with ProcessPoolExecutor() as executor:
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(progress,)
+    ) as executor, tqdm(
+        total=sum(shard.count for shard in todo), desc="Generating train set data.",
+        unit="sample"
+    ) as bar:
         # submit all tasks
-        futures = {
-            executor.submit(generate_data_for_key, k, ceil(r*n)): k
-            for k, r in ratios.items()
+        pending = {
+            executor.submit(generate_shard, out_dir, shard, engine, unique) for shard in todo
         }
 
-        # collect results are they complete
-        for future in tqdm(
-            as_completed(futures),
-            total=len(futures),
-            desc="Generating train set data."
-        ):
-            data.extend(future.result())
-
-    # TODO configure where to save training data
-    with open(f"training/{out}.json", 'w', encoding="utf-8") as f:
-        json.dump({"data": data[:n]}, f)
-
+        # collect results as they complete
+        while pending:
+            done, pending = wait(pending, timeout=.5, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+            bar.update(progress.value - bar.n)
+
+    if unique:
+        with DedupeIndex(os.path.join(out_dir, INDEX)) as index:
+            manifest["yield"] = index.yields()
+        for k, y in manifest["yield"].items():
+            logger.info(
+                "%s: %d unique samples from %d states (%.1f%%)",
+                k, y["unique"], y["generated"], 100 * y["yield"]
+            )
+    finish_manifest(out_dir, manifest)
+    return out_dir
+
+def resume_or_plan(
+    out_dir: str, n: int, seed: int | None, ratios: dict, shard_size: int, engine: str="numpy",
+    unique: bool=False
+) -> dict:
+    "The manifest of the dataset in out_dir, starting it if needed."
+    if seed is None:
+        # unseeded runs pick a seed up front so they can be resumed.
+        path = os.path.join(out_dir, MANIFEST)
+        seed = read_manifest(out_dir)["plan"]["seed"] if os.path.exists(path) else fresh_seed()
+
+    plan = {"n": n, "seed": seed, "ratios": ratios, "shard_size": shard_size, "engine": engine,
+            "unique": unique}
+
+    # exact counts that add up to n, in ratios order.
+    counts = allocate(n, ratios)
+    shards = []
+    for k, count in counts.items():
+        for i, start in enumerate(range(0, count, shard_size)):
+            shards.append(Shard(f"{k}-{i:05d}.jsonl", k, min(shard_size, count - start), 0))
+    for shard, shard_seed in zip(shards, split_seed(seed, len(shards))):
+        shard.seed = shard_seed
+
+    return open_manifest(out_dir, plan, shards)
+
+def interleave(shards: list[Shard]) -> list[Shard]:
+    "Takes turns between scenarios so every scenario makes progress from the start."
+    turns = Counter()
+    order = []
+    for shard in shards:
+        order.append((turns[shard.key], len(order), shard))
+        turns[shard.key] += 1
+    return [shard for *_, shard in sorted(order)]
+
+def allocate(n: int, ratios: dict) -> dict[str, int]:
+    "Splits n between the ratios, handing leftovers to the largest remainders."
+    exact = {k: r * n for k, r in ratios.items()}
+    counts = {k: floor(x) for k, x in exact.items()}
+    leftover = n - sum(counts.values())
+    for k in sorted(exact, key=lambda k: counts[k] - exact[k])[:leftover]:
+        counts[k] += 1
+    return counts
+
+# set in every worker by _init_worker.
+_PROGRESS = None
+# how many samples a worker makes between progress updates.
+PROGRESS_EVERY = 64
+
+def _init_worker(progress):
+    "Sets up a worker once instead of once per shard."
+    global _PROGRESS # pylint: disable=global-statement
+    _PROGRESS = progress
+    # read the resources and render the constant part of the prompt up front.
+    PROMPTS.prefix(STRATEGY)
+
+def generate_shard(out_dir: str, shard: Shard, engine: str="numpy", unique: bool=False):
+    "Writes a shard as its samples are made. Runs in a worker."
+    if not unique:
+        write_shard(out_dir, shard, _counted(iter_data_for_key(shard.key, shard.count, shard.seed, engine)))
+        return
+
+    with DedupeIndex(os.path.join(out_dir, INDEX)) as index:
+        index.begin_shard(shard)
+        stats = {"generated": 0, "kept": 0}
+        write_shard(out_dir, shard, _counted(iter_unique_data_for_key(shard, index, stats)))
+        index.finish_shard(shard, stats["generated"], stats["kept"])
+        if stats["kept"] < shard.count:
+            logger.warning(
+                "%s: only found %d of %d unique samples in %d states.",
+                shard.file, stats["kept"], shard.count, stats["generated"]
+            )
 
-def generate_data_for_key(k: str, n: int) -> list[dict]:
-    # Check if an input key is valid. If so, map it to correct function
-    # and invoke.
+def _counted(samples: Iterator[dict]) -> Iterator[dict]:
+    "Reports samples to the parent as they are made."
+    if _PROGRESS is None:
+        yield from samples
+        return
+    made = 0
+    for sample in samples:
+        yield sample
+        made += 1
+        if made == PROGRESS_EVERY:
+            with _PROGRESS.get_lock():
+                _PROGRESS.value += made
+            made = 0
+    with _PROGRESS.get_lock():
+        _PROGRESS.value += made
+
+def scenario(k: str):
+    # Check if an input key is valid. If so, map it to correct function.
     allowed_entries = {
         "draw_needed_forced": draw_needed_forced,
         "draw_needed_no_playable": draw_needed_no_playable,
@@ -77,21 +225,65 @@ def generate_data_for_key(k: str, n: int) -> list[dict]:
     }
     if k not in allowed_entries:
         raise ValueError(f"Invalid key {k} in ratios.")
+    return allowed_entries[k]
+
+ENGINES = ("numpy", "server")
+# states the numpy engine builds at once.
+BATCH_SIZE = 4096
+# dedupe index of a unique dataset, next to its shards.
+INDEX = "index.sqlite"
+# unique shards give up after this many states per sample.
+MAX_STATES_PER_SAMPLE = 50
+
+def iter_data_for_key(k: str, n: int, seed: int | None=None, engine: str="numpy") -> Iterator[dict]:
+    f = scenario(k)
+    if engine == "numpy":
+        rng = np.random.default_rng(seed)
+        for start in range(0, n, BATCH_SIZE):
+            batch = build_batch(k, min(BATCH_SIZE, n - start), rng)
+            yield from render_batch(batch, PROMPTS, STRATEGY)
+        return
+
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield f(rng)
+
+def iter_unique_data_for_key(shard: Shard, index: DedupeIndex, stats: dict) -> Iterator[dict]:
+    """Samples for the shard whose states are not in the index yet.
+
+    Gives up after MAX_STATES_PER_SAMPLE states per sample asked for, in case the
+    scenario runs out of new states.
 
-    f = allowed_entries[k]
-    return [f() for _ in range(n)]
+    Args:
+        shard (Shard): The shard to make.
+        index (DedupeIndex): Hashes of every sample kept so far.
+        stats (dict): Counts states looked at ("generated") and samples "kept".
+    """
+    rng = np.random.default_rng(shard.seed)
+    max_states = MAX_STATES_PER_SAMPLE * shard.count
+    while stats["kept"] < shard.count and stats["generated"] < max_states:
+        missing = shard.count - stats["kept"]
+        # duplicates are rare at first, so do not build much more than is missing.
+        batch = build_batch(shard.key, min(BATCH_SIZE, max(2 * missing, 64)), rng)
+        rows, looked = index.add(shard, state_hashes(batch), missing)
+        stats["generated"] += looked
+        stats["kept"] += len(rows)
+        yield from render_batch(batch, PROMPTS, STRATEGY, rows)
+
+def generate_data_for_key(k: str, n: int, seed: int | None=None, engine: str="numpy") -> list[dict]:
+    return list(iter_data_for_key(k, n, seed, engine))
+
+# agents are not needed to render prompts, just their strategy.
+STRATEGY = "Do what you need to do to win"
+PROMPTS = PromptBuilder()
 
 def create_input(server: uno.UnoServer, p: uno.Player) -> str:
     "Abstracts away some nastiness"
-    return p.agent.build_prompt(
-        p.create_prompt(
-            server.build_context(server.next_player, True)
-            )
-        )
+    return PROMPTS.render(server.build_context(p, True), STRATEGY)
 
-def random_card_no_wild() -> uno.Card:
+def random_card_no_wild(rng: random.Random) -> uno.Card:
     "DOES NOT RETURN WILD CARDS"
-    return random.choice(get_args(uno.Color)) + random.choice(get_args(uno.Symbol))
+    return rng.choice(get_args(uno.Color)) + rng.choice(get_args(uno.Symbol))
 
 def shield_players(server: uno.UnoServer) -> uno.UnoServer:
     for p in server.players:
@@ -106,44 +298,55 @@ def shield_all_others(server: uno.UnoServer) -> uno.UnoServer:
             p.is_shielded = True
     return server
 
-def random_card_in_hand(server: uno.UnoServer) -> str:
-    return random.randint(0,len(server.next_player.hand)-1)
+def random_card_in_hand(server: uno.UnoServer, rng: random.Random) -> str:
+    return rng.randint(0,len(server.next_player.hand)-1)
+
+def playable(c: uno.Card, tc: uno.Card, next_color: uno.Color | None) -> bool:
+    """Same rule as UnoServer.valid and legal_actions. Blank slate servers never chose
+    a color, so the top card's color counts then.
+    """
+    return PLAYABLE_ON[uno.card_id(c)][uno.card_id(tc)][color_id(next_color or color(tc))]
 
-def playable(c: uno.Card, tc: uno.Card, next_color: uno.Color) -> bool:
-    return uno.is_wild(c) or c[0] == tc[0] or c[1] == tc[1] or c[0] == next_color
+def poisson(rng: random.Random, lam: float) -> int:
+    "Knuth's method, plenty fast for small lam."
+    limit, k, p = exp(-lam), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
 
 # for each of these scenarios, generate a random game state
 # and then apply custom requirements.
 
-def draw_needed_forced() -> dict:
-    server = random_game_state()
+def draw_needed_forced(rng: random.Random) -> dict:
+    server = random_game_state(rng)
     server = shield_players(server)
 
     # set top card to be a card which forces draws
-    server.deck.discard_pile[-1] = random.choice([
-        'WF', 'DR', 'DY', 'DG', 'DB'
-    ])
+    server.deck.discard_pile[-1] = uno.card_id(rng.choice([
+        'WF', 'RD', 'YD', 'GD', 'BD'
+    ]))
 
     # set current player must_draw to a number
     if uno.is_wild(server.deck.top_card_on_discard_pile()):
-        server.must_draw_count = random.randint(1,4)
+        server.must_draw_count = rng.randint(1,4)
     else:
-        server.must_draw_count = random.randint(1,2)
+        server.must_draw_count = rng.randint(1,2)
 
     return {
         "input": ''.join(create_input(server, server.next_player)),
         "output": {"action": "Draw card"}
     }
 
-def draw_needed_no_playable() -> list[dict]:
-    server = random_game_state()
+def draw_needed_no_playable(rng: random.Random) -> list[dict]:
+    server = random_game_state(rng)
     server = shield_players(server)
 
     # look at top card. make sure nothing in your hand is playable.
     top_card = server.deck.top_card_on_discard_pile()
 
     if uno.is_wild(top_card):
-        server.next_color = random.choice(get_args(uno.Color))
+        server.next_color = rng.choice(get_args(uno.Color))
 
     server.next_player.hand = list(filter(
         lambda c: not playable(c, top_card, server.next_color),
@@ -153,9 +356,9 @@ def draw_needed_no_playable() -> list[dict]:
     # what if all cards in hand were playable?
     # generate a random cards until one is not playable. add to hand.
     if not server.next_player.hand:
-        random_card = random_card_no_wild()
+        random_card = random_card_no_wild(rng)
         while playable(random_card, top_card, server.next_color):
-            random_card = random_card_no_wild()
+            random_card = random_card_no_wild(rng)
 
         server.next_player.hand = [random_card]
 
@@ -164,42 +367,28 @@ def draw_needed_no_playable() -> list[dict]:
         "output": {"action": "Draw card"}
     }
 
-def draw_unneeded() -> list[dict]:
+def draw_unneeded(rng: random.Random) -> list[dict]:
     "Create a situation where there is a valid move but you draw anyway. TODO this might pollute train set..."
-    server = random_game_state()
+    server = random_game_state(rng)
     server = shield_players(server)
 
     # look at top card. make sure there is a card in your hand that is playable.
     top_card = server.deck.top_card_on_discard_pile()
 
     if uno.is_wild(top_card):
-        server.next_color = random.choice(get_args(uno.Color))
+        server.next_color = rng.choice(get_args(uno.Color))
 
-    random_card_i = random_card_in_hand(server)
+    random_card_i = random_card_in_hand(server, rng)
     while not playable(server.next_player.hand[random_card_i], server.deck.top_card_on_discard_pile(), server.next_color):
-        server.next_player.hand[random_card_i] = random_card_no_wild()
-
-    server.next_player.hand = list(filter(
-        lambda c: not playable(c, top_card, server.next_color),
-        server.next_player.hand
-    ))
-
-    # what if all cards in hand were playable?
-    # generate a random cards until one is not playable. add to hand.
-    if not server.next_player.hand:
-        random_card = random_card_no_wild()
-        while playable(random_card, top_card, server.next_color):
-            random_card = random_card_no_wild()
-
-        server.next_player.hand = [random_card]
+        server.next_player.hand[random_card_i] = random_card_no_wild(rng)
 
     return {
         "input": ''.join(create_input(server, server.next_player)),
         "output": {"action": "Draw card"}
     }
 
-def play_regular_symbol() -> list[dict]:
-    server = random_game_state()
+def play_regular_symbol(rng: random.Random) -> list[dict]:
+    server = random_game_state(rng)
     server = shield_players(server)
 
     # make sure top card on discard is not wild.
@@ -209,8 +398,8 @@ def play_regular_symbol() -> list[dict]:
         top_card = server.deck.top_card_on_discard_pile()
 
     # create a random card in hand to match symbol of top card.
-    c = random.choice(get_args(uno.Color))
-    random_card_i = random_card_in_hand(server)
+    c = rng.choice(get_args(uno.Color))
+    random_card_i = random_card_in_hand(server, rng)
     random_card = c + top_card[1]
     server.next_player.hand[random_card_i] = random_card
 
@@ -219,8 +408,8 @@ def play_regular_symbol() -> list[dict]:
         "output": {"action": "Play card", "card": random_card}
     }
 
-def play_regular_color() -> list[dict]:
-    server = random_game_state()
+def play_regular_color(rng: random.Random) -> list[dict]:
+    server = random_game_state(rng)
     server = shield_players(server)
 
     # make sure top card on discard is not wild.
@@ -230,8 +419,8 @@ def play_regular_color() -> list[dict]:
         top_card = server.deck.top_card_on_discard_pile()
 
     # create a random card in hand to match color of top card.
-    s = random.choice(get_args(uno.Symbol))
-    random_card_i = random_card_in_hand(server)
+    s = rng.choice(get_args(uno.Symbol))
+    random_card_i = random_card_in_hand(server, rng)
     random_card = top_card[0] + s
     server.next_player.hand[random_card_i] = random_card
 
@@ -240,32 +429,32 @@ def play_regular_color() -> list[dict]:
         "output": {"action": "Play card", "card": random_card}
     }
 
-def play_wild() -> list[dict]:
-    server = random_game_state()
+def play_wild(rng: random.Random) -> list[dict]:
+    server = random_game_state(rng)
     server = shield_players(server)
 
     # this function applies if wild is on top so leave top_card alone.
 
     # Force random card in hand to be a wild card
-    random_wild = random.choice(["WW", "WF"])
-    random_card_i = random_card_in_hand(server)
+    random_wild = rng.choice(["WW", "WF"])
+    random_card_i = random_card_in_hand(server, rng)
     server.next_player.hand[random_card_i] = random_wild
 
     # choose a color in hand
     colors_in_hand = set(map(lambda c: c[0], server.next_player.hand)) - {'W'}
     # what if they only had wild cards in hand? choose a random color
     if not colors_in_hand:
-        c = random.choice(get_args(uno.Color))
+        c = rng.choice(get_args(uno.Color))
     else:
-        c = random.choice(list(colors_in_hand))
+        c = rng.choice(list(colors_in_hand))
 
     return {
         "input": ''.join(create_input(server, server.next_player)),
         "output": {"action": "Play card", "card": random_wild, "nextColor": c}
     }
 
-def uno_defense() -> list[dict]:
-    server = random_game_state()
+def uno_defense(rng: random.Random) -> list[dict]:
+    server = random_game_state(rng)
     server = shield_players(server)
 
     # all OTHER players must be shielded.
@@ -275,24 +464,24 @@ def uno_defense() -> list[dict]:
     current_p = server.next_player
     while len(current_p.hand) > 1:
         server.deck.play(current_p.hand.pop())
+    # shield_players may have shielded them already.
+    current_p.is_shielded = False
 
     return {
         "input": ''.join(create_input(server, server.next_player)),
         "output": {"action": "Yell UNO"}
     }
 
-def uno_offense() -> list[dict]:
-    server = random_game_state()
+def uno_offense(rng: random.Random) -> list[dict]:
+    server = random_game_state(rng)
     server = shield_players(server)
 
-    # force a different player to have only one card.
-    random_player_i = 0
-    while server.players[random_player_i] != server.next_player:
-        random_player_i = random.randint(0,len(server.players)-1)
-
-    target_p = server.players[random_player_i]
+    # force a different player, picked uniformly, to have only one card.
+    target_p = rng.choice([p for p in server.players if p != server.next_player])
     while len(target_p.hand) > 1:
         server.deck.play(target_p.hand.pop())
+    # shield_players may have shielded them already.
+    target_p.is_shielded = False
 
     # all players but them must have shields
     for p in server.players:
@@ -306,29 +495,26 @@ def uno_offense() -> list[dict]:
         "output": {"action": "Yell UNO"}
     }
 
-def random_game_state() -> uno.UnoServer:
+def random_game_state(rng: random.Random) -> uno.UnoServer:
     # generate a random number of players
-    n_players = random.randint(2,6)
-    # agents are only used to generate relevant prompts
-    s = "Do what you need to do to win"
-    agents = [uno.LLMAgent(strategy=s) for _ in range(n_players)]
-    server = uno.UnoServer(agents, blank_slate=True, log_level=logging.ERROR)
-    random_player_i = random.randint(0,len(server.players)-1)
+    n_players = rng.randint(2,6)
+    server = uno.UnoServer(n_players, blank_slate=True, log_level=logging.ERROR, seed=rng)
+    random_player_i = rng.randint(0,len(server.players)-1)
     server.next_player = server.players[random_player_i]
 
     # give a random number of cards to each player.
     # using poisson bc of shape and discrete data.
     # no one may have 0 cards.
     for p in server.players:
-        n_cards = max(np.random.poisson(lam=5),1)
+        n_cards = max(poisson(rng, 5),1)
         for _ in range(n_cards):
             p.give(server.deck.draw())
 
     # then randomly split leftover cards between discard pile and deck.
-    split_point = random.randint(1,len(server.deck.cards))
+    split_point = rng.randint(1,len(server.deck.cards))
     for _ in range(split_point):
         server.deck.discard_pile.append(
-            server.deck.draw()
+            server.deck.draw_id()
         )
     return server
 
@@ -0,0 +1,153 @@
+"""Batches sized by tokens instead of examples.
+
+Prompts vary a lot in length (hands and message lists do), so a fixed number of
+examples per batch either wastes most of a batch on padding or runs out of memory
+on the longest prompts. TokenBudgetBatchSampler groups examples of similar length
+and fills every batch up to a budget of padded tokens. probe_max_tokens finds the
+largest budget whose worst batch still fits in GPU memory.
+"""
+
+from typing import Iterator
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+class TokenBudgetBatchSampler(Sampler[list[int]]):
+    def __init__(
+        self, input_lengths: np.ndarray, label_lengths: np.ndarray, max_tokens: int,
+        shuffle: bool=True, seed: int=0, pool_size: int=10_000
+    ):
+        """Yields batches of example indices holding at most max_tokens padded tokens.
+
+        A batch costs (examples) x (longest input + longest label). Examples are
+        shuffled, then sorted by length within pools of pool_size so a batch holds
+        examples of similar length, and the batches themselves are shuffled. An
+        example longer than max_tokens gets a batch of its own.
+
+        Args:
+            input_lengths (np.ndarray): Tokens of every example's input.
+            label_lengths (np.ndarray): Tokens of every example's labels.
+            max_tokens (int): Most padded tokens per batch.
+            shuffle (bool, optional): Shuffle every epoch. Without it the whole
+                dataset is sorted by length. Defaults to True.
+            seed (int, optional): Shuffling seed, combined with the epoch.
+            pool_size (int, optional): Examples sorted together. Bigger pools pad
+                less but make batches less random. Defaults to 10,000.
+        """
+        self.input_lengths = np.asarray(input_lengths)
+        self.label_lengths = np.asarray(label_lengths)
+        self.max_tokens = max_tokens
+        self.shuffle = shuffle
+        self.seed = seed
+        self.pool_size = pool_size if shuffle else max(len(self.input_lengths), 1)
+        self.epoch = 0
+        self._cache: tuple[int, list[list[int]]] | None = None
+
+    def set_epoch(self, epoch: int):
+        "Called by the trainer so every epoch is shuffled differently."
+        self.epoch = epoch
+
+    def batches(self) -> list[list[int]]:
+        "This epoch's batches."
+        if self._cache is None or self._cache[0] != self.epoch:
+            self._cache = (self.epoch, self._make_batches())
+        return self._cache[1]
+
+    def _make_batches(self) -> list[list[int]]:
+        n = len(self.input_lengths)
+        rng = np.random.default_rng([self.seed, self.epoch])
+        order = rng.permutation(n) if self.shuffle else np.arange(n)
+
+        lengths = self.input_lengths + self.label_lengths
+        batches = []
+        for start in range(0, n, self.pool_size):
+            pool = order[start:start + self.pool_size]
+            batches.extend(self._pack(pool[np.argsort(lengths[pool], kind="stable")]))
+
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def _pack(self, indices: np.ndarray) -> list[list[int]]:
+        "Greedily fills batches with indices, in order."
+        batches = []
+        batch, longest_input, longest_label = [], 0, 0
+        for i, n_input, n_label in zip(
+            indices.tolist(), self.input_lengths[indices].tolist(),
+            self.label_lengths[indices].tolist()
+        ):
+            longest_input = max(longest_input, n_input)
+            longest_label = max(longest_label, n_label)
+            if batch and (len(batch) + 1) * (longest_input + longest_label) > self.max_tokens:
+                batches.append(batch)
+                batch, longest_input, longest_label = [], n_input, n_label
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def __iter__(self) -> Iterator[list[int]]:
+        return iter(self.batches())
+
+    def __len__(self) -> int:
+        return len(self.batches())
+
+def probe_max_tokens(
+    model, collator, dataset, lengths: np.ndarray, start: int=1024, limit: int=1 << 20,
+    margin: float=.9
+) -> int:
+    """The largest token budget whose worst batch survives a training step on the GPU.
+
+    The worst batch is made of the longest examples. Budgets are doubled from start
+    until one runs out of memory, then bisected. Without CUDA there is nothing to
+    probe and start is returned.
+
+    Args:
+        model: The model being trained, already on its device.
+        collator: Turns a list of examples into a batch of tensors.
+        dataset: Tokenized examples, indexable.
+        lengths (np.ndarray): Input plus label tokens of every example.
+        start (int, optional): Budget to start from. Defaults to 1024.
+        limit (int, optional): Never probe past this. Defaults to 2**20.
+        margin (float, optional): Fraction of the found budget to use, leaving room
+            for fragmentation. Defaults to .9.
+
+    Returns:
+        int: Tokens per batch.
+    """
+    if not torch.cuda.is_available():
+        return start
+    longest = np.argsort(lengths)[::-1]
+    worst = max(int(lengths[longest[0]]), 1)
+
+    def fits(budget: int) -> bool:
+        n = min(max(budget // worst, 1), len(longest))
+        batch = None
+        try:
+            batch = collator([dataset[int(i)] for i in longest[:n]])
+            batch = {k: v.to(model.device) for k, v in batch.items()}
+            model(**batch).loss.backward()
+            return True
+        except torch.cuda.OutOfMemoryError:
+            return False
+        finally:
+            del batch
+            model.zero_grad(set_to_none=True)
+            torch.cuda.empty_cache()
+
+    if not fits(start):
+        raise RuntimeError(f"Even {start} tokens per batch do not fit in GPU memory.")
+
+    # double until it does not fit, then bisect between the last two.
+    low, high = start, start * 2
+    while high <= limit and fits(high):
+        low, high = high, high * 2
+    high = min(high, limit)
+    while high - low > start // 2:
+        mid = (low + high) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid
+    return int(low * margin)
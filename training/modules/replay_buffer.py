@@ -0,0 +1,196 @@
+"""Fixed-size replay buffer of self-play decisions.
+
+Decisions are kept as rows of preallocated NumPy arrays, never as prompts: the
+observation (see VecUnoServer.observe and UnoServer.observe), the legal actions as a
+bitmask, the action, its log-prob when it was sampled, the reward and the return.
+A four player decision takes 178 bytes, however long its prompt is. The buffer is a
+ring, so once it is full the oldest decisions are overwritten.
+
+Give it a directory and the arrays are memory-mapped .npy files there instead, so a
+buffer can be bigger than RAM and survives the process. Sampling is uniform, or
+prioritized (probability proportional to priority ** alpha) with importance weights.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from uno.vecserver import N_ACTIONS
+from .rollouts import Rollouts
+
+META = "meta.json"
+
+class ReplayBuffer:
+    def __init__(
+        self, capacity: int, obs_size: int, path: str | None=None, alpha: float=0.,
+        beta: float=.4, seed: int | None=None
+    ):
+        """
+        Args:
+            capacity (int): Most decisions kept.
+            obs_size (int): Length of an observation, see vecserver.obs_size.
+            path (str, optional): Directory to memory-map the arrays in. Reopens the
+                buffer already there. Defaults to keeping them in RAM.
+            alpha (float, optional): How much priorities count. 0 samples uniformly.
+            beta (float, optional): How much importance weights undo prioritized
+                sampling. 1 undoes it fully. Defaults to .4.
+            seed (int, optional): Seed for sampling.
+        """
+        self.capacity = capacity
+        self.obs_size = obs_size
+        self.path = path
+        self.alpha = alpha
+        self.beta = beta
+        self.rng = np.random.default_rng(seed)
+        # next row to write, rows filled and episodes handed out so far.
+        self.pos = self.size = self.episodes_seen = 0
+
+        specs = {
+            "obs": (np.int16, (obs_size,)),
+            # legal actions as bits, 8 bytes instead of 63.
+            "legal": (np.uint8, ((N_ACTIONS + 7) // 8,)),
+            "actions": (np.int16, ()),
+            "logprobs": (np.float32, ()),
+            "rewards": (np.float32, ()),
+            "returns": (np.float32, ()),
+            "dones": (np.bool_, ()),
+            "episodes": (np.int64, ()),
+            "seats": (np.int8, ()),
+            "priorities": (np.float32, ()),
+        }
+        reopen = path is not None and os.path.exists(os.path.join(path, META))
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        if reopen:
+            self._load_meta()
+        self.arrays = {
+            name: self._allocate(name, dtype, (capacity, *shape), reopen)
+            for name, (dtype, shape) in specs.items()
+        }
+
+    def _allocate(self, name: str, dtype, shape: tuple, reopen: bool) -> np.ndarray:
+        if self.path is None:
+            return np.zeros(shape, dtype=dtype)
+        file = os.path.join(self.path, f"{name}.npy")
+        if reopen:
+            a = np.lib.format.open_memmap(file, mode="r+")
+        else:
+            a = np.lib.format.open_memmap(file, mode="w+", dtype=dtype, shape=shape)
+        if a.shape != shape:
+            raise ValueError(f"{file} holds {a.shape}, not {shape}.")
+        return a
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, rollouts: Rollouts, returns: np.ndarray | None=None, priorities: np.ndarray | None=None):
+        """Appends decisions, overwriting the oldest ones once full.
+
+        Args:
+            rollouts (Rollouts): Decisions to keep. Their episodes are renumbered so
+                they never clash with episodes already in the buffer.
+            returns (np.ndarray, optional): Return of every decision. Defaults to
+                rollouts.returns().
+            priorities (np.ndarray, optional): Defaults to the highest priority in the
+                buffer, so new decisions get sampled at least once early on.
+        """
+        n = len(rollouts)
+        if not n:
+            return
+        if returns is None:
+            returns = rollouts.returns()
+        if priorities is None:
+            priorities = np.full(n, self.max_priority(), dtype=np.float32)
+
+        rows = {
+            "obs": rollouts.obs,
+            "legal": np.packbits(rollouts.legal, axis=1),
+            "actions": rollouts.actions,
+            "logprobs": rollouts.logprobs,
+            "rewards": rollouts.rewards,
+            "returns": returns,
+            "dones": rollouts.dones,
+            "episodes": rollouts.episodes + self.episodes_seen,
+            "seats": rollouts.seats,
+            "priorities": priorities,
+        }
+        self.episodes_seen += int(rollouts.episodes.max()) + 1
+
+        # only the last capacity rows survive anyway.
+        skip = max(0, n - self.capacity)
+        idx = (self.pos + skip + np.arange(n - skip)) % self.capacity
+        for name, values in rows.items():
+            self.arrays[name][idx] = values[skip:]
+        self.pos = int((self.pos + n) % self.capacity)
+        self.size = min(self.size + n, self.capacity)
+        self._save_meta()
+
+    def max_priority(self) -> float:
+        return float(self.arrays["priorities"][:self.size].max()) if self.size else 1.
+
+    def sample(self, n: int) -> tuple[np.ndarray, np.ndarray]:
+        """Picks n decisions.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Their rows, and importance weights to scale
+                their losses by (all 1 when sampling uniformly).
+        """
+        if not self.size:
+            raise ValueError("Can not sample from an empty buffer.")
+        if not self.alpha:
+            return self.rng.integers(0, self.size, n), np.ones(n, dtype=np.float32)
+
+        p = self.arrays["priorities"][:self.size].astype(np.float64) ** self.alpha
+        p /= p.sum()
+        idx = self.rng.choice(self.size, n, p=p)
+        weights = (self.size * p[idx]) ** -self.beta
+        return idx, (weights / weights.max()).astype(np.float32)
+
+    def update_priorities(self, idx: np.ndarray, priorities: np.ndarray, eps: float=1e-3):
+        "Sets priorities after learning from some rows, for example to |advantage|."
+        self.arrays["priorities"][idx] = np.abs(priorities) + eps
+
+    def __getitem__(self, idx: np.ndarray) -> Rollouts:
+        "Rows as Rollouts, with the legal actions unpacked."
+        a = self.arrays
+        return Rollouts(
+            obs=np.asarray(a["obs"][idx]),
+            legal=np.unpackbits(a["legal"][idx], axis=1, count=N_ACTIONS).astype(bool),
+            actions=np.asarray(a["actions"][idx]),
+            logprobs=np.asarray(a["logprobs"][idx]),
+            rewards=np.asarray(a["rewards"][idx]),
+            dones=np.asarray(a["dones"][idx]),
+            episodes=np.asarray(a["episodes"][idx]),
+            seats=np.asarray(a["seats"][idx]),
+        )
+
+    def returns(self, idx: np.ndarray) -> np.ndarray:
+        return np.asarray(self.arrays["returns"][idx])
+
+    def flush(self):
+        "Writes memory-mapped arrays to disk."
+        for a in self.arrays.values():
+            if isinstance(a, np.memmap):
+                a.flush()
+
+    def _save_meta(self):
+        if self.path is None:
+            return
+        meta = {
+            "capacity": self.capacity, "obs_size": self.obs_size, "pos": self.pos,
+            "size": self.size, "episodes_seen": self.episodes_seen
+        }
+        tmp = os.path.join(self.path, META + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.path, META))
+
+    def _load_meta(self):
+        with open(os.path.join(self.path, META), encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta["capacity"], meta["obs_size"]) != (self.capacity, self.obs_size):
+            raise ValueError(
+                f"{self.path} holds a buffer of {meta['capacity']} x {meta['obs_size']}."
+            )
+        self.pos, self.size, self.episodes_seen = meta["pos"], meta["size"], meta["episodes_seen"]
@@ -1,4 +1,14 @@
+from functools import partial
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+from uno.agents.scoring import candidate_logprobs, encode_prompts
+from uno.vecserver import obs_size
 from .base_trainer import BaseTrainer
+from .replay_buffer import ReplayBuffer
+from .rollouts import ACTION_TEXT, ModelPolicy, RolloutEngine, collect_rollouts
 
 class ReinforcementLearning(BaseTrainer):
     """Allows models to learn Uno strategy."""
@@ -8,4 +18,114 @@ class ReinforcementLearning(BaseTrainer):
         super().__init__(config)
 
     def train(self, iterations: int=1000):
-        pass
+        """Self-play policy gradient on the fine-tuned model.
+
+        Every iteration plays a round of self-play games with the current model (see
+        rollouts.py) and adds every recorded decision to a replay buffer (see
+        replay_buffer.py). Then it takes as many policy gradient steps as the round
+        has batches, on batches sampled from the buffer. Decisions sampled by an
+        older model are corrected by the ratio of their log-probs now and then,
+        clipped like PPO. Collecting is the expensive part, so it can be spread over
+        worker processes, which load the latest weights from disk.
+
+        Config keys, all optional:
+            rl_games: games per iteration. Defaults to 64.
+            rl_players: players per game. Defaults to 4.
+            rl_workers: rollout processes. Defaults to 1, which plays in this process.
+            rl_learning_rate: Defaults to 1e-6.
+            rl_batch_size: decisions per gradient step. Defaults to 16.
+            rl_temperature: sampling temperature. Defaults to 1.
+            rl_max_steps: steps before unfinished games are dropped. Defaults to 1000.
+            rl_buffer_size: decisions kept. Defaults to 100,000.
+            rl_buffer_dir: memory-map the buffer here. Defaults to RAM.
+            rl_priority: prioritized sampling exponent, by |advantage|. Defaults to 0,
+                uniform.
+            rl_clip: how far the log-prob ratio may move the loss. Defaults to .2.
+        """
+        cfg = self.config
+        model, tokenizer = self._load_model()
+        optimizer = torch.optim.AdamW(model.parameters(), lr=getattr(cfg, "rl_learning_rate", 1e-6))
+        n_games = getattr(cfg, "rl_games", 64)
+        n_players = getattr(cfg, "rl_players", 4)
+        workers = getattr(cfg, "rl_workers", 1)
+        engine_kwargs = {
+            "temperature": getattr(cfg, "rl_temperature", 1.),
+            "max_steps": getattr(cfg, "rl_max_steps", 1000),
+        }
+        engine = RolloutEngine(
+            ModelPolicy(model, tokenizer), n_games, n_players, seed=getattr(cfg, "seed", None),
+            **engine_kwargs
+        )
+        policy_dir = cfg.save_dir + f"/uno-agent-rl-rollouts-{cfg.model_id}"
+        buffer = ReplayBuffer(
+            getattr(cfg, "rl_buffer_size", 100_000), obs_size(n_players),
+            path=getattr(cfg, "rl_buffer_dir", None), alpha=getattr(cfg, "rl_priority", 0.)
+        )
+
+        for i in range(iterations):
+            model.eval()
+            if workers > 1:
+                model.save_pretrained(policy_dir)
+                tokenizer.save_pretrained(policy_dir)
+                rollouts = collect_rollouts(
+                    partial(ModelPolicy.from_pretrained, policy_dir, policy_dir),
+                    n_games, n_players, workers, seed=i, **engine_kwargs
+                )
+            else:
+                rollouts = engine.run()
+
+            buffer.add(rollouts)
+            model.train()
+            loss = self._update(model, tokenizer, optimizer, buffer, len(rollouts))
+            finished = len(np.unique(rollouts.episodes[rollouts.dones]))
+            print(f"iteration {i}: {len(rollouts)} decisions, {finished} games finished, loss {loss:.4f}")
+
+        model.save_pretrained(cfg.save_dir + f"/uno-agent-rl-{cfg.model_id}")
+
+    def _load_model(self):
+        "The fine-tuned model and its tokenizer."
+        cfg = self.config
+        self.tokenizer = AutoTokenizer.from_pretrained(cfg.save_dir + f"/uno-agent-tokenizer-{cfg.model_id}")
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(
+            cfg.save_dir + f"/uno-agent-fine-tuned-{cfg.model_id}"
+        )
+        return self.model, self.tokenizer
+
+    def _update(self, model, tokenizer, optimizer, buffer: ReplayBuffer, n_new: int) -> float:
+        "Policy gradient steps on batches from the buffer. Returns the mean loss."
+        if not n_new:
+            return 0.
+        batch_size = getattr(self.config, "rl_batch_size", 16)
+        temperature = getattr(self.config, "rl_temperature", 1.)
+        clip = getattr(self.config, "rl_clip", .2)
+        # the mean return of the whole buffer is the baseline.
+        baseline = float(buffer.returns(np.arange(len(buffer))).mean())
+
+        losses = []
+        for _ in range(-(-n_new // batch_size)):
+            idx, weights = buffer.sample(batch_size)
+            batch = buffer[idx]
+            candidates = batch.candidates(range(len(idx)))
+            states, mask = encode_prompts(model, tokenizer, batch.prompts(range(len(idx))), grad=True)
+            scores = candidate_logprobs(
+                model, tokenizer, states, mask,
+                [[ACTION_TEXT[a] for a in c] for c in candidates], grad=True
+            )
+            # log-prob of the action taken among the legal ones, like it was sampled.
+            logp = torch.stack([
+                torch.log_softmax(s / temperature, dim=-1)[c.index(int(a))]
+                for s, c, a in zip(scores, candidates, batch.actions)
+            ])
+            advantages = buffer.returns(idx) - baseline
+            adv = torch.tensor(advantages, device=logp.device)
+            ratio = torch.exp(logp - torch.tensor(batch.logprobs, device=logp.device))
+            objective = torch.minimum(ratio * adv, ratio.clamp(1 - clip, 1 + clip) * adv)
+            loss = -(torch.tensor(weights, device=logp.device) * objective).mean()
+            buffer.update_priorities(idx, advantages)
+
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            losses.append(loss.item())
+        return float(np.mean(losses))
@@ -0,0 +1,283 @@
+"""Self-play rollouts for reinforcement learning.
+
+RolloutEngine plays many games in lockstep on a VecUnoServer with one policy in every
+seat. Every step, the decisions of all games are rendered into prompts and scored by
+the policy in one call, and each player samples an action from the policy's
+distribution over their legal actions. Every decision with more than one legal action
+is recorded as (observation, legal actions, action, log-prob, reward). Observations
+are the vec server's int16 rows, so prompts are only kept while they are scored.
+
+A step is the current player of every game acting, then whoever holds one card
+without a shield deciding whether to shield themselves. Catching somebody happens on
+the catcher's turn. Rewards come at the end of a game: win_reward on the winner's
+last decision, loss_reward on everyone else's.
+
+collect_rollouts spreads games over worker processes, each with its own copy of the
+policy, which is how collecting scales.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+import multiprocessing
+from typing import Callable, Protocol
+
+import numpy as np
+import torch
+
+from uno.agents.scoring import action_text, candidate_logprobs, encode_prompts
+from uno.prompt import PromptBuilder
+from uno.seeding import split_seed
+from uno.vecserver import (
+    ACTION_NOTHING, ACTION_UNO, N_ACTIONS, VecUnoServer, action_request, render_observation
+)
+
+# same strategy as the SFT data, so the prompts look like what the model learned on.
+STRATEGY = "Do what you need to do to win"
+
+# candidate text of every action id.
+ACTION_TEXT = [action_text(action_request(a)) for a in range(N_ACTIONS)]
+
+class Policy(Protocol):
+    def logprobs(self, prompts: list[str], candidates: list[list[str]]) -> list[torch.Tensor]:
+        "Unnormalized log-probability of every candidate response of every prompt."
+        ...
+
+class ModelPolicy:
+    def __init__(self, model, tokenizer, max_batch: int=32):
+        """Scores candidates with a seq2seq model (see scoring.candidate_logprobs).
+
+        Args:
+            model: Seq2seq model.
+            tokenizer: Its tokenizer.
+            max_batch (int, optional): Most prompts per forward pass. Defaults to 32.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch = max_batch
+
+    @classmethod
+    def from_pretrained(cls, model_path: str, tokenizer_path: str, device: str | None=None, **kwargs):
+        "Loads the model. Picklable as a functools.partial, for collect_rollouts."
+        # only workers need these.
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer # pylint: disable=import-outside-toplevel
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_path).eval()
+        if device:
+            model = model.to(device)
+        return cls(model, tokenizer, **kwargs)
+
+    def logprobs(self, prompts: list[str], candidates: list[list[str]]) -> list[torch.Tensor]:
+        scores = []
+        for start in range(0, len(prompts), self.max_batch):
+            end = start + self.max_batch
+            states, mask = encode_prompts(self.model, self.tokenizer, prompts[start:end])
+            scores.extend(candidate_logprobs(
+                self.model, self.tokenizer, states, mask, candidates[start:end]
+            ))
+        return scores
+
+class UniformPolicy:
+    "Picks uniformly between legal actions. A baseline, and cheap for testing."
+    def logprobs(self, prompts: list[str], candidates: list[list[str]]) -> list[torch.Tensor]:
+        return [torch.zeros(len(c)) for c in candidates]
+
+@dataclass
+class Rollouts:
+    "Decisions from self-play, one row each."
+    obs: np.ndarray        # (k, obs_size) int16, see VecUnoServer.observe
+    legal: np.ndarray      # (k, N_ACTIONS) bool
+    actions: np.ndarray    # (k,) int16
+    logprobs: np.ndarray   # (k,) float32 of the action among the legal actions
+    rewards: np.ndarray    # (k,) float32
+    dones: np.ndarray      # (k,) bool, the seat's last decision of the game
+    episodes: np.ndarray   # (k,) int64, which game
+    seats: np.ndarray      # (k,) int8
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    @classmethod
+    def concat(cls, parts: list["Rollouts"]) -> "Rollouts":
+        "Joins rollouts, renumbering episodes so they stay apart."
+        offset = 0
+        episodes = []
+        for r in parts:
+            episodes.append(r.episodes + offset)
+            offset += int(r.episodes.max()) + 1 if len(r) else 0
+        joined = {
+            f.name: np.concatenate([getattr(r, f.name) for r in parts])
+            for f in fields(cls) if f.name != "episodes"
+        }
+        return cls(**joined, episodes=np.concatenate(episodes))
+
+    def returns(self, gamma: float=1.) -> np.ndarray:
+        "Discounted return of every decision, within its seat's trajectory."
+        out = np.zeros(len(self), dtype=np.float32)
+        running: dict[tuple[int, int], float] = {}
+        for i in range(len(self) - 1, -1, -1):
+            key = (int(self.episodes[i]), int(self.seats[i]))
+            running[key] = self.rewards[i] + gamma * running.get(key, 0.)
+            out[i] = running[key]
+        return out
+
+    def prompts(self, indices, prompts: PromptBuilder | None=None, strategy: str=STRATEGY) -> list[str]:
+        "Prompts of some decisions, rendered again from their observations."
+        prompts = prompts or PromptBuilder()
+        return [prompts.render(render_observation(self.obs[i]), strategy) for i in indices]
+
+    def candidates(self, indices) -> list[list[int]]:
+        "Legal action ids of some decisions."
+        return [np.flatnonzero(self.legal[i]).tolist() for i in indices]
+
+class RolloutEngine:
+    def __init__(
+        self, policy: Policy, n_games: int, n_players: int=4, temperature: float=1.,
+        max_steps: int=1000, win_reward: float=1., loss_reward: float=-1.,
+        strategy: str=STRATEGY, seed: int | None=None
+    ):
+        """Plays n_games self-play games at a time with policy in every seat.
+
+        Args:
+            policy (Policy): Scores candidate actions.
+            n_games (int): Games played in lockstep. Their decisions are scored together.
+            n_players (int, optional): Players per game. Defaults to 4.
+            temperature (float, optional): Divides the policy's scores before sampling.
+            max_steps (int, optional): Games still going after this many steps end
+                without rewards. Defaults to 1000.
+            win_reward (float, optional): Reward for winning. Defaults to 1.
+            loss_reward (float, optional): Reward for everyone else. Defaults to -1.
+            strategy (str, optional): Strategy shown in every prompt.
+            seed (int, optional): Seeds the games and the sampling.
+        """
+        self.policy = policy
+        self.temperature = temperature
+        self.max_steps = max_steps
+        self.win_reward = win_reward
+        self.loss_reward = loss_reward
+        self.strategy = strategy
+        game_seed, sample_seed = split_seed(seed, 2)
+        self.vec = VecUnoServer(n_games, n_players, seed=game_seed)
+        self.rng = np.random.default_rng(sample_seed)
+        self.prompts = PromptBuilder()
+        self._episodes = 0
+
+    def run(self) -> Rollouts:
+        "Plays a fresh game in every slot until all of them are over."
+        vec = self.vec
+        if self._episodes:
+            vec.reset()
+        self._rows: list[dict[str, np.ndarray]] = []
+
+        for _ in range(self.max_steps):
+            if not vec.playing.any():
+                break
+            self._decide(vec.playing.copy(), vec.current.copy(), on_turn=True)
+
+            # anybody holding one card without a shield may shield themselves.
+            exposed = (vec.hand_sizes == 1) & ~vec.is_shielded
+            self._decide(vec.playing & exposed.any(axis=1), exposed.argmax(axis=1), on_turn=False)
+
+        rollouts = self._collect()
+        self._episodes += vec.n_games
+        return rollouts
+
+    def _decide(self, active: np.ndarray, seats: np.ndarray, on_turn: bool):
+        "The seats of the active games each pick an action, all scored in one call."
+        vec = self.vec
+        legal = vec.legal_mask(seats)
+        if on_turn:
+            # waiting for your own turn to pass gets nowhere.
+            legal[:, ACTION_NOTHING] &= ~legal[:, :ACTION_NOTHING].any(axis=1)
+        else:
+            legal[:, :ACTION_UNO] = False
+        legal &= active[:, None]
+
+        actions = np.full(vec.n_games, ACTION_NOTHING)
+        n_legal = legal.sum(axis=1)
+        only = np.flatnonzero(n_legal == 1)
+        actions[only] = legal[only].argmax(axis=1)
+
+        # only decisions with a choice are scored and recorded.
+        g = np.flatnonzero(n_legal > 1)
+        if len(g):
+            obs = vec.observe(seats)[g]
+            candidates = [np.flatnonzero(legal[i]) for i in g]
+            scores = self.policy.logprobs(
+                [self.prompts.render(render_observation(o), self.strategy) for o in obs],
+                [[ACTION_TEXT[a] for a in c] for c in candidates]
+            )
+            chosen = np.empty(len(g), dtype=np.int16)
+            logprobs = np.empty(len(g), dtype=np.float32)
+            for j, (c, s) in enumerate(zip(candidates, scores)):
+                logp = torch.log_softmax(s.float() / self.temperature, dim=-1).cpu().numpy()
+                k = self.rng.choice(len(c), p=np.exp(logp) / np.exp(logp).sum())
+                chosen[j], logprobs[j] = c[k], logp[k]
+            actions[g] = chosen
+            self._rows.append({
+                "obs": obs, "legal": legal[g], "actions": chosen, "logprobs": logprobs,
+                "episodes": g + self._episodes, "seats": seats[g].astype(np.int8)
+            })
+
+        vec.step(actions, seats)
+
+    def _collect(self) -> Rollouts:
+        "The recorded decisions, with the rewards of finished games."
+        if not self._rows:
+            return Rollouts(
+                np.zeros((0, self.vec.observe().shape[1]), dtype=np.int16),
+                np.zeros((0, N_ACTIONS), dtype=bool), np.zeros(0, dtype=np.int16),
+                np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32),
+                np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8)
+            )
+        cols = {k: np.concatenate([r[k] for r in self._rows]) for k in self._rows[0]}
+        n = len(cols["actions"])
+        rewards = np.zeros(n, dtype=np.float32)
+        dones = np.zeros(n, dtype=bool)
+
+        # the last decision of every seat gets the outcome of its game.
+        winner = self.vec.winner
+        seen = set()
+        for i in range(n - 1, -1, -1):
+            e, s = int(cols["episodes"][i]), int(cols["seats"][i])
+            if (e, s) in seen:
+                continue
+            seen.add((e, s))
+            w = winner[e - self._episodes]
+            if w >= 0:
+                dones[i] = True
+                rewards[i] = self.win_reward if w == s else self.loss_reward
+        return Rollouts(rewards=rewards, dones=dones, **cols)
+
+def _collect_in_worker(
+    make_policy: Callable[[], Policy], n_games: int, n_players: int, seed: int, kwargs: dict
+) -> Rollouts:
+    return RolloutEngine(make_policy(), n_games, n_players, seed=seed, **kwargs).run()
+
+def collect_rollouts(
+    make_policy: Callable[[], Policy], n_games: int, n_players: int=4, workers: int=1,
+    seed: int | None=None, **kwargs
+) -> Rollouts:
+    """Plays n_games self-play games spread over worker processes.
+
+    Args:
+        make_policy (Callable[[], Policy]): Builds the policy in every worker, for
+            example functools.partial(ModelPolicy.from_pretrained, path, tokenizer).
+        n_games (int): Games to play in total.
+        n_players (int, optional): Players per game. Defaults to 4.
+        workers (int, optional): Processes. 1 plays in this process. Defaults to 1.
+        seed (int, optional): Every worker gets its own seed split from it.
+        **kwargs: Passed to RolloutEngine.
+
+    Returns:
+        Rollouts: Every worker's rollouts.
+    """
+    seeds = split_seed(seed, workers)
+    if workers == 1:
+        return _collect_in_worker(make_policy, n_games, n_players, seeds[0], kwargs)
+
+    games = [n_games // workers + (i < n_games % workers) for i in range(workers)]
+    jobs = [(make_policy, n, n_players, s, kwargs) for n, s in zip(games, seeds) if n]
+    # spawn, since forking a process that already uses torch (or CUDA) is not safe.
+    with ProcessPoolExecutor(len(jobs), mp_context=multiprocessing.get_context("spawn")) as executor:
+        parts = list(executor.map(_collect_in_worker, *zip(*jobs)))
+    return Rollouts.concat(parts)
@@ -1,11 +1,49 @@
-from datasets import Dataset, load_dataset
+import json
+import logging
+import os
+
+from datasets import Dataset
 from peft import LoraConfig, TaskType, get_peft_model
 from torchinfo import summary
 from transformers.trainer import Trainer, TrainingArguments
 from transformers import (
     AutoTokenizer, DataCollatorForSeq2Seq, EarlyStoppingCallback, AutoModelForSeq2SeqLM
 )
+from torch.utils.data import DataLoader
 from .base_trainer import BaseTrainer
+from .batching import TokenBudgetBatchSampler, probe_max_tokens
+from .token_cache import token_lengths, tokenize_cached
+
+logger = logging.getLogger(__name__)
+
+class TokenBudgetTrainer(Trainer):
+    "A Trainer whose batches hold up to max_tokens padded tokens (see batching.py)."
+    def __init__(self, *args, max_tokens: int, **kwargs):
+        self.max_tokens = max_tokens
+        super().__init__(*args, **kwargs)
+
+    def get_train_dataloader(self) -> DataLoader:
+        return self._token_budget_dataloader(self.train_dataset, shuffle=True)
+
+    def get_eval_dataloader(self, eval_dataset=None) -> DataLoader:
+        if isinstance(eval_dataset, str):
+            eval_dataset = self.eval_dataset[eval_dataset]
+        return self._token_budget_dataloader(
+            eval_dataset if eval_dataset is not None else self.eval_dataset, shuffle=False
+        )
+
+    def _token_budget_dataloader(self, dataset: Dataset, shuffle: bool) -> DataLoader:
+        input_lengths, label_lengths = token_lengths(dataset)
+        sampler = TokenBudgetBatchSampler(
+            input_lengths, label_lengths, self.max_tokens, shuffle=shuffle, seed=self.args.seed
+        )
+        return self.accelerator.prepare(DataLoader(
+            dataset,
+            batch_sampler=sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory
+        ))
 
 class SupervisedFineTuning(BaseTrainer):
     """Performs supervised fine-tuning on a pretrained model."""
@@ -19,22 +57,40 @@ class SupervisedFineTuning(BaseTrainer):
         When SFT is done then we should be able to have several AI agents complete
         a game of uno. The games do not need to be well played, then only need to
         be valid.
+
+        Batches hold up to config.max_batch_tokens padded tokens (8192 by default) of
+        examples of similar length. Set it to None for the old fixed batch size of 1.
+        With config.probe_batch_tokens the budget is instead the largest that fits in
+        GPU memory (see batching.probe_max_tokens).
         """
         model = self._create_model()
         training_args = self._config_training_args()
         train_data, test_data = self._load_and_split_data(train_data_fp, test_ratio)
-        trainer = Trainer(
+        collator = self._create_data_collator(model)
+
+        kwargs = dict(
             model=model,
             args=training_args,
             train_dataset=train_data,
             eval_dataset=test_data,
-            data_collator=self._create_data_collator(model),
+            data_collator=collator,
             callbacks=[EarlyStoppingCallback(
                 # stop if no improvements for 3 epochs.
                 early_stopping_patience=3
             )]
             # compute_metrics=self._compute_metrics # TODO this is optional. add later if need be
         )
+        max_tokens = self._max_batch_tokens()
+        if max_tokens:
+            if getattr(self.config, "probe_batch_tokens", False):
+                input_lengths, label_lengths = token_lengths(train_data)
+                max_tokens = probe_max_tokens(
+                    model, collator, train_data, input_lengths + label_lengths, start=max_tokens
+                )
+                logger.info("Using %s tokens per batch.", max_tokens)
+            trainer = TokenBudgetTrainer(max_tokens=max_tokens, **kwargs)
+        else:
+            trainer = Trainer(**kwargs)
         trainer.train()
 
         # TODO append all of these arguments to some sort of log for reproduction
@@ -106,10 +162,12 @@ class SupervisedFineTuning(BaseTrainer):
             metric_for_best_model="eval_loss",
             weight_decay=0.01,
 
-            # TODO this is incredibly conservative for VRAM. Ramp up later.
+            # only used without token budget batches (see train). this is incredibly
+            # conservative for VRAM.
             per_device_train_batch_size=1,
             per_device_eval_batch_size=1,
-            gradient_accumulation_steps=8,  # Simulate larger batch
+            # token budget batches are already large.
+            gradient_accumulation_steps=1 if self._max_batch_tokens() else 8,  # Simulate larger batch
             # grad_norm tells what direction and magnitude to update weights (calc III norm)
             # gradient clipping. avoids gradient diverging to infinity.
             max_grad_norm=1.0,
@@ -125,56 +183,54 @@ class SupervisedFineTuning(BaseTrainer):
             report_to="tensorboard"
         )
 
+    def _max_batch_tokens(self) -> int | None:
+        return getattr(self.config, "max_batch_tokens", 8192)
+
     def _create_data_collator(self, model) -> DataCollatorForSeq2Seq:
         """These form batches by using a list of dataset elements as input. Here we pass
         the tokenizer so that it applies tokenization to the batches for us.
         """
-        if not self.tokenizer:
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                self.config.save_dir + f"/uno-agent-tokenizer-{self.config.model_id}"
-            )
-
         return DataCollatorForSeq2Seq(
-            tokenizer=self.tokenizer,
+            tokenizer=self._load_tokenizer(),
             model=model
         )
 
-    def _load_and_split_data(self, train_data_fp: str, test_ratio: float) -> tuple[Dataset, Dataset]:
-        dataset = load_dataset(
-            'json',
-            data_files=train_data_fp,
-            field="data" # since all of our data is listed under "data" key
-        )
-
-        def preprocess_function(examples: dict):
-            """
-            Examples is list of dicts with keys 'input' and 'output'
-            Examples['input'] is list of strings. Same as examples['output']
-            """
-            # T5 expects "input" to be tokenized as inputs
-            # and "output" to be tokenized as labels
-            model_inputs = self.tokenizer(
-                str(examples['input']),
-                max_length=512,
-                truncation=True,
-                padding=False  # padding handled by collator
-            )
-
-            # Tokenize targets (outputs, in this case "the proper action")
-            labels = self.tokenizer(
-                str(examples['output']),
-                max_length=512,
-                truncation=True,
-                padding=False
+    def _load_tokenizer(self):
+        if not self.tokenizer:
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                self.config.save_dir + f"/uno-agent-tokenizer-{self.config.model_id}"
             )
+        return self.tokenizer
 
-            model_inputs['labels'] = labels['input_ids']
-            return model_inputs
-
-        tokenized_dataset = dataset['train'].map(
-            preprocess_function,
-            batched=False,
-            remove_columns=dataset['train'].column_names
+    def _load_and_split_data(self, train_data_fp: str, test_ratio: float) -> tuple[Dataset, Dataset]:
+        """Tokenized train and test sets. Tokenizing is cached (see token_cache.py), so
+        only the first run on a dataset pays for it.
+
+        Config keys, all optional:
+            max_length: tokens kept of inputs and labels. Defaults to 512.
+            token_cache_dir: where tokenized datasets are kept. Defaults to
+                {save_dir}/token-cache.
+            num_proc: tokenizer processes. Defaults to one per CPU.
+        """
+        field = None
+        if os.path.isdir(train_data_fp):
+            # sharded JSONL written by generate_training_data (see training/shards.py)
+            with open(os.path.join(train_data_fp, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if not manifest["complete"]:
+                raise RuntimeError(f"{train_data_fp} is not complete. Resume generating it first.")
+            data_files = [os.path.join(train_data_fp, s["file"]) for s in manifest["shards"]]
+        else:
+            data_files = [train_data_fp]
+            field = "data" # since all of our data is listed under "data" key
+
+        tokenized_dataset = tokenize_cached(
+            data_files,
+            self._load_tokenizer(),
+            max_length=getattr(self.config, "max_length", 512),
+            cache_dir=getattr(self.config, "token_cache_dir", self.config.save_dir + "/token-cache"),
+            num_proc=getattr(self.config, "num_proc", None),
+            field=field
         )
 
         split_dataset = tokenized_dataset.train_test_split(test_size=test_ratio)
@@ -0,0 +1,114 @@
+"""Tokenized datasets cached on disk.
+
+Tokenizing a large dataset takes far longer than loading one, and it gives the same
+result every time for the same data, tokenizer and max_length. So the first run
+tokenizes in batches over several processes and saves the result as an Arrow
+dataset. Later runs memory-map it back in seconds. The cache key is a hash of the
+data files' contents, the tokenizer's vocabulary and settings, and max_length, so
+changing any of them tokenizes again instead of training on stale tokens.
+"""
+
+from hashlib import sha256
+import json
+import os
+import shutil
+
+from datasets import Dataset, load_dataset, load_from_disk
+import numpy as np
+import pyarrow.compute as pc
+
+from uno.agents.scoring import action_text
+
+# bump when the way examples are tokenized changes.
+VERSION = 1
+
+def fingerprint(data_files: list[str], tokenizer, max_length: int) -> str:
+    "Cache key for tokenizing data_files with tokenizer."
+    h = sha256(f"v{VERSION} {max_length}".encode())
+    for path in data_files:
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+    h.update(type(tokenizer).__name__.encode())
+    h.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode())
+    h.update(json.dumps(tokenizer.special_tokens_map, sort_keys=True, default=str).encode())
+    h.update(f"{tokenizer.truncation_side} {tokenizer.model_max_length}".encode())
+    return h.hexdigest()[:32]
+
+def target_text(output: dict | str) -> str:
+    """The label of a sample, written the way agents answer (see scoring.action_text).
+
+    Arrow gives every output the same keys, so keys a sample did not have come back
+    as None and are dropped again.
+    """
+    if isinstance(output, str):
+        return output
+    return action_text({k: v for k, v in output.items() if v is not None})
+
+def tokenize_cached(
+    data_files: list[str], tokenizer, max_length: int=512, cache_dir: str="token-cache",
+    num_proc: int | None=None, field: str | None=None
+) -> Dataset:
+    """The tokenized samples of data_files, from the cache if they were tokenized before.
+
+    Args:
+        data_files (list[str]): JSON or JSONL files of {"input", "output"} samples.
+        tokenizer: Tokenizer for inputs and labels.
+        max_length (int, optional): Inputs and labels are truncated to this many
+            tokens. Defaults to 512.
+        cache_dir (str, optional): Where tokenized datasets are kept, one directory
+            per cache key. Defaults to "token-cache".
+        num_proc (int, optional): Tokenizer processes. Defaults to one per CPU.
+        field (str, optional): Key the samples are listed under in a JSON file.
+
+    Returns:
+        Dataset: input_ids, attention_mask and labels of every sample, memory-mapped.
+    """
+    path = os.path.join(cache_dir, fingerprint(data_files, tokenizer, max_length))
+    if os.path.exists(path):
+        return load_from_disk(path)
+
+    dataset = load_dataset("json", data_files=data_files, field=field)["train"]
+
+    def preprocess_function(examples: dict) -> dict:
+        "Tokenizes a batch. T5 takes 'input' as inputs and 'output' as labels."
+        model_inputs = tokenizer(
+            examples["input"],
+            max_length=max_length,
+            truncation=True,
+            padding=False  # padding handled by collator
+        )
+        labels = tokenizer(
+            [target_text(o) for o in examples["output"]],
+            max_length=max_length,
+            truncation=True,
+            padding=False
+        )
+        model_inputs["labels"] = labels["input_ids"]
+        return model_inputs
+
+    num_proc = num_proc or os.cpu_count()
+    tokenized = dataset.map(
+        preprocess_function,
+        batched=True,
+        num_proc=num_proc if num_proc > 1 else None,
+        remove_columns=dataset.column_names,
+        desc="Tokenizing"
+    )
+
+    # save under a temporary name so an interrupted save is never mistaken for a cache.
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tokenized.save_to_disk(tmp)
+    os.replace(tmp, path)
+    return load_from_disk(path)
+
+def token_lengths(dataset: Dataset) -> tuple[np.ndarray, np.ndarray]:
+    "Input and label tokens of every example, read straight from Arrow."
+    inputs, labels = [], []
+    for batch in dataset.with_format("arrow").iter(batch_size=100_000):
+        inputs.append(pc.list_value_length(batch["input_ids"]).to_numpy())
+        labels.append(pc.list_value_length(batch["labels"]).to_numpy())
+    if not inputs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(inputs), np.concatenate(labels)
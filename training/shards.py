@@ -0,0 +1,93 @@
+"""Sharded JSONL datasets.
+
+A dataset is a directory of JSONL shards plus a manifest.json describing how every
+shard is generated (scenario, sample count and seed). Shards are written to a
+temporary file and renamed when finished, so a shard file on disk is always complete.
+An interrupted run picks up where it left off by only generating the shards which
+are missing.
+"""
+
+from dataclasses import dataclass, asdict
+import json
+import os
+from typing import Iterable, Iterator
+
+MANIFEST = "manifest.json"
+
+@dataclass
+class Shard:
+    file: str
+    key: str
+    count: int
+    seed: int
+
+def write_shard(out_dir: str, shard: Shard, samples: Iterable[dict]):
+    "Streams samples into the shard, one JSON object per line."
+    path = os.path.join(out_dir, shard.file)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for sample in samples:
+            f.write(json.dumps(sample))
+            f.write("\n")
+    os.replace(tmp, path)
+
+def is_done(out_dir: str, shard: Shard) -> bool:
+    return os.path.exists(os.path.join(out_dir, shard.file))
+
+def open_manifest(out_dir: str, plan: dict, shards: list[Shard]) -> dict:
+    """Starts a dataset, or checks an existing one is the same dataset so it can be
+    resumed.
+
+    Args:
+        out_dir (str): Dataset directory. Created if needed.
+        plan (dict): Everything the shards are derived from (n, seed, ratios...).
+        shards (list[Shard]): The shards that make up the dataset.
+
+    Returns:
+        dict: The manifest.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        manifest = read_manifest(out_dir)
+        if manifest["plan"] != plan:
+            raise ValueError(
+                f"{out_dir} already holds a different dataset: {manifest['plan']}"
+            )
+        return manifest
+
+    manifest = {"plan": plan, "shards": [asdict(s) for s in shards], "complete": False}
+    _write_manifest(out_dir, manifest)
+    return manifest
+
+def finish_manifest(out_dir: str, manifest: dict):
+    "Marks the dataset complete once every shard is on disk."
+    missing = [s["file"] for s in manifest["shards"] if not is_done(out_dir, Shard(**s))]
+    if missing:
+        raise RuntimeError(f"Shards missing from {out_dir}: {missing}")
+    manifest["complete"] = True
+    _write_manifest(out_dir, manifest)
+
+def read_manifest(out_dir: str) -> dict:
+    with open(os.path.join(out_dir, MANIFEST), encoding="utf-8") as f:
+        return json.load(f)
+
+def shard_files(out_dir: str) -> list[str]:
+    "Paths of a complete dataset's shards, in order."
+    manifest = read_manifest(out_dir)
+    if not manifest["complete"]:
+        raise RuntimeError(f"{out_dir} is not complete. Resume generating it first.")
+    return [os.path.join(out_dir, s["file"]) for s in manifest["shards"]]
+
+def iter_samples(out_dir: str) -> Iterator[dict]:
+    "Every sample of a complete dataset, without loading it all."
+    for path in shard_files(out_dir):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+def _write_manifest(out_dir: str, manifest: dict):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
@@ -40,4 +40,4 @@ if __name__ == '__main__':
             "model_id": "test2"
         }
     )
-    pipeline.supervised_fine_tuning('autoset2k_v1.json')
+    pipeline.supervised_fine_tuning('autoset2k_v1')
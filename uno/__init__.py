@@ -1,9 +1,14 @@
 from typing import Literal
 
-from .agents import Agent, LLMAgent, HumanAgent
-from .card import is_wild, Card
+from .agents import Agent, LLMAgent, HumanAgent, RandomAgent
+from .card import is_wild, Card, card_id, card_str
+from .hand import Hand
 from .player import Player
 from .unoserver import UnoServer, Color
+from .vecserver import VecUnoServer
+from .asyncserver import AsyncUnoServer
+from .instrumentation import Instrumentation
+from .replay import Replay
 
 Symbol = Literal[
     "0", "1", "2", "3", "4", "5", "6", "7", "8", "9",
@@ -11,6 +16,7 @@ Symbol = Literal[
 ]
 
 __all__ = [
-    "Agent", "UnoServer", "LLMAgent", "HumanAgent", "is_wild",
-    "Player", "Color", "Card"
+    "Agent", "UnoServer", "LLMAgent", "HumanAgent", "RandomAgent", "is_wild",
+    "Player", "Color", "Card", "VecUnoServer", "AsyncUnoServer", "card_id", "card_str",
+    "Instrumentation", "Replay", "Hand"
 ]
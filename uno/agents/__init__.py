@@ -1,5 +1,6 @@
 from .agent import Agent
 from .llm_agent import LLMAgent
 from .human_agent import HumanAgent
+from .random_agent import RandomAgent
 
-__all__ = ["Agent", "LLMAgent", "HumanAgent"]
+__all__ = ["Agent", "LLMAgent", "HumanAgent", "RandomAgent"]
@@ -3,7 +3,20 @@ All agent-specific material is tracked here but game-specific information is tra
 in Player object.
 """
 
+import asyncio
+
 class Agent:
     "MetaType for all agents."
+    # agents which set this are also given their legal actions in prompt_dict["actions"].
+    wants_actions: bool = False
+    # seconds AsyncUnoServer waits on this agent. None uses the server's agent_timeout.
+    timeout: float | None = None
+
     def act(self, prompt_dict: dict, is_turn: bool) -> dict:
         raise NotImplementedError
+
+    async def aact(self, prompt_dict: dict, is_turn: bool) -> str:
+        """Async version of act for AsyncUnoServer. Runs act in a thread unless an
+        agent has something better to do, like waiting on a remote call.
+        """
+        return await asyncio.to_thread(self.act, prompt_dict, is_turn)
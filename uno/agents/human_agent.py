@@ -3,7 +3,7 @@ import sys
 import questionary
 from .agent import Agent
 from ..card import is_wild
-from ..utils import _get_resource
+from ..prompt import rules, instructions
 
 class HumanAgent(Agent):
     "For when humans want to play the game."
@@ -58,9 +58,9 @@ class HumanShell:
             case "Show context":
                 print(self.context)
             case "Show rules":
-                print(_get_resource('uno.resources', 'uno_rules.txt'))
+                print(rules())
             case "Show instructions":
-                print(_get_resource('uno.resources', 'instructions.txt'))
+                print(instructions())
             case "Quit game":
                 sys.exit()
 
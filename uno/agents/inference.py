@@ -0,0 +1,121 @@
+"""Shared inference service for LLMAgents. Prompts are submitted from any number of
+agents, games and threads. A worker thread gathers whatever is pending into a padded
+batch (up to max_batch_size prompts, waiting at most max_wait seconds for more to
+show up), runs a single generate call, and hands each response back to its caller.
+"""
+
+from concurrent.futures import Future
+import queue
+import threading
+import time
+
+import torch
+
+# greedy decoding, same as LLMAgent on its own.
+GENERATE_KWARGS = {
+    "max_new_tokens": 20,
+    "do_sample": False,
+    "num_beams": 1, #greedy alg
+}
+
+class InferenceService:
+    def __init__(
+        self, model, tokenizer, max_batch_size: int=16, max_wait: float=.01,
+        generate_kwargs: dict | None=None
+    ):
+        """Batches generate calls for a model.
+
+        Args:
+            model: Seq2seq model to generate with.
+            tokenizer: Tokenizer that goes with the model.
+            max_batch_size (int, optional): Most prompts per generate call. Defaults to 16.
+            max_wait (float, optional): Seconds to wait for a batch to fill up after
+                the first prompt arrives. Defaults to .01.
+            generate_kwargs (dict, optional): Passed to model.generate. Defaults to
+                GENERATE_KWARGS.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.generate_kwargs = generate_kwargs or GENERATE_KWARGS
+
+        # (prompt, future) pairs. None tells the worker to stop.
+        self._queue: queue.Queue[tuple[str, Future] | None] = queue.Queue()
+        # nothing may be queued after the None, or it would never be answered.
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str) -> Future:
+        "Queues a prompt. The future resolves to the decoded response."
+        f = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("InferenceService is closed.")
+            self._queue.put((prompt, f))
+        return f
+
+    def generate(self, prompt: str) -> str:
+        "Blocks until the response for prompt is ready."
+        return self.submit(prompt).result()
+
+    def close(self):
+        "Finishes pending prompts then stops the worker. Closing twice does nothing."
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list[tuple[str, Future]]):
+        # callers may have given up on their futures.
+        batch = [(p, f) for p, f in batch if f.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        try:
+            inputs = self.tokenizer(
+                [p for p, _ in batch], return_tensors="pt", padding=True
+            ).to(self.model.device)
+
+            with torch.no_grad():
+                output_ids = self.model.generate(**inputs, **self.generate_kwargs)
+
+            responses = self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            for _, f in batch:
+                f.set_exception(e)
+            return
+
+        for (_, f), r in zip(batch, responses):
+            f.set_result(r)
@@ -1,47 +1,183 @@
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+import asyncio
+from typing import Literal
+
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+
 from .agent import Agent
+from ..prompt import PromptBuilder, render_suffix
+from .inference import InferenceService, GENERATE_KWARGS
+from .model_registry import ModelRegistry, registry, DEFAULT_MODEL_PATH, DEFAULT_TOKENIZER_PATH
+from .scoring import action_text, candidate_logprobs, encode_prompts
+
+# same renderer as the training data and rollouts, so agents see what models learned on.
+PROMPTS = PromptBuilder()
 
 class LLMAgent(Agent):
     "These are LLMs playing the game."
-    def __init__(self,strategy: str=None):
+    def __init__(
+        self,strategy: str=None, service: InferenceService | None=None,
+        model_path: str=DEFAULT_MODEL_PATH, tokenizer_path: str=DEFAULT_TOKENIZER_PATH,
+        device: str | None=None, models: ModelRegistry=registry,
+        cache_prefix: Literal["tokens", "encoder"] | None=None,
+        decoding: Literal["generate", "score"]="generate"
+    ):
+        """
+        Args:
+            strategy (str, optional): Strategy given to the model in every prompt.
+            service (InferenceService, optional): Batches this agent's prompts with
+                other agents using the same service. Uses the service's model.
+            model_path (str, optional): Which model to play with.
+            tokenizer_path (str, optional): Which tokenizer goes with it.
+            device (str, optional): Device to put the model on.
+            models (ModelRegistry, optional): Where to get the model from. Agents using
+                the same registry share weights. Call close() to give them back.
+            cache_prefix (str, optional): Caches the part of the prompt that never
+                changes (rules, instructions and strategy, see build_prefix).
+                "tokens" only tokenizes it once, which gives the same model input.
+                "encoder" also runs it through the encoder once and only encodes the
+                rest of the prompt per decision. The two halves do not attend to each
+                other, so outputs can differ a little from the full prompt.
+                Not used with a service.
+            decoding (str, optional): "generate" writes a free-form response.
+                "score" scores every legal action the server offers in one forward
+                pass and answers with the most likely one, so every response is a
+                legal move. Defaults to "generate".
+        """
+        self.decoding = decoding
+        self.wants_actions = decoding == "score"
+        self.cache_prefix = cache_prefix
+        # prefix text -> (token ids, encoder states or None)
+        self._prefix_cache: dict[str, tuple[torch.Tensor, torch.Tensor | None]] = {}
 
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            "/home/jordan/agents/tokenizer",
-            use_fast=False
-        )
+        self.strategy = strategy if strategy else "Do what you need to do to win the game."
 
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(
-            "/home/jordan/agents/uno-agent"
-        )
+        # agents sharing a service have their prompts batched together.
+        self.service = service
+        self._models = None
+        if service:
+            self.tokenizer = service.tokenizer
+            self.model = service.model
+            return
 
-        self.strategy = strategy if strategy else "Do what you need to do to win the game."
+        self._models = models
+        self._handle = models.acquire(model_path, tokenizer_path, device)
+        self.tokenizer, self.model = self._handle
+
+    def close(self):
+        "Gives the model back to the registry. The agent can not act afterwards."
+        if self._models:
+            self._models.release(self._handle)
+            self._models = None
+            self.tokenizer = self.model = None
 
-    def act(self, prompt_dict: dict) -> str:
-        prompt = self.build_prompt(prompt_dict)
+    def __enter__(self):
+        return self
 
-        inputs = self.tokenizer(
-            prompt, return_tensors="pt"
-        ).to(self.model.device)
+    def __exit__(self, *_):
+        self.close()
 
-        output_ids = self.model.generate(
-            **inputs,
-            max_new_tokens=20,
-            do_sample=False,
-            num_beams=1, #greedy alg
-            temperature=1.0
-        )
+    def act(self, prompt_dict: dict, is_turn: bool) -> str:
+        if self.decoding == "score" and prompt_dict.get("actions"):
+            return self.best_action(prompt_dict, is_turn)
+
+        if self.service:
+            return self.service.generate(self.build_prompt(prompt_dict))
+
+        if self.cache_prefix:
+            inputs = self.cached_inputs(prompt_dict)
+        else:
+            inputs = self.tokenizer(
+                self.build_prompt(prompt_dict), return_tensors="pt"
+            ).to(self.model.device)
+
+        with torch.no_grad():
+            output_ids = self.model.generate(**inputs, **GENERATE_KWARGS)
 
         response = self.tokenizer.decode(output_ids[0], skip_special_tokens=True)
         return response
 
+    async def aact(self, prompt_dict: dict, is_turn: bool) -> str:
+        # with a service, wait on its batch without holding a thread.
+        if self.service and not (self.decoding == "score" and prompt_dict.get("actions")):
+            return await asyncio.wrap_future(self.service.submit(self.build_prompt(prompt_dict)))
+        return await super().aact(prompt_dict, is_turn)
+
+    def best_action(self, prompt_dict: dict, is_turn: bool=False) -> str:
+        """The legal action in prompt_dict the model finds most likely. On their turn,
+        passing is left out while there is a card to play or draw, since it would stall
+        the game.
+        """
+        actions: list[dict] = prompt_dict["actions"]
+        if is_turn and any(a["action"] in ("Play card", "Draw card") for a in actions):
+            actions = [a for a in actions if a["action"] != "Do nothing"]
+        if len(actions) == 1:
+            return action_text(actions[0])
+
+        states, mask = self.encoder_states(prompt_dict)
+        scores = candidate_logprobs(
+            self.model, self.tokenizer, states, mask, [[action_text(a) for a in actions]]
+        )[0]
+        return action_text(actions[int(scores.argmax())])
+
+    def encoder_states(self, prompt_dict: dict) -> tuple[torch.Tensor, torch.Tensor]:
+        "Encoder states and attention mask for a prompt, using the prefix cache if on."
+        if not self.cache_prefix:
+            return encode_prompts(self.model, self.tokenizer, [self.build_prompt(prompt_dict)])
+
+        inputs = self.cached_inputs(prompt_dict)
+        if "encoder_outputs" in inputs:
+            return inputs["encoder_outputs"].last_hidden_state, inputs["attention_mask"]
+
+        with torch.no_grad():
+            states = self.model.get_encoder()(input_ids=inputs["input_ids"]).last_hidden_state
+        return states, torch.ones_like(inputs["input_ids"])
+
     def build_prompt(self, prompt: dict) -> str:
-        system_parts = []
+        "See PromptBuilder.render."
+        return PROMPTS.render(prompt["context"], prompt.get("strategy"))
+
+    def build_prefix(self, prompt: dict) -> str:
+        "The part of the prompt which is the same for every decision, see PromptBuilder.prefix."
+        return PROMPTS.prefix(prompt.get("strategy"))
+
+    def build_suffix(self, prompt: dict) -> str:
+        "The part of the prompt which describes this decision."
+        return render_suffix(prompt['context'])
+
+    def cached_inputs(self, prompt_dict: dict) -> dict:
+        "Model inputs for a prompt, reusing the cached prefix. See cache_prefix."
+        prefix_ids, prefix_states = self._prefix(self.build_prefix(prompt_dict))
+        suffix_ids = self.tokenizer(
+            self.build_suffix(prompt_dict), return_tensors="pt"
+        ).input_ids.to(self.model.device)
+
+        if prefix_states is None:
+            return {"input_ids": torch.cat([prefix_ids, suffix_ids], dim=1)}
+
+        with torch.no_grad():
+            suffix_states = self.model.get_encoder()(input_ids=suffix_ids).last_hidden_state
+        states = torch.cat([prefix_states, suffix_states], dim=1)
+        return {
+            "encoder_outputs": BaseModelOutput(last_hidden_state=states),
+            "attention_mask": torch.ones(
+                states.shape[:2], dtype=torch.long, device=self.model.device
+            )
+        }
+
+    def _prefix(self, text: str) -> tuple[torch.Tensor, torch.Tensor | None]:
+        if text in self._prefix_cache:
+            return self._prefix_cache[text]
+
+        # no EOS token. the suffix brings its own.
+        ids = self.tokenizer(
+            text, add_special_tokens=False, return_tensors="pt"
+        ).input_ids.to(self.model.device)
 
-        for k in ("rules", "instructions", "strategy"):
-            if k in prompt:
-                system_parts.append(prompt[k])
+        states = None
+        if self.cache_prefix == "encoder":
+            with torch.no_grad():
+                states = self.model.get_encoder()(input_ids=ids).last_hidden_state
 
-        system_parts.append(f"{'\n'.join(prompt['context'])}s")
-        system_parts.append("Question: Which card should you play?")
-        system_parts.append("Answer:")
-        return "\n".join(system_parts).strip()
+        self._prefix_cache[text] = (ids, states)
+        return ids, states
@@ -0,0 +1,163 @@
+"""Process-wide pool of tokenizers and models. Every agent that asks for the same
+model path, tokenizer path and device shares one copy of the weights. Entries are
+reference counted: agents acquire on creation and release the handle they got when
+closed. Released models stay loaded so the next game is fast, until they are evicted.
+Loading happens outside the registry's lock, so a slow load only holds up agents
+waiting on that same model.
+"""
+
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import gc
+import logging
+import threading
+from typing import Any, Callable
+
+import torch
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = "/home/jordan/agents/uno-agent"
+DEFAULT_TOKENIZER_PATH = "/home/jordan/agents/tokenizer"
+
+Key = tuple[str, str, str | None]
+
+def load_pretrained(model_path: str, tokenizer_path: str, device: str | None) -> tuple[Any, Any]:
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_path, use_fast=False)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+    if device:
+        model = model.to(device)
+    model.eval()
+    return tokenizer, model
+
+@dataclass
+class _Entry:
+    # (tokenizer, model) once loaded.
+    loaded: Future = field(default_factory=Future)
+    refs: int = 0
+
+class ModelHandle:
+    "One acquire of a model. Unpacks to (tokenizer, model). Give it back with release."
+    def __init__(self, key: Key, entry: _Entry):
+        self.key = key
+        self.entry = entry
+        self.released = False
+
+    @property
+    def tokenizer(self) -> Any:
+        return self.entry.loaded.result()[0]
+
+    @property
+    def model(self) -> Any:
+        return self.entry.loaded.result()[1]
+
+    def __iter__(self):
+        return iter(self.entry.loaded.result())
+
+class ModelRegistry:
+    def __init__(self, loader: Callable[[str, str, str | None], tuple[Any, Any]]=load_pretrained):
+        """Shares models between agents.
+
+        Args:
+            loader (Callable, optional): Loads (tokenizer, model) given model path,
+                tokenizer path and device. Defaults to load_pretrained.
+        """
+        self.loader = loader
+        self._entries: dict[Key, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def acquire(
+        self, model_path: str=DEFAULT_MODEL_PATH, tokenizer_path: str=DEFAULT_TOKENIZER_PATH,
+        device: str | None=None
+    ) -> ModelHandle:
+        """Loads the model if this process has not yet. Whoever asks for a model while
+        it is loading waits for that load.
+
+        Returns:
+            ModelHandle: Unpacks to (tokenizer, model). Pass it to release when done.
+        """
+        key = (model_path, tokenizer_path, device)
+        with self._lock:
+            entry = self._entries.get(key)
+            load = entry is None
+            if load:
+                entry = self._entries[key] = _Entry()
+            entry.refs += 1
+
+        if load:
+            logger.info("Loading model %s on %s", model_path, device)
+            try:
+                entry.loaded.set_result(self.loader(model_path, tokenizer_path, device))
+            except BaseException as e:
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                entry.loaded.set_exception(e)
+                raise
+        # raises for everyone waiting if the load failed.
+        entry.loaded.result()
+        return ModelHandle(key, entry)
+
+    def release(self, handle: ModelHandle):
+        """Gives back a reference. The model stays loaded until evicted. Handles of
+        entries evicted since are let go without touching whatever is loaded now.
+        """
+        with self._lock:
+            if handle.released:
+                raise RuntimeError(f"Released model {handle.key} more times than it was acquired")
+            handle.released = True
+            if self._entries.get(handle.key) is handle.entry:
+                handle.entry.refs -= 1
+
+    def evict(self, model_path: str, device: str | None=None, force: bool=False) -> int:
+        """Unloads every entry for a model path (and device, if given).
+
+        Args:
+            model_path (str): Which model to unload.
+            device (str, optional): Only unload the copy on this device.
+            force (bool, optional): Unload even if agents still hold it. Those agents
+                keep their copy alive until they are done with it, and releasing it
+                afterwards does nothing.
+
+        Returns:
+            int: How many entries were unloaded.
+        """
+        with self._lock:
+            keys = [
+                k for k in self._entries
+                if k[0] == model_path and (device is None or k[2] == device)
+            ]
+            in_use = [k for k in keys if self._entries[k].refs > 0]
+            if in_use and not force:
+                raise RuntimeError(f"Models still in use: {in_use}")
+            for k in keys:
+                del self._entries[k]
+
+        if keys:
+            _free_memory()
+        return len(keys)
+
+    def evict_unused(self) -> int:
+        "Unloads every model no agent is holding. Returns how many were unloaded."
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e.refs == 0]
+            for k in keys:
+                del self._entries[k]
+
+        if keys:
+            _free_memory()
+        return len(keys)
+
+    def refs(self) -> dict[Key, int]:
+        "Reference count of every loaded model."
+        with self._lock:
+            return {k: e.refs for k, e in self._entries.items()}
+
+def _free_memory():
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+# the registry agents use unless they are given another one.
+registry = ModelRegistry()
@@ -0,0 +1,65 @@
+import json
+import random
+from collections import Counter
+
+from .agent import Agent
+from ..card import color, value, is_wild
+
+class RandomAgent(Agent):
+    """Bot that plays a random card which looks playable from its context and draws
+    otherwise. It always shields itself and tries to catch exposed players every so
+    often. Good for bot-only games.
+
+    Randomness is only used on its turn or while somebody is exposed, so being
+    prompted at any other time never changes the game.
+    """
+    def __init__(self, seed: int | None = None, catch_rate: float = .3):
+        self.rng = random.Random(seed)
+        # always catching means nobody ever gets to play their last card.
+        self.catch_rate = catch_rate
+
+    def act(self, prompt_dict: dict, is_turn: bool) -> str:
+        context: list[str] = prompt_dict["context"]
+        hand = context[1].split()
+
+        if self.uno_is_possible(context) and (
+            len(hand) == 1 or self.rng.random() < self.catch_rate
+        ):
+            return json.dumps({"action": "Yell UNO"})
+
+        if not is_turn:
+            return json.dumps({"action": "Do nothing"})
+
+        messages = "\n".join(context[context.index("Messages:") + 1:]).splitlines()
+        if any("You must draw" in m for m in messages):
+            return json.dumps({"action": "Draw card"})
+
+        top = next(line for line in context if line.startswith("Top card: "))[-2:]
+        chosen = [m[-1] for m in messages if "Chosen color: " in m]
+        next_color = chosen[-1] if chosen else color(top)
+
+        playable = [
+            c for c in hand
+            if is_wild(c) or color(c) == next_color or value(c) == value(top) or next_color == "W"
+        ]
+        if not playable:
+            return json.dumps({"action": "Draw card"})
+
+        c = self.rng.choice(playable)
+        r = {"action": "Play card", "card": c}
+        if is_wild(c):
+            colors = Counter(color(c2) for c2 in hand if not is_wild(c2))
+            r["nextColor"] = colors.most_common(1)[0][0] if colors else self.rng.choice("YGBR")
+        return json.dumps(r)
+
+    @staticmethod
+    def uno_is_possible(context: list[str]) -> bool:
+        "True if some player (maybe us) has one card and no shield."
+        table = context[context.index("Player | Cards | shielded:") + 1:]
+        for line in table:
+            parts = line.split()
+            if len(parts) != 3 or not parts[0].isdigit():
+                break
+            if parts[1] == "1" and parts[2] == "F":
+                return True
+        return False
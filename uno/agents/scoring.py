@@ -0,0 +1,64 @@
+"""Scores candidate responses with a seq2seq model instead of generating free text.
+Each prompt is encoded once. All candidates of all prompts are then scored by the
+decoder in a single forward pass. A candidate's score is the mean log-probability
+of its tokens, so picking the best one always gives back one of the candidates, and
+short candidates like "Do nothing" do not win just for having fewer tokens.
+"""
+
+import json
+
+import torch
+
+def action_text(action: dict) -> str:
+    "How an action is written out by agents (strict JSON, see instructions.txt)."
+    return json.dumps(action)
+
+def encode_prompts(
+    model, tokenizer, prompts: list[str], grad: bool=False
+) -> tuple[torch.Tensor, torch.Tensor]:
+    "Encoder states and attention mask for a padded batch of prompts."
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+    with torch.set_grad_enabled(grad):
+        states = model.get_encoder()(**inputs).last_hidden_state
+    return states, inputs["attention_mask"]
+
+def candidate_logprobs(
+    model, tokenizer, states: torch.Tensor, attention_mask: torch.Tensor,
+    candidates: list[list[str]], grad: bool=False, length_normalize: bool=True
+) -> list[torch.Tensor]:
+    """Log-probability of every candidate given its prompt.
+
+    Args:
+        model: Seq2seq model.
+        tokenizer: Its tokenizer.
+        states (torch.Tensor): (prompts, tokens, hidden) encoder states.
+        attention_mask (torch.Tensor): (prompts, tokens) mask for the states.
+        candidates (list[list[str]]): Candidate responses for each prompt.
+        grad (bool, optional): Keep the graph so the scores can be trained on (RL).
+            Defaults to False.
+        length_normalize (bool, optional): Mean log-probability per token instead of
+            the sum. Defaults to True.
+
+    Returns:
+        list[torch.Tensor]: One tensor of scores per prompt.
+    """
+    counts = torch.tensor([len(c) for c in candidates], device=states.device)
+    flat = [c for cs in candidates for c in cs]
+
+    labels = tokenizer(flat, return_tensors="pt", padding=True).input_ids.to(model.device)
+    labels[labels == tokenizer.pad_token_id] = -100
+
+    with torch.set_grad_enabled(grad):
+        logits = model(
+            encoder_outputs=(states.repeat_interleave(counts, dim=0),),
+            attention_mask=attention_mask.repeat_interleave(counts, dim=0),
+            labels=labels
+        ).logits
+
+    logprobs = torch.log_softmax(logits.float(), dim=-1)
+    mask = labels != -100
+    token_logprobs = logprobs.gather(-1, labels.clamp(min=0).unsqueeze(-1)).squeeze(-1)
+    scores = (token_logprobs * mask).sum(dim=-1)
+    if length_normalize:
+        scores = scores / mask.sum(dim=-1)
+    return list(scores.split(counts.tolist()))
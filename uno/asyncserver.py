@@ -0,0 +1,83 @@
+"""
+Asyncio version of UnoServer. Every player with something to decide in a tick is
+prompted at once, so one slow agent no longer holds up the others, and each agent
+gets a timeout. Many games can share one event loop (see play_games), which is what
+lets remote or model-backed agents keep busy while others wait on I/O.
+
+The rules are UnoServer's. Only how agents are asked changes: everyone sees the
+world as it was at the start of the tick and responses are handled in turn order.
+"""
+
+import asyncio
+import time
+
+from .unoserver import UnoServer
+from .player import Player
+
+DO_NOTHING = '{"action": "Do nothing"}'
+
+class AsyncUnoServer(UnoServer):
+    def __init__(self, *args, agent_timeout: float | None=None, **kwargs):
+        """Manages a game of Uno with async agents. Takes UnoServer's arguments.
+
+        Args:
+            agent_timeout (float, optional): Seconds to wait for an agent before
+                treating it as doing nothing. Agent.timeout overrides it per agent.
+                Defaults to waiting forever.
+        """
+        super().__init__(*args, **kwargs)
+        self.agent_timeout = agent_timeout
+
+    async def play_game(self, headless: bool=True, max_ticks: int | None=None):
+        """Runs the game until somebody wins. See UnoServer.play_game.
+
+        Headless by default since async games are for bots. Returns how many ticks
+        were played.
+        """
+        ticks = 0
+        while self.playing:
+            await self.tick(headless)
+
+            ticks += 1
+            if max_ticks is not None and ticks >= max_ticks and self.playing:
+                self.stop(ticks)
+                break
+
+            if not headless:
+                await asyncio.sleep(.2)
+
+        if self.metrics:
+            self.metrics.game_over()
+        return ticks
+
+    async def tick(self, headless: bool=True):
+        "Prompts players concurrently and processes their requests."
+        jobs = [
+            self._build_job(p) for p in self.players if not headless or self.has_decision(p)
+        ]
+
+        responses = await asyncio.gather(*(self._timed_ask(*job) for job, _ in jobs))
+        for (job, built), (raw_response, prompted) in zip(jobs, responses):
+            self._handle_job_response(job[0], raw_response, built, prompted)
+
+        while self.request_queue:
+            self.process_request(self.request_queue.popleft())
+
+    async def _timed_ask(self, *job) -> tuple[str, float]:
+        "ask, and how long it took."
+        start = time.perf_counter()
+        return await self.ask(*job), time.perf_counter() - start
+
+    async def ask(self, p: Player, context: list[str], is_turn: bool, actions: list[dict] | None) -> str:
+        "Waits on p's agent, giving up after its timeout."
+        timeout = p.agent.timeout if p.agent.timeout is not None else self.agent_timeout
+        try:
+            return await asyncio.wait_for(p.aprompt_agent(context, is_turn, actions), timeout)
+        except TimeoutError:
+            self._log("Player %s took too long.", p.id)
+            p.reject("You took too long.")
+            return DO_NOTHING
+
+async def play_games(servers: list[AsyncUnoServer], **kwargs):
+    "Plays several games on the current event loop. kwargs go to play_game."
+    await asyncio.gather(*(s.play_game(**kwargs) for s in servers))
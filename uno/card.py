@@ -1,4 +1,8 @@
 """This class allows for some syntactic sugar.
+
+Cards are two-character strings (color then value) wherever people or models see
+them. Internally each card kind also has an integer id (0-53) with precomputed
+lookup tables so that the rules never need to slice strings.
 """
 
 from typing import Literal
@@ -7,28 +11,73 @@ Card = Literal[
     # Red
     "R0",
     "R1","R1","R2","R2","R3","R3","R4","R4","R5","R5","R6","R6","R7","R7","R8","R8","R9","R9",
-    "RS","RS","RV","RV","RD","RD",
+    "RS","RS","RR","RR","RD","RD",
 
     # Yellow
     "Y0",
     "Y1","Y1","Y2","Y2","Y3","Y3","Y4","Y4","Y5","Y5","Y6","Y6","Y7","Y7","Y8","Y8","Y9","Y9",
-    "YS","YS","YV","YV","YD","YD",
+    "YS","YS","YR","YR","YD","YD",
 
     # Green
     "G0",
     "G1","G1","G2","G2","G3","G3","G4","G4","G5","G5","G6","G6","G7","G7","G8","G8","G9","G9",
-    "GS","GS","GV","GV","GD","GD",
+    "GS","GS","GR","GR","GD","GD",
 
     # Blue
     "B0",
     "B1","B1","B2","B2","B3","B3","B4","B4","B5","B5","B6","B6","B7","B7","B8","B8","B9","B9",
-    "BS","BS","BV","BV","BD","BD",
+    "BS","BS","BR","BR","BD","BD",
 
     # Wilds
     "WW","WW","WW","WW",   # Wild
     "WF","WF","WF","WF"    # Wild Draw Four
 ]
 
+COLORS = "RYGBW"
+VALUES = "0123456789SRDWF"
+
+# every kind of card. colors in deck order, then the two wilds.
+CARDS: tuple[Card, ...] = tuple(
+    c + v for c in COLORS[:4] for v in VALUES[:13]
+) + ("WW", "WF")
+CARD_ID: dict[Card, int] = {c: i for i, c in enumerate(CARDS)}
+COLOR_ID: dict[str, int] = {c: i for i, c in enumerate(COLORS)}
+
+WILD = COLOR_ID["W"]
+# next color before anything has been resolved (blank slate servers).
+NO_COLOR = len(COLORS)
+
+SKIP, REVERSE, DRAW_TWO, WILD_CARD, DRAW_FOUR = (VALUES.index(v) for v in "SRDWF")
+
+CARD_COLOR: tuple[int, ...] = tuple(COLOR_ID[c[0]] for c in CARDS)
+CARD_VALUE: tuple[int, ...] = tuple(VALUES.index(c[1]) for c in CARDS)
+CARD_IS_WILD: tuple[bool, ...] = tuple(k == WILD for k in CARD_COLOR)
+
+# PLAYABLE_ON[card][top][next_color] tells if card may be played on top.
+# next_color is W only if a wild card was the first card to flip.
+PLAYABLE_ON: tuple[tuple[tuple[bool, ...], ...], ...] = tuple(
+    tuple(
+        tuple(
+            CARD_IS_WILD[c] or CARD_COLOR[c] == nc or CARD_VALUE[c] == CARD_VALUE[t] or nc == WILD
+            for nc in range(NO_COLOR + 1)
+        )
+        for t in range(len(CARDS))
+    )
+    for c in range(len(CARDS))
+)
+
+def card_id(c: Card) -> int:
+    return CARD_ID[c]
+
+def card_str(i: int) -> Card:
+    return CARDS[i]
+
+def color_id(c: str | None) -> int:
+    return NO_COLOR if c is None else COLOR_ID[c]
+
+def color_str(i: int) -> str | None:
+    return None if i == NO_COLOR else COLORS[i]
+
 def color(c: Card) -> str:
     return c[0]
 
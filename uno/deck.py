@@ -1,7 +1,11 @@
 import logging
 from random import shuffle
+from typing import Callable
 
-from .card import Card
+from .card import Card, CARDS, CARD_ID
+from .seeding import Seed, as_rng
+
+logger = logging.getLogger(__name__)
 
 STANDARD_DECK = [
     # Red
@@ -29,31 +33,65 @@ STANDARD_DECK = [
     "WF","WF","WF","WF"    # Wild Draw Four
 ]
 
+STANDARD_DECK_IDS = [CARD_ID[c] for c in STANDARD_DECK]
+
 class Deck:
 
-    def __init__(self, forced_top_card: Card | None):
-        self.cards = STANDARD_DECK.copy()
-        shuffle(self.cards)
+    def __init__(
+        self, forced_top_card: Card | None, events=None,
+        reshuffle: Callable[[list[int]], None] | None=None, rng: Seed=None
+    ):
+        # shuffles with its own generator. None uses the global random module.
+        self.rng = as_rng(rng)
+        # EventSink told about reshuffles, see events.py.
+        self.events = events
+        # shuffles the discard pile when the deck runs out. replays use the logged order.
+        self._reshuffle = reshuffle
+
+        # both piles hold card ids (see card.py). draw/play/top_card_on_discard_pile
+        # hand out the string form.
+        self.cards: list[int] = STANDARD_DECK_IDS.copy()
+        self.shuffle(self.cards)
 
         # these are the cards on the discard pile. never needs interaction
         # except when interacting with the deck.
         if forced_top_card:
-            self.discard_pile: list[Card] = [forced_top_card]
+            self.discard_pile: list[int] = [CARD_ID[forced_top_card]]
         else:
-            self.discard_pile: list[Card] = [self.draw()]
+            self.discard_pile: list[int] = [self.draw_id()]
+
+    def __len__(self) -> int:
+        "How many cards can still be drawn. The top card of the discard pile stays put."
+        return len(self.cards) + max(len(self.discard_pile) - 1, 0)
 
     def draw(self) -> Card:
+        return CARDS[self.draw_id()]
+
+    def draw_id(self) -> int:
         if not self.cards:
-            logging.info("...the discard pile reshuffled...")
-            shuffle(self.discard_pile)
-            # empty the discard pile onto the new deck
-            self.cards = self.discard_pile.copy()
-            self.discard_pile = []
+            logger.info("...the discard pile reshuffled...")
+            # the top card stays face up. empty the rest onto the new deck.
+            top = self.discard_pile.pop()
+            (self._reshuffle or self.shuffle)(self.discard_pile)
+            self.cards = self.discard_pile
+            self.discard_pile = [top]
+            if self.events:
+                self.events.emit("reshuffle", list(self.cards))
 
         return self.cards.pop()
 
+    def shuffle(self, cards: list[int]):
+        "Shuffles cards in place."
+        if self.rng is None:
+            shuffle(cards)
+        else:
+            self.rng.shuffle(cards)
+
     def play(self, c: Card):
-        self.discard_pile.append(c)
+        self.discard_pile.append(CARD_ID[c])
+
+    def top_card_on_discard_pile(self) -> Card:
+        return CARDS[self.discard_pile[-1]]
 
-    def top_card_on_discard_pile(self):
+    def top_card_id(self) -> int:
         return self.discard_pile[-1]
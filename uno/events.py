@@ -0,0 +1,87 @@
+"""Structured game events for bulk runs.
+
+Logging formats a string per action, which is the wrong tool when thousands of games
+are played for data or evaluation. Give UnoServer(events=...) a sink instead and it
+emits one small tuple per thing that happens: (kind, *fields), for example
+("play", 2, "R7", None) or ("catch", 1, 3, 7). Nothing is formatted unless the sink
+wants it to be. A game's events are enough to rebuild it, see replay.py.
+
+Kinds and fields:
+    start      n_players, starting hand, uno penalty, draw pile ids, discard pile ids
+    context    player id, is turn (the player was shown the world)
+    request    player id, action, card, next color (queued, a played card leaves the hand)
+    play       player id, card, next color (accepted plays only)
+    draw       player id, card
+    reject     player id, reason, card handed back or None
+    shield     player id
+    catch      player id, caught player id, cards drawn
+    uno        player id (yelled with nobody to catch)
+    reshuffle  new draw pile ids
+    win        player id
+    stop       ticks (gave up without a winner)
+"""
+
+import json
+from typing import Iterable, Iterator, Protocol, TextIO
+
+Event = tuple
+
+class EventSink(Protocol):
+    def emit(self, kind: str, *fields):
+        ...
+
+class ListSink:
+    "Keeps events in memory as tuples. The cheapest sink."
+    def __init__(self):
+        self.events: list[Event] = []
+
+    def emit(self, kind: str, *fields):
+        self.events.append((kind, *fields))
+
+class JsonlSink:
+    def __init__(self, out: str | TextIO):
+        """Writes every event as a JSON list on its own line.
+
+        Args:
+            out (str | TextIO): File to append to, or an open text file.
+        """
+        self._owned = isinstance(out, str)
+        self._file = open(out, "a", encoding="utf-8") if self._owned else out # pylint: disable=consider-using-with
+        self._dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+    def emit(self, kind: str, *fields):
+        self._file.write(self._dumps((kind, *fields)) + "\n")
+
+    def close(self):
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+def read_events(f: str | Iterable[str]) -> Iterator[Event]:
+    "Events written by a JsonlSink, from a path or an iterable of lines."
+    if isinstance(f, str):
+        with open(f, encoding="utf-8") as lines:
+            yield from read_events(lines)
+        return
+    loads = json.loads
+    for line in f:
+        if line.strip():
+            yield tuple(loads(line))
+
+def split_games(events: Iterable[Event]) -> Iterator[list[Event]]:
+    "Splits a stream of events from many games at their start events."
+    game: list[Event] = []
+    for e in events:
+        if e[0] == "start" and game:
+            yield game
+            game = []
+        game.append(e)
+    if game:
+        yield game
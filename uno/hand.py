@@ -0,0 +1,176 @@
+"""A player's hand, indexed by card kind.
+
+Hand keeps the cards in the order they were received, like the list it replaces, so
+prompts and replays see the same hand. Alongside it keeps, for every card kind (see
+card.py), where that kind sits in the hand, and which kinds are held of every color
+and value. Membership, adding, removing and counting a card are O(1), and the cards
+playable on a top card are found from the buckets without looking at the rest of the
+hand, which matters once penalty draws pile up.
+"""
+
+from collections import deque
+from collections.abc import MutableSequence
+from itertools import islice
+from typing import Iterable, Iterator
+
+from .card import Card, CARDS, CARD_ID, CARD_COLOR, CARD_VALUE, COLORS, VALUES, WILD
+
+class Hand(MutableSequence):
+    def __init__(self, cards: Iterable[Card]=()):
+        self.clear()
+        for c in cards:
+            self.append(c)
+
+    def clear(self):
+        # every card under an increasing sequence number, in the order received.
+        self._cards: dict[int, Card] = {}
+        self._next = 0
+        # sequence numbers of every kind held, oldest first.
+        self._seqs: list[deque[int]] = [deque() for _ in CARDS]
+        # kinds held of every color and every value.
+        self._colors: list[set[int]] = [set() for _ in COLORS]
+        self._values: list[set[int]] = [set() for _ in VALUES]
+
+    def _index(self, seq: int, k: int):
+        seqs = self._seqs[k]
+        if not seqs:
+            self._colors[CARD_COLOR[k]].add(k)
+            self._values[CARD_VALUE[k]].add(k)
+        if not seqs or seqs[-1] < seq:
+            seqs.append(seq)
+        else:
+            # only replacing a card lands in the middle of a kind.
+            seqs.insert(next(i for i, s in enumerate(seqs) if s > seq), seq)
+
+    def _unindex(self, seq: int, k: int):
+        seqs = self._seqs[k]
+        if seqs[0] == seq:
+            seqs.popleft()
+        elif seqs[-1] == seq:
+            seqs.pop()
+        else:
+            seqs.remove(seq)
+        self._forget(k)
+
+    def _forget(self, k: int):
+        "Drops k from the buckets once none are left."
+        if not self._seqs[k]:
+            self._colors[CARD_COLOR[k]].discard(k)
+            self._values[CARD_VALUE[k]].discard(k)
+
+    def _discard(self, seq: int) -> Card:
+        c = self._cards.pop(seq)
+        self._unindex(seq, CARD_ID[c])
+        return c
+
+    def _seq(self, i: int) -> int:
+        "Sequence number of the card at index i."
+        n = len(self._cards)
+        if i < -n or i >= n:
+            raise IndexError("hand index out of range")
+        if i == -1:
+            return next(reversed(self._cards))
+        return next(islice(self._cards, i % n, None))
+
+    def append(self, c: Card):
+        self._index(self._next, CARD_ID[c])
+        self._cards[self._next] = c
+        self._next += 1
+
+    def remove(self, c: Card):
+        "Removes the first c received."
+        if c not in self:
+            raise ValueError(f"{c} is not in the hand")
+        k = CARD_ID[c]
+        del self._cards[self._seqs[k].popleft()]
+        self._forget(k)
+
+    def pop(self, i: int=-1) -> Card:
+        if i == -1 and self._cards:
+            _, c = self._cards.popitem()
+            k = CARD_ID[c]
+            # the last card received is the newest of its kind.
+            self._seqs[k].pop()
+            self._forget(k)
+            return c
+        return self._discard(self._seq(i))
+
+    def insert(self, i: int, c: Card):
+        if i >= len(self):
+            self.append(c)
+            return
+        cards = list(self)
+        cards.insert(i, c)
+        self.clear()
+        self.extend(cards)
+
+    def __getitem__(self, i: int | slice) -> Card | list[Card]:
+        if isinstance(i, slice):
+            return list(self)[i]
+        return self._cards[self._seq(i)]
+
+    def __setitem__(self, i: int | slice, c: Card | Iterable[Card]):
+        if isinstance(i, slice):
+            cards = list(self)
+            cards[i] = c
+            self.clear()
+            self.extend(cards)
+            return
+        seq = self._seq(i)
+        self._unindex(seq, CARD_ID[self._cards[seq]])
+        self._index(seq, CARD_ID[c])
+        # the card keeps its place.
+        self._cards[seq] = c
+
+    def __delitem__(self, i: int | slice):
+        seqs = list(self._cards)[i] if isinstance(i, slice) else [self._seq(i)]
+        for seq in seqs:
+            self._discard(seq)
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def __iter__(self) -> Iterator[Card]:
+        return iter(self._cards.values())
+
+    def __reversed__(self) -> Iterator[Card]:
+        return reversed(self._cards.values())
+
+    def __contains__(self, c) -> bool:
+        # agents can send anything as a card.
+        k = CARD_ID.get(c) if isinstance(c, str) else None
+        return k is not None and bool(self._seqs[k])
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Hand, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def count(self, c: Card) -> int:
+        return len(self._seqs[CARD_ID[c]]) if c in self else 0
+
+    def counts(self) -> list[int]:
+        "How many of every card kind are held, by card id."
+        return [len(s) for s in self._seqs]
+
+    def playable(self, top: int, next_color: int) -> list[Card]:
+        """Every kind held which may be played, see card.PLAYABLE_ON. Each kind once, in
+        the order they were first received.
+
+        Args:
+            top (int): Id of the top card of the discard pile.
+            next_color (int): Color id to follow. W allows anything, NO_COLOR only
+                matching values and wilds.
+        """
+        if next_color == WILD:
+            kinds = {k for ks in self._colors for k in ks}
+        else:
+            kinds = self._colors[WILD] | self._values[CARD_VALUE[top]]
+            if next_color < WILD:
+                kinds |= self._colors[next_color]
+        return [CARDS[k] for k in sorted(kinds, key=lambda k: self._seqs[k][0])]
@@ -0,0 +1,112 @@
+"""Opt-in counters and latency histograms for games.
+
+Give an Instrumentation to UnoServer(metrics=...) to see where a game's time goes:
+building contexts, agents thinking, handling their responses and processing
+requests. Without one the server only pays for a None check per hook.
+
+Subclass and override observe (or count) to forward events somewhere else.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+import json
+import threading
+
+# upper bounds of the histogram buckets in seconds: 1us, 2us, 4us ... ~17 minutes.
+BUCKETS = tuple(1e-6 * 2 ** i for i in range(31))
+
+class Histogram:
+    "Latencies bucketed by powers of two. Percentiles are bucket upper bounds."
+    def __init__(self, bounds: tuple[float, ...]=BUCKETS):
+        self.bounds = bounds
+        # the last bucket catches anything slower than the largest bound.
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.
+        self.min = float("inf")
+        self.max = 0.
+
+    def add(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        "Upper bound of the bucket holding the q-th quantile (0 to 1)."
+        if not self.count:
+            return 0.
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.,
+            "min": self.min if self.count else 0.,
+            "max": self.max,
+            "p50": self.percentile(.5),
+            "p90": self.percentile(.9),
+            "p99": self.percentile(.99),
+            # only buckets something landed in, keyed by upper bound.
+            "buckets": {
+                (f"{self.bounds[i]:.6g}" if i < len(self.bounds) else "inf"): n
+                for i, n in enumerate(self.counts) if n
+            },
+        }
+
+class Instrumentation:
+    def __init__(self, out: str | None=None):
+        """Collects counters and latencies from the games it is given to.
+
+        Args:
+            out (str, optional): Writes a JSON snapshot here at the end of every game.
+        """
+        self.out = out
+        self.counters: Counter[str] = Counter()
+        self.histograms: dict[str, Histogram] = {}
+        # agents may be prompted from several threads (see concurrent games).
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name: str, seconds: float):
+        "Records how long name took. Also counts it."
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = Histogram()
+            h.add(seconds)
+            self.counters[name] += 1
+
+    def game_over(self):
+        "Called by UnoServer when a game stops."
+        self.count("games")
+        if self.out:
+            self.dump(self.out)
+
+    def snapshot(self) -> dict:
+        "Counters and histograms as plain data."
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "latency": {k: h.snapshot() for k, h in sorted(self.histograms.items())},
+            }
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=1)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
@@ -5,18 +5,24 @@ All game-specific information pertaining to each player is stored here.
 from collections import deque
 import json
 import logging
-from typing import Literal
+import time
+from typing import Iterable, Literal
 
-from .utils import _get_resource
+from .prompt import rules, instructions
 from .agents import Agent, LLMAgent
-from .card import Card, color
+from .card import Card, CARD_ID, CARD_IS_WILD
+from .hand import Hand
+from .instrumentation import Instrumentation
 
 class Player:
 
-    def __init__(self, pid: int, request_queue: deque[dir], agent: Agent):
+    def __init__(
+        self, pid: int, request_queue: deque[dir], agent: Agent,
+        metrics: Instrumentation | None=None, events=None
+    ):
 
         # When a player is created, they are given a shuffled hand.
-        self.hand: list[str] = []
+        self._hand = Hand()
         self.id = pid
         # the model driving this player.
         self.agent = agent
@@ -34,31 +40,100 @@ class Player:
         # messages that will be given to the AI as context.
         self.message_queue: list[str] = []
 
+        # how many of this player's actions were turned down.
+        self.invalid_actions = 0
+
+        # shared with the server, see UnoServer's metrics and events.
+        self.metrics = metrics
+        self.events = events
+
+    @property
+    def hand(self) -> Hand:
+        "Cards held in the order they were received, indexed by kind (see hand.py)."
+        return self._hand
+
+    @hand.setter
+    def hand(self, cards: Iterable[Card]):
+        self._hand = Hand(cards)
+
     def give(self, card: str):
         self.hand.append(card)
 
     def message(self, msg: str):
         self.message_queue.append(msg)
 
+    def reject(self, msg: str, card: Card | None=None):
+        """Tells the player why their action was turned down.
+
+        Args:
+            msg (str): Why.
+            card (Card, optional): Card they tried to play, which goes back in their hand.
+        """
+        self.invalid_actions += 1
+        if self.metrics:
+            self.metrics.count("rejected")
+        if self.events:
+            self.events.emit("reject", self.id, msg, card)
+        self.message(msg)
+        if card:
+            self.give(card)
+
     def clear_messages(self):
         self.message_queue.clear()
 
-    def create_prompt(self, context: str) -> dict:
-        return {
-            "rules": _get_resource('uno.resources', 'uno_rules.txt'),
+    def create_prompt(self, context: str, actions: list[dict] | None=None) -> dict:
+        prompt = {
+            "rules": rules(),
             "context": context,
-            "instructions": _get_resource('uno.resources', 'instructions.txt'),
+            "instructions": instructions(),
             "strategy": self.agent.strategy if isinstance(self.agent, LLMAgent) else None
         }
+        if actions is not None:
+            prompt["actions"] = actions
+        return prompt
 
-    def send_context_and_prompt(self, context: str, is_turn: bool):
+    def send_context_and_prompt(self, context: str, is_turn: bool, actions: list[dict] | None=None):
         "Gives a player the world state. This prompts the agent's request, if any."
-        prompt = self.create_prompt(context)
-        raw_response: str = self.agent.act(prompt, is_turn)
+        if not self.metrics:
+            self.handle_response(self.prompt_agent(context, is_turn, actions))
+            return
+
+        start = time.perf_counter()
+        self.handle_response(self.prompt_agent(context, is_turn, actions))
+        self.metrics.observe("send_context_and_prompt", time.perf_counter() - start)
+
+    def prompt_agent(self, context: str, is_turn: bool, actions: list[dict] | None=None) -> str:
+        "Asks the agent what it wants to do. Safe to call from another thread."
+        prompt = self.create_prompt(context, actions)
+        if not self.metrics:
+            return self.agent.act(prompt, is_turn)
+
+        start = time.perf_counter()
+        response = self.agent.act(prompt, is_turn)
+        self.metrics.observe("agent.act", time.perf_counter() - start)
+        return response
+
+    async def aprompt_agent(self, context: str, is_turn: bool, actions: list[dict] | None=None) -> str:
+        "Async version of prompt_agent. See AsyncUnoServer."
+        prompt = self.create_prompt(context, actions)
+        if not self.metrics:
+            return await self.agent.aact(prompt, is_turn)
+
+        start = time.perf_counter()
+        response = await self.agent.aact(prompt, is_turn)
+        self.metrics.observe("agent.act", time.perf_counter() - start)
+        return response
+
+    def handle_response(self, raw_response: str):
+        "Turns the agent's raw response into a request, if any."
         try:
             response = json.loads(raw_response)
         except json.JSONDecodeError:
-            self.message("Invalid response. Send JSON.")
+            self.reject("Invalid response. Send JSON.")
+            return
+
+        if not isinstance(response, dict) or "action" not in response:
+            self.reject("Invalid response. Send JSON with an action.")
             return
 
         self.take_action(response)
@@ -71,25 +146,32 @@ class Player:
             case "Play card":
                 # NOTE we do not need to validate card. if its a bad card, its not in their hand
                 # and that will trigger the error.
-                c: Card = action["card"]
+                c: Card = action.get("card")
 
                 if c not in self.hand:
-                    self.message(f"You do not have card {c} in your hand.")
+                    self.reject(f"You do not have card {c} in your hand.")
                     return
 
-                if color(c) == "W":
-                    if not action["nextColor"]:
-                        self.message(f"You played a wild (W) card {c} so must indicate the next color.")
+                wild = CARD_IS_WILD[CARD_ID[c]]
+                if wild:
+                    if not action.get("nextColor"):
+                        self.reject(f"You played a wild (W) card {c} so must indicate the next color.")
                         return
                     if action["nextColor"] not in ("Y", "G", "R", "B"):
-                        self.message(f"Invalid color {action["nextColor"]}")
+                        self.reject(f"Invalid color {action["nextColor"]}")
                         return
 
-                if color(c) != "W" and "nextColor" in action:
-                    self.message(f"You played non-wild card {c} but tried to change the color.")
+                if not wild and "nextColor" in action:
+                    self.reject(f"You played non-wild card {c} but tried to change the color.")
                     return
 
                 self.hand.remove(c)
 
+        if self.events:
+            # a card leaves the hand as soon as it is asked to be played.
+            self.events.emit(
+                "request", self.id, action["action"], action.get("card"), action.get("nextColor")
+            )
+
         # if the request is invalid then server will send a message to the player's queue.
         self.request_queue.append(action | {"playerID": self.id,})
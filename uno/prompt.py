@@ -0,0 +1,79 @@
+"""Everything an agent is shown, without any agent or model attached.
+
+Resources are read from disk once per process. PromptBuilder precompiles the
+constant part of the prompt (rules, instructions, strategy) so rendering a decision
+is a couple of string joins. Both Player and the training data generator use it.
+"""
+
+from functools import cache
+from typing import Iterable
+
+from .utils import _get_resource
+
+QUESTION = "Question: Which card should you play?"
+ANSWER = "Answer:"
+
+@cache
+def rules() -> str:
+    return _get_resource('uno.resources', 'uno_rules.txt')
+
+@cache
+def instructions() -> str:
+    return _get_resource('uno.resources', 'instructions.txt')
+
+def render_context(
+    hand: Iterable[str], players: Iterable[tuple[int, int, bool]], draw_count: int,
+    top_card: str, messages: list[str]
+) -> list[str]:
+    """Lays out the world state the way UnoServer.build_context shows it.
+
+    Args:
+        hand (Iterable[str]): Cards in the player's hand.
+        players (Iterable[tuple[int, int, bool]]): (id, cards in hand, shielded) of
+            every player in turn order.
+        draw_count (int): Cards in the draw deck.
+        top_card (str): Top card of the discard pile.
+        messages (list[str]): Messages for the player.
+    """
+    context = ["Cards", " ".join(hand), "Player | Cards | shielded:"]
+    context.extend(f"{pid} {n} {"T" if shielded else "F"}" for pid, n, shielded in players)
+    context.append(f"{draw_count} card(s) in draw deck.")
+    context.append(f"Top card: {top_card}")
+    context.append("Messages:")
+    context.append(format_messages(messages))
+    return context
+
+def format_messages(message_queue: list[str]) -> str:
+    if not message_queue:
+        return ""
+    return "\n".join([f"- {m}" for m in message_queue])
+
+def render_suffix(context: list[str]) -> str:
+    "The part of the prompt which describes one decision."
+    return f"{'\n'.join(context)}s\n{QUESTION}\n{ANSWER}"
+
+class PromptBuilder:
+    "Turns contexts into prompts. Cheap to render, so fine for generating datasets."
+    def __init__(self):
+        # strategy -> rendered prefix, with the newline that joins it to the suffix.
+        self._prefixes: dict[str | None, str] = {}
+
+    def prompt_dict(self, context: list[str], strategy: str | None=None) -> dict:
+        "What Player hands to its agent."
+        return {
+            "rules": rules(),
+            "context": context,
+            "instructions": instructions(),
+            "strategy": strategy
+        }
+
+    def prefix(self, strategy: str | None=None) -> str:
+        "The part of the prompt which is the same for every decision."
+        if strategy not in self._prefixes:
+            parts = [rules(), instructions()] + ([strategy] if strategy is not None else [])
+            self._prefixes[strategy] = "\n".join(parts).lstrip() + "\n"
+        return self._prefixes[strategy]
+
+    def render(self, context: list[str], strategy: str | None=None) -> str:
+        "The full prompt an LLMAgent would be given for this context."
+        return self.prefix(strategy) + render_suffix(context)
@@ -0,0 +1,139 @@
+"""Rebuilds games from their events (see events.py) without any agents.
+
+The start event holds the shuffled deck and reshuffle events hold every new draw
+pile, so replaying is deterministic: the events are applied with the server's own
+methods and no agent is asked anything. That makes it cheap to mine logged games.
+
+    sink = ListSink()
+    UnoServer(agents, events=sink).play_game(headless=True)
+
+    replay = Replay(sink.events)
+    for index, pid, is_turn, context in replay.decisions():
+        ...  # replay.server is the game as that player saw it
+"""
+
+from collections import deque
+import logging
+import random
+from typing import Iterator
+
+from .card import CARDS
+from .deck import Deck
+from .events import Event
+from .unoserver import UnoServer
+
+class ReplayError(Exception):
+    "The events do not match what the server does with them."
+
+class Replay:
+    def __init__(self, events: list[Event]):
+        """Replays one game.
+
+        Args:
+            events (list[Event]): The game's events, starting with its start event.
+        """
+        if not events or events[0][0] != "start":
+            raise ReplayError("A game's events begin with a start event.")
+        self.events = events
+        self.restart()
+
+    def restart(self):
+        "Goes back to the first event."
+        _, n_players, starting_hand, uno_penalty, cards, discard_pile = self.events[0]
+        # the deck asks for these in the order they happened.
+        self._reshuffles = deque(e[1] for e in self.events if e[0] == "reshuffle")
+
+        # nothing here is random, but do not touch the global generator either.
+        rng = random.Random(0)
+        self.server = UnoServer(
+            n_players, uno_penalty=uno_penalty, blank_slate=True, log_level=logging.ERROR,
+            seed=rng
+        )
+        deck = Deck(CARDS[discard_pile[-1]], reshuffle=self._reshuffle, rng=rng)
+        deck.cards = list(cards)
+        deck.discard_pile = list(discard_pile)
+        self.server.deck = deck
+        self.server.start(starting_hand)
+
+        # how many events have been applied.
+        self.index = 1
+
+    def _reshuffle(self, pile: list[int]):
+        if not self._reshuffles:
+            raise ReplayError(f"Reshuffled at event {self.index} but none was logged.")
+        order = self._reshuffles.popleft()
+        if sorted(order) != sorted(pile):
+            raise ReplayError(f"Reshuffle at event {self.index} has different cards.")
+        pile[:] = order
+
+    def step(self, render: bool=False) -> list[str] | None:
+        """Applies the next event.
+
+        Args:
+            render (bool, optional): For context events, builds the context the player
+                was shown. Defaults to False, which only does what showing it did.
+
+        Returns:
+            list[str] | None: The context, if rendered.
+        """
+        if self.index >= len(self.events):
+            raise IndexError("No events left to replay.")
+        e = self.events[self.index]
+        self.index += 1
+
+        s = self.server
+        kind = e[0]
+        if kind in ("reshuffle", "win"):
+            # the deck and the winning play take care of these.
+            return None
+        if kind == "stop":
+            s.playing = False
+            return None
+
+        p = s.get_player(e[1])
+        match kind:
+            case "context":
+                if render:
+                    return s.build_context(p, e[2])
+                p.clear_messages()
+            case "request":
+                if e[2] == "Play card":
+                    p.hand.remove(e[3])
+            case "play":
+                s.play_card(p, e[2], e[3])
+            case "draw":
+                s.draw(p)
+                if p.hand[-1] != e[2]:
+                    raise ReplayError(f"Event {self.index - 1} drew {p.hand[-1]}, not {e[2]}.")
+            case "reject":
+                p.reject(e[2], e[3])
+            case "shield" | "catch" | "uno":
+                s.yell_uno(p)
+            case _:
+                raise ReplayError(f"Unknown event {e}")
+        return None
+
+    def seek(self, index: int) -> UnoServer:
+        "The game after its first index events."
+        if index < self.index:
+            self.restart()
+        while self.index < index:
+            self.step()
+        return self.server
+
+    def decisions(self) -> Iterator[tuple[int, int, bool, list[str]]]:
+        """Plays the rest of the game, yielding every time a player was shown the world.
+
+        Yields:
+            tuple: (index of the context event, player id, is turn, context). While
+                the caller has it, replay.server is the game at that moment.
+        """
+        while self.index < len(self.events):
+            e = self.events[self.index]
+            context = self.step(render=e[0] == "context")
+            if context is not None:
+                yield self.index - 1, e[1], e[2], context
+
+def state_at(events: list[Event], index: int) -> UnoServer:
+    "The game after its first index events."
+    return Replay(events).seek(index)
@@ -0,0 +1,37 @@
+"""Per-game randomness. Servers and decks take a Seed so a game never depends on the
+global random module (and so on whatever else ran in the same process).
+
+Parallel runs should not hand out seed, seed + 1, ... to their workers. split_seed
+derives independent seeds from one parent seed with numpy's SeedSequence, so every
+worker, shard or game is reproducible on its own and none of them overlap.
+"""
+
+import random
+
+import numpy as np
+
+# an int seed, a generator to draw from, or None for the global random module.
+Seed = int | random.Random | np.random.Generator | None
+
+def as_rng(seed: Seed) -> random.Random | np.random.Generator | None:
+    "A generator for seed. None stays None, meaning the global random module."
+    if seed is None or isinstance(seed, (random.Random, np.random.Generator)):
+        return seed
+    return random.Random(seed)
+
+def split_seed(seed: int | None, n: int) -> list[int]:
+    """n independent seeds derived from seed.
+
+    Args:
+        seed (int | None): Parent seed. None draws fresh entropy from the OS.
+        n (int): How many seeds.
+
+    Returns:
+        list[int]: 64 bit seeds, the same for the same parent seed.
+    """
+    children = np.random.SeedSequence(seed).spawn(n)
+    return [int(c.generate_state(1, np.uint64)[0]) for c in children]
+
+def fresh_seed() -> int:
+    "A seed from OS entropy, for runs which need to record the seed they used."
+    return int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
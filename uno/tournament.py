@@ -0,0 +1,184 @@
+"""
+Plays many games between the same agents over a process pool and sums up how each
+agent did: wins, invalid actions and how long the games took.
+
+Agents are given as specs so they can be built inside the workers:
+    random               RandomAgent
+    llm[:model_path]     LLMAgent generating free text
+    llm-score[:model_path]  LLMAgent scoring the legal actions
+Models are loaded once per worker process (see ModelRegistry).
+
+Every game gets its own seed, drawn from the tournament seed, so a tournament is
+reproducible no matter how many workers play it. Seats rotate from game to game so
+nobody always goes first.
+
+    uno-tournament random random llm --games 200 --workers 8 --out results.json
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import json
+import logging
+import os
+import statistics
+import time
+
+from .agents import Agent, RandomAgent
+from .seeding import split_seed
+from .unoserver import UnoServer
+
+@dataclass
+class GameResult:
+    # index into the tournament's agents, None if nobody won in time.
+    winner: int | None
+    ticks: int
+    # invalid actions of each agent, by agent index.
+    invalid_actions: list[int]
+
+def make_agent(spec: str, seed: int | None=None) -> Agent:
+    "Builds an agent from its spec (see the module docstring)."
+    kind, _, arg = spec.partition(":")
+    if kind == "random":
+        return RandomAgent(seed=seed)
+    if kind in ("llm", "llm-score"):
+        # torch is only imported by workers that need it.
+        from .agents import LLMAgent # pylint: disable=import-outside-toplevel
+        kwargs = {"model_path": arg} if arg else {}
+        return LLMAgent(decoding="score" if kind == "llm-score" else "generate", **kwargs)
+    raise ValueError(f"Unknown agent spec: {spec}")
+
+def game_seeds(seed: int, n_games: int) -> list[int]:
+    "Seed of every game in a tournament."
+    return split_seed(seed, n_games)
+
+def run_game(specs: list[str], seed: int, game_index: int=0, max_ticks: int | None=5000) -> GameResult:
+    """Plays one headless game.
+
+    Args:
+        specs (list[str]): One agent spec per player.
+        seed (int): Seeds the deck and the agents.
+        game_index (int, optional): Rotates the seats. Defaults to 0.
+        max_ticks (int, optional): Gives up on the game after this many ticks.
+
+    Returns:
+        GameResult: Who won and how it went, by index into specs.
+    """
+    n = len(specs)
+    # seat i is played by agent order[i].
+    order = [(game_index + i) % n for i in range(n)]
+    deck_seed, *agent_seeds = split_seed(seed, n + 1)
+    agents = [make_agent(specs[a], agent_seeds[i]) for i, a in enumerate(order)]
+
+    server = UnoServer(agents, log_level=logging.ERROR, seed=deck_seed)
+    try:
+        ticks = server.play_game(headless=True, max_ticks=max_ticks)
+    finally:
+        for agent in agents:
+            if hasattr(agent, "close"):
+                agent.close()
+
+    winner = None
+    invalid_actions = [0] * n
+    for p in server.players:
+        # the server rotates its players, ids are 1 + seat.
+        a = order[p.id - 1]
+        invalid_actions[a] = p.invalid_actions
+        if p.result == "Winner":
+            winner = a
+    return GameResult(winner, ticks, invalid_actions)
+
+def _run_game(job: tuple[list[str], int, int, int | None]) -> GameResult:
+    return run_game(*job)
+
+def run_tournament(
+    agents: list[str], n_games: int, workers: int | None=None, seed: int=0,
+    max_ticks: int | None=5000, out: str | None=None
+) -> dict:
+    """Plays n_games between agents and sums up the results.
+
+    Args:
+        agents (list[str]): One agent spec per player.
+        n_games (int): How many games to play.
+        workers (int, optional): Worker processes. 0 plays in this process.
+            Defaults to one per CPU.
+        seed (int, optional): Tournament seed. Defaults to 0.
+        max_ticks (int, optional): Games that take longer count as unfinished.
+            Defaults to 5000.
+        out (str, optional): Also writes the results as JSON to this file.
+
+    Returns:
+        dict: Per agent results, game lengths and throughput.
+    """
+    jobs = [(agents, s, i, max_ticks) for i, s in enumerate(game_seeds(seed, n_games))]
+
+    start = time.perf_counter()
+    if workers == 0:
+        games = list(map(_run_game, jobs))
+    else:
+        workers = workers or os.cpu_count() or 1
+        # games are short, so send them to the workers a few at a time.
+        chunksize = max(1, n_games // (4 * workers))
+        with ProcessPoolExecutor(workers) as pool:
+            games = list(pool.map(_run_game, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    results = summarize(agents, games)
+    results["seed"] = seed
+    results["seconds"] = round(elapsed, 3)
+    results["games_per_sec"] = round(n_games / elapsed, 2) if elapsed else None
+
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    return results
+
+def summarize(agents: list[str], games: list[GameResult]) -> dict:
+    "Sums up games played between agents."
+    n_games = len(games)
+    wins = [0] * len(agents)
+    invalid = [0] * len(agents)
+    for g in games:
+        if g.winner is not None:
+            wins[g.winner] += 1
+        for a, count in enumerate(g.invalid_actions):
+            invalid[a] += count
+
+    lengths = sorted(g.ticks for g in games if g.winner is not None)
+    return {
+        "games": n_games,
+        "unfinished": sum(g.winner is None for g in games),
+        "agents": [
+            {
+                "agent": spec,
+                "wins": wins[a],
+                "win_rate": round(wins[a] / n_games, 4) if n_games else 0.,
+                "invalid_actions": invalid[a],
+            }
+            for a, spec in enumerate(agents)
+        ],
+        "ticks": {
+            "mean": round(statistics.fmean(lengths), 1),
+            "p50": lengths[len(lengths) // 2],
+            "p90": lengths[int(len(lengths) * .9)],
+            "max": lengths[-1],
+        } if lengths else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a tournament between Uno agents.")
+    parser.add_argument("agents", nargs="+", help="agent specs, one per player (random, llm[:path], llm-score[:path])")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="0 plays in this process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ticks", type=int, default=5000)
+    parser.add_argument("--out", default=None, help="write the results as JSON here")
+    args = parser.parse_args()
+
+    results = run_tournament(
+        args.agents, args.games, args.workers, args.seed, args.max_ticks, args.out
+    )
+    print(json.dumps(results, indent=1))
+
+if __name__ == "__main__":
+    main()
@@ -23,29 +23,46 @@ Error : {
 """
 
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import sys
 import time
 import typing
 
+import numpy as np
+
 from .agents import Agent
-from .card import Card, is_wild, color, value
+from .card import (
+    Card, CARD_ID, CARD_COLOR, CARD_VALUE, CARD_IS_WILD, PLAYABLE_ON, NO_COLOR,
+    SKIP, REVERSE, DRAW_TWO, DRAW_FOUR, color, color_id, color_str
+)
 from .deck import Deck
+from .events import EventSink
+from .instrumentation import Instrumentation
 from .player import Player
+from .prompt import render_context
+from .vecserver import (
+    ACTION_DRAW, ACTION_NOTHING, ACTION_UNO, KIND_ACTIONS, N_ACTIONS, OBS_DRAW_LEN, OBS_IS_TURN,
+    OBS_MUST_DRAW, OBS_NEXT_COLOR, OBS_PLAYERS, OBS_TOP, action_request
+)
+from .seeding import Seed, as_rng
 
 Color = typing.Literal["Y", "G", "B", "R"]
 
+logger = logging.getLogger(__name__)
+
 class UnoServer:
     def __init__(
-        self, players: list[Agent], player_starting_hand: int = 7,
+        self, players: list[Agent] | int, player_starting_hand: int = 7,
         uno_penalty=7, forced_top_card: Card=None, blank_slate: bool=False,
-        log_level: int=logging.INFO
+        log_level: int=logging.NOTSET, metrics: Instrumentation | None=None,
+        events: EventSink | None=None, seed: Seed=None
     ):
         """Manages a game of Uno.
 
         Args:
-            players (list[Agent]): The agents requesting to be used in the game.
-                Order of this list specifies starting order.
+            players (list[Agent] | int): The agents requesting to be used in the game.
+                Order of this list specifies starting order. An int creates that many
+                placeholder agents, for driving the server directly with process_request.
             player_starting_hand (int, optional): How many cards to deal to players
                 at game start. Defaults to 7.
             uno_penalty (int, optional): How many cards a player needs to draw if they
@@ -55,39 +72,67 @@ class UnoServer:
                 this likely introduces a duplicate. Defaults to None.
             blank_slate (bool, optional): Does not hand cards to players or reveal top card.
                 Good for mock scenarios like generating random train datasets.
+            log_level (int, optional): This server does not log anything below this
+                level. Where logs go is up to the application (see logging.basicConfig).
+                Defaults to logging.NOTSET, which leaves it all to the logging config.
+            metrics (Instrumentation, optional): Collects counters and latencies of
+                the game's hot paths. Off by default.
+            events (EventSink, optional): Receives a structured event for everything
+                that happens in the game (see events.py). Off by default.
+            seed (int | random.Random | numpy.random.Generator, optional): The game's
+                own randomness (see seeding.py). Defaults to the global random module.
         """
+        self.log_level = log_level
+        # None unless somebody wants a record of the game.
+        self.events = events
 
-        # allow logging to stdout
-        root = logging.getLogger()
-        root.setLevel(log_level)
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(log_level)
-        root.addHandler(handler)
-
-        self.deck = Deck(forced_top_card)
+        # the game's generator, also handy for anything built on top of the game.
+        self.rng = as_rng(seed)
+        self.deck = Deck(forced_top_card, events, rng=self.rng)
         self.uno_penalty = uno_penalty
 
+        # None unless somebody wants to know where the time goes.
+        self.metrics = metrics
+
         # requests will be dict payloads.
         self.request_queue: deque[dict] = deque([])
 
-        # which color to request next
-        self.next_color: Color = None
+        # which color to request next, as a color id. see next_color.
+        self._next_color: int = NO_COLOR
+
+        if isinstance(players, int):
+            players = [Agent() for _ in range(players)]
 
         # spawn the players. their index in this list is turn order.
         # the person who is at the top of this list is the person
         # whose turn it is.
         # For now, randomly assign the starting order.
         self.players: deque[Player] = deque([
-            Player(n+1, self.request_queue, agent) for n, agent in enumerate(players)
+            Player(n+1, self.request_queue, agent, metrics, events)
+            for n, agent in enumerate(players)
         ])
         self.next_player = self.players[0]
 
         # keeps track of how many cards the current player must draw.
         self.must_draw_count = 0
 
+        # threads for prompting agents concurrently. only made when needed.
+        self._executor: ThreadPoolExecutor | None = None
+
         if blank_slate:
             return
 
+        self.start(player_starting_hand)
+
+    def start(self, player_starting_hand: int=7):
+        "Deals the cards and flips the top card. Done on creation unless blank_slate."
+        if self.events:
+            # enough to deal the same game again, see replay.py.
+            self.events.emit(
+                "start", len(self.players), player_starting_hand, self.uno_penalty,
+                list(self.deck.cards), list(self.deck.discard_pile)
+            )
+
         # deal the cards.
         for _ in range(player_starting_hand):
             for p in self.players:
@@ -106,51 +151,235 @@ class UnoServer:
         # keeps track if the game is officially playing.
         self.playing = True
 
-    def play_game(self):
+    def play_game(self, headless: bool=False, max_ticks: int|None=None, concurrent: bool=False):
+        """Runs the game until somebody wins.
+
+        Args:
+            headless (bool, optional): Runs ticks back to back without sleeping and only
+                prompts players who have a meaningful decision (see has_decision).
+                Meant for games without humans. Defaults to False.
+            max_ticks (int, optional): Gives up after this many ticks, leaving the game
+                without a winner. Bots can get stuck once the deck runs dry.
+            concurrent (bool, optional): Prompts all players of a tick at the same time
+                (see broadcast_world_state_concurrently) so that agents sharing an
+                InferenceService get batched together. Defaults to False.
+
+        Returns:
+            int: How many ticks were played.
+        """
+        try:
+            return self._play_game(headless, max_ticks, concurrent)
+        finally:
+            if self._executor:
+                self._executor.shutdown()
+                self._executor = None
+            if self.metrics:
+                self.metrics.game_over()
+
+    def _play_game(self, headless: bool, max_ticks: int|None, concurrent: bool) -> int:
+        ticks = 0
         while self.playing:
+            self.tick(headless, concurrent)
+
+            ticks += 1
+            if max_ticks is not None and ticks >= max_ticks and self.playing:
+                self.stop(ticks)
+                break
+
+            if not headless:
+                # :)
+                time.sleep(.2)
+        return ticks
+
+    def tick(self, headless: bool=False, concurrent: bool=False):
+        "Prompts the players once and processes their requests. See play_game."
+        if concurrent:
+            self.broadcast_world_state_concurrently([
+                p for p in self.players if not headless or self.has_decision(p)
+            ])
+        else:
             for p in self.players:
-                self.broadcast_world_state(p)
+                if not headless or self.has_decision(p):
+                    self.broadcast_world_state(p)
 
-            while self.request_queue:
-                self.process_request(self.request_queue.popleft())
+        while self.request_queue:
+            self.process_request(self.request_queue.popleft())
 
-            # :)
-            time.sleep(.2)
+    def candidate_actions(self, p: Player) -> list[dict]:
+        """Every request p could make right now which the server would act on:
+        playable cards (wilds once per color), Draw card on their turn while there
+        are cards, Yell UNO if it would shield them or catch somebody, and Do nothing.
+        Cards come in the order p received them. See legal_actions.
+        """
+        return [action_request(a) for a in self._legal_action_ids(p)]
+
+    def legal_actions(self, p: Player) -> np.ndarray:
+        """Every request p could make right now which the server would act on, as a mask
+        over VecUnoServer's action ids (see vecserver.action_request): plays of cards that
+        fit (wilds once per color) unless p must draw, drawing on their turn while there
+        are cards, yelling UNO if it would shield them or catch somebody, and doing
+        nothing.
+
+        Args:
+            p (Player): Whose actions.
+
+        Returns:
+            np.ndarray: (N_ACTIONS,) bool, like a row of VecUnoServer.legal_mask.
+        """
+        mask = np.zeros(N_ACTIONS, dtype=bool)
+        mask[self._legal_action_ids(p)] = True
+        return mask
+
+    def _legal_action_ids(self, p: Player) -> list[int]:
+        "The legal action ids of p, see legal_actions. Cards in the order p received them."
+        actions = []
+        if p == self.next_player:
+            if self.must_draw_count == 0:
+                for c in p.hand.playable(self.deck.top_card_id(), self._next_color):
+                    actions.extend(KIND_ACTIONS[CARD_ID[c]])
+            if self.deck:
+                actions.append(ACTION_DRAW)
+
+        if self.uno_matters(p):
+            actions.append(ACTION_UNO)
+        actions.append(ACTION_NOTHING)
+        return actions
+
+    def uno_matters(self, p: Player) -> bool:
+        "Yelling UNO would shield p or catch somebody. See yell_uno."
+        if len(p.hand) == 1:
+            return not p.is_shielded
+        return any(
+            p2 != p and len(p2.hand) == 1 and not p2.is_shielded for p2 in self.players
+        )
+
+    def has_decision(self, p: Player) -> bool:
+        """A player has a decision to make on their turn, or while somebody is holding
+        one card without a shield (they may shield themselves or be caught). Otherwise
+        the only thing a player can do is nothing.
+        """
+        return p == self.next_player or any(
+            len(p2.hand) == 1 and not p2.is_shielded for p2 in self.players
+        )
 
     def broadcast_world_state(self, p: Player):
         "Provides context to our players"
+        m = self.metrics
+        if m:
+            start = time.perf_counter()
+
         is_turn = p == self.next_player
         context = self.build_context(p, is_turn)
-        p.send_context_and_prompt(context, is_turn)
+        actions = self.candidate_actions(p) if p.agent.wants_actions else None
 
-    def build_context(self, p: Player, is_turn: bool) -> list[str]:
-        context= []
+        if m:
+            m.observe("build_context", time.perf_counter() - start)
 
-        # personal stats
-        context.append("Cards")
-        context.append(" ".join(p.hand))
+        p.send_context_and_prompt(context, is_turn, actions)
 
-        # stats on players
-        context.append("Player | Cards | shielded:")
-        for p2 in self.players:
-            context.append(f"{p2.id} {len(p2.hand)} {"T" if p2.is_shielded else "F"}")
+        if m:
+            m.observe("broadcast_world_state", time.perf_counter() - start)
+
+    def broadcast_world_state_concurrently(self, players: list[Player]):
+        """Provides context to several players and waits on all their agents at once.
+        Everyone sees the world as it was before anybody acted. Responses are still
+        handled in turn order so the outcome does not depend on who answers first.
+        """
+        jobs = [self._build_job(p) for p in players]
 
-        # stats on deck
-        context.append(f"{len(self.deck.cards)} card(s) in draw deck.")
-        context.append(f"Top card: {self.deck.top_card_on_discard_pile()}")
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.players))
+
+        def prompt(job: tuple) -> tuple[str, float]:
+            start = time.perf_counter()
+            return job[0].prompt_agent(*job[1:]), time.perf_counter() - start
+
+        responses = list(self._executor.map(prompt, (job for job, _ in jobs)))
+        for (job, built), (raw_response, prompted) in zip(jobs, responses):
+            self._handle_job_response(job[0], raw_response, built, prompted)
+
+    def _build_job(self, p: Player) -> tuple[tuple, float]:
+        """What prompting p takes, (p, context, is_turn, actions), and how long building
+        it took. Timed as build_context, like broadcast_world_state.
+        """
+        start = time.perf_counter()
+        is_turn = p == self.next_player
+        actions = self.candidate_actions(p) if p.agent.wants_actions else None
+        job = (p, self.build_context(p, is_turn), is_turn, actions)
+        built = time.perf_counter() - start
+        if self.metrics:
+            self.metrics.observe("build_context", built)
+        return job, built
+
+    def _handle_job_response(self, p: Player, raw_response: str, built: float, prompted: float):
+        """Handles a response to a job from _build_job. Records the timings
+        broadcast_world_state and send_context_and_prompt record for the same work, with
+        prompted being how long p's agent took.
+        """
+        if not self.metrics:
+            p.handle_response(raw_response)
+            return
+
+        start = time.perf_counter()
+        p.handle_response(raw_response)
+        sent = prompted + time.perf_counter() - start
+        self.metrics.observe("send_context_and_prompt", sent)
+        self.metrics.observe("broadcast_world_state", built + sent)
+
+    def stop(self, ticks: int):
+        "Gives up on the game without a winner."
+        self._log("Stopping after %s ticks.", ticks)
+        self.playing = False
+        if self.events:
+            self.events.emit("stop", ticks)
+
+    def observe(self, p: Player) -> np.ndarray:
+        """What p is shown as an int16 row, laid out like VecUnoServer.observe so games
+        from either engine can be stored and learned from the same way.
+        """
+        is_turn = p == self.next_player
+        obs = np.zeros(OBS_PLAYERS + 3 * len(self.players), dtype=np.int16)
+        obs[:OBS_TOP] = p.hand.counts()
+        obs[OBS_TOP] = self.deck.top_card_id()
+        obs[OBS_NEXT_COLOR] = self._next_color
+        obs[OBS_MUST_DRAW] = self.must_draw_count if is_turn else 0
+        obs[OBS_IS_TURN] = is_turn
+        obs[OBS_DRAW_LEN] = len(self.deck.cards)
+        obs[OBS_PLAYERS:].reshape(3, -1)[:] = [
+            [p2.id - 1 for p2 in self.players],
+            [len(p2.hand) for p2 in self.players],
+            [p2.is_shielded for p2 in self.players],
+        ]
+        return obs
+
+    def build_context(self, p: Player, is_turn: bool) -> list[str]:
+        if self.events:
+            # clears p's messages, which shows in their next context.
+            self.events.emit("context", p.id, is_turn)
 
         if is_turn and self.must_draw_count > 0:
             p.message(f"You must draw {self.must_draw_count} card(s)")
 
-        if is_wild(self.deck.top_card_on_discard_pile()):
+        if CARD_IS_WILD[self.deck.top_card_id()]:
             p.message(f"Chosen color: {self.next_color}")
 
-        context.append("Messages:")
-        context.append(_format_messages(p.message_queue))
+        context = render_context(
+            p.hand,
+            ((p2.id, len(p2.hand), p2.is_shielded) for p2 in self.players),
+            len(self.deck.cards),
+            self.deck.top_card_on_discard_pile(),
+            p.message_queue
+        )
         p.clear_messages()
-        logging.info("\n".join(context))
+        if self.log_level <= logging.DEBUG and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Context for player %s:\n%s", p.id, "\n".join(context))
         return context
 
+    def _log(self, msg: str, *args):
+        "Logs at INFO unless this server was asked to be quieter. Formats lazily."
+        if self.log_level <= logging.INFO:
+            logger.info(msg, *args)
+
     def process_request(self, r: dict):
         """
         {
@@ -160,6 +389,10 @@ class UnoServer:
         "nextColor: ["Y","R","B","G","W"]
         }
         """
+        m = self.metrics
+        if m:
+            start = time.perf_counter()
+
         p = self.get_player(r["playerID"])
         match r["action"]:
             case "Play card":
@@ -175,17 +408,26 @@ class UnoServer:
                 self.yell_uno(p)
 
             case _:
-                p.message("Invalid request.")
+                p.reject("Invalid request.")
+                if m:
+                    # agents can send anything, keep it to one histogram.
+                    m.observe("process_request.invalid", time.perf_counter() - start)
+                return
+
+        if m:
+            m.observe(f"process_request.{r["action"]}", time.perf_counter() - start)
 
     def yell_uno(self, p: Player):
-        logging.info("Player %s yelled UNO...", p)
+        self._log("Player %s yelled UNO...", p)
 
         # if a person is yelling uno when they have one card,
         # they are putting a shield upon them.
         if len(p.hand) == 1:
-            logging.info("...they are shielded!")
+            self._log("...they are shielded!")
             p.message("You are shielded.")
             p.is_shielded = True
+            if self.events:
+                self.events.emit("shield", p.id)
             return
 
         # when a person is yelling uno and another person has one card,
@@ -195,66 +437,77 @@ class UnoServer:
                 len(p2.hand) == 1 and \
                 not p2.is_shielded:
 
-                logging.info("THEY CAUGHT SOMEBODY!")
-                logging.info("Giving %s cards to Player %s", self.uno_penalty, p2.id)
+                self._log("THEY CAUGHT SOMEBODY!")
+                self._log("Giving %s cards to Player %s", self.uno_penalty, p2.id)
                 p.message("You caught somebody!")
                 p2.message("Somebody said uno before you.")
+                drawn = 0
                 for _ in range(self.uno_penalty):
+                    if not self.deck:
+                        break
                     p2.give(self.deck.draw())
+                    drawn += 1
+                if self.events:
+                    self.events.emit("catch", p.id, p2.id, drawn)
                 return
 
-        logging.info("...nothing happened.")
+        self._log("...nothing happened.")
+        if self.events:
+            self.events.emit("uno", p.id)
 
     def draw(self, p: Player):
-        logging.info("Player %s tried to draw a card...", p.id)
+        self._log("Player %s tried to draw a card...", p.id)
 
         if p != self.next_player:
-            logging.info("...it wasn't their turn!")
-            p.message("Not your turn.")
+            self._log("...it wasn't their turn!")
+            p.reject("Not your turn.")
             return
 
         if not self.deck:
-            logging.info("...the draw deck is empty!")
-            p.message("No more cards to draw!")
+            self._log("...the draw deck is empty!")
+            p.reject("No more cards to draw!")
             return
 
         # decrement draw count, if necessary
         self.must_draw_count = max(0,self.must_draw_count-1)
-        logging.info("...they drew a card.")
-        p.give(self.deck.draw())
+        self._log("...they drew a card.")
+        c = self.deck.draw()
+        p.give(c)
+        if self.events:
+            self.events.emit("draw", p.id, c)
 
     def iterate_next_player(self):
         # pop from the player queue and push to the back
         self.players.append(self.players.popleft())
         self.next_player = self.players[0]
-        logging.info("It is player %s turn.", self.next_player.id)
+        self._log("It is player %s turn.", self.next_player.id)
 
     def play_card(self, p: Player, c: Card, next_color: str|None=None):
-        logging.info("Player %s tried to play %s...", p.id, c)
+        self._log("Player %s tried to play %s...", p.id, c)
         if p != self.next_player:
-            logging.info("...it wasn't their turn!")
-            p.message("It is not your turn.")
-            p.give(c)
+            self._log("...it wasn't their turn!")
+            p.reject("It is not your turn.", c)
             return
 
         if not self.valid(c):
-            logging.info("...it wasn't a valid card!")
-            p.message("Invalid card.")
-            p.give(c)
+            self._log("...it wasn't a valid card!")
+            p.reject("Invalid card.", c)
             return
 
         if self.must_draw_count > 0:
-            logging.info("...they're supposed to draw a card!")
-            p.message("You must draw a card.")
-            p.give(c)
+            self._log("...they're supposed to draw a card!")
+            p.reject("You must draw a card.", c)
             return
 
+        if self.events:
+            self.events.emit("play", p.id, c, next_color)
+
         # if player has no cards, they win!
         if len(p.hand) == 0:
             self.declare_winner(p)
             return
 
-        logging.info("...they played %s.", c)
+        self._log("...they played %s.", c)
         self.resolve(c, next_color)
         self.deck.play(c)
 
@@ -264,39 +517,45 @@ class UnoServer:
         for p2 in self.players:
             if p != p2:
                 p2.result = "Loser"
-        logging.info("Player %s WON!", p.id)
+        self._log("Player %s WON!", p.id)
         p.result = "Winner"
+        if self.events:
+            self.events.emit("win", p.id)
 
-    def resolve(self, c: Card, next_color: str|None=None):
-        match value(c):
-            case "S":
-                self.iterate_next_player()
-                self.iterate_next_player()
-            case "D":
-                self.must_draw_count += 2
-                self.iterate_next_player()
-            case "F":
-                self.must_draw_count += 4
-                self.next_color = next_color
-                self.iterate_next_player()
-            case "W":
-                self.next_color = next_color
-                self.iterate_next_player()
-            case "R":
-                p = self.players.popleft()
-                self.players = deque(reversed(self.players))
-                self.players.append(p)
-                self.next_player = self.players[0]
-            case _:
-                self.iterate_next_player()
+    @property
+    def next_color(self) -> Color | None:
+        return color_str(self._next_color)
 
-        self.next_color = next_color if color(c) == "W" else color(c)
+    @next_color.setter
+    def next_color(self, c: Color | None):
+        self._next_color = color_id(c)
+
+    def resolve(self, c: Card, next_color: str|None=None):
+        cid = CARD_ID[c]
+        v = CARD_VALUE[cid]
+        if v == SKIP:
+            self.iterate_next_player()
+            self.iterate_next_player()
+        elif v == DRAW_TWO:
+            self.must_draw_count += 2
+            self.iterate_next_player()
+        elif v == DRAW_FOUR:
+            self.must_draw_count += 4
+            self.iterate_next_player()
+        elif v == REVERSE:
+            p = self.players.popleft()
+            self.players = deque(reversed(self.players))
+            self.players.append(p)
+            self.next_player = self.players[0]
+        else:
+            self.iterate_next_player()
+
+        self._next_color = color_id(next_color) if CARD_IS_WILD[cid] else CARD_COLOR[cid]
 
     def valid(self, c: Card) -> bool:
-        return is_wild(c) or \
-            color(c) == self.next_color or \
-            value(c) == value(self.deck.top_card_on_discard_pile()) or \
-            self.next_color == 'W' # should only happen if wild card was first card to flip.
+        # a next color of W should only happen if wild card was first card to flip.
+        # card.PLAYABLE_ON covers that too.
+        return PLAYABLE_ON[CARD_ID[c]][self.deck.top_card_id()][self._next_color]
 
     def get_player(self, pid: int) -> Player:
         if pid <= 0 or pid > len(self.players):
@@ -305,11 +564,6 @@ class UnoServer:
             if p.id == pid:
                 return p
 
-def _format_messages(message_queue: list[str]) -> str:
-    if not message_queue:
-        return ""
-    return "\n".join([f"- {m}" for m in message_queue])
-
 class Error:
     "This means that the agent did something bad. Also hands their card back."
     def __init__(self, msg: str, c: Card|None=None):
@@ -0,0 +1,420 @@
+"""
+Array-backed uno engine which plays many games in lockstep. The state of every
+game lives in NumPy arrays and all games advance together through batched calls
+to `step`. The rules are the same as `UnoServer.process_request`, `resolve` and
+`valid`, so this can stand in for the object engine when we need volume
+(RL rollouts, dataset generation).
+
+Cards are stored as card kinds (see KINDS) and hands as per-kind counts.
+Players are referred to by seat. Seat s is the player with id s+1 in UnoServer.
+
+Actions:
+    0-51    Play the non-wild card of that kind.
+    52-55   Play WW and choose next color R, Y, G or B.
+    56-59   Play WF and choose next color R, Y, G or B.
+    60      Draw card
+    61      Yell UNO
+    62      Do nothing
+
+Observations (returned by `observe`, one int16 row per game) hold what a player is
+shown, see render_observation:
+    0-53    Cards of each kind in their hand.
+    54-58   Top card, next color, cards they must draw (0 unless it is their
+            turn), whether it is their turn and cards in the draw pile.
+    59-     Seats in turn order starting at the current player, then the hand size
+            and shield of each of those seats.
+
+Statuses (returned by `step`, one per game):
+    OK, NOT_IN_HAND, NOT_YOUR_TURN, INVALID_CARD, MUST_DRAW, NO_CARDS,
+    INVALID_REQUEST, GAME_OVER
+"""
+
+import numpy as np
+
+from .card import (
+    CARDS, CARD_ID, CARD_COLOR, CARD_VALUE, CARD_IS_WILD, PLAYABLE_ON, COLORS, NO_COLOR,
+    SKIP, REVERSE, DRAW_TWO, DRAW_FOUR, color_str
+)
+from .deck import STANDARD_DECK_IDS
+from .prompt import render_context
+
+# the card tables from card.py as arrays. see card.py for the card kinds.
+KINDS = CARDS
+N_KINDS = len(KINDS)
+KIND_ID = CARD_ID
+WW, WF = KIND_ID["WW"], KIND_ID["WF"]
+
+KIND_COLOR = np.array(CARD_COLOR, dtype=np.int8)
+KIND_VALUE = np.array(CARD_VALUE, dtype=np.int8)
+KIND_IS_WILD = np.array(CARD_IS_WILD, dtype=bool)
+
+# PLAYABLE[card, top, next_color] mirrors UnoServer.valid. vec games always have a color.
+PLAYABLE = np.array(PLAYABLE_ON, dtype=bool)[:, :, :NO_COLOR]
+
+STANDARD_KINDS = np.array(STANDARD_DECK_IDS, dtype=np.int8)
+
+# action space
+N_PLAY_ACTIONS = WW
+ACTION_DRAW = N_PLAY_ACTIONS + 8
+ACTION_UNO = ACTION_DRAW + 1
+ACTION_NOTHING = ACTION_UNO + 1
+N_ACTIONS = ACTION_NOTHING + 1
+
+# which card kind and chosen color each play action stands for.
+ACTION_KIND = np.concatenate([
+    np.arange(N_PLAY_ACTIONS), np.full(4, WW), np.full(4, WF)
+]).astype(np.int8)
+ACTION_COLOR = np.concatenate([
+    KIND_COLOR[:N_PLAY_ACTIONS], np.arange(4), np.arange(4)
+]).astype(np.int8)
+# and the other way around, the play actions of every card kind (one per color for wilds).
+KIND_ACTIONS: tuple[tuple[int, ...], ...] = tuple(
+    tuple(np.flatnonzero(ACTION_KIND == k).tolist()) for k in range(N_KINDS)
+)
+
+# observation layout
+OBS_TOP, OBS_NEXT_COLOR, OBS_MUST_DRAW, OBS_IS_TURN, OBS_DRAW_LEN = range(N_KINDS, N_KINDS + 5)
+OBS_PLAYERS = OBS_DRAW_LEN + 1
+
+OK, NOT_IN_HAND, NOT_YOUR_TURN, INVALID_CARD, MUST_DRAW, NO_CARDS, \
+    INVALID_REQUEST, GAME_OVER = range(8)
+
+
+def play_action(card: str, next_color: str | None = None) -> int:
+    "Action id for playing a card (and choosing a color if it is wild)."
+    k = KIND_ID[card]
+    if k < N_PLAY_ACTIONS:
+        return k
+    return N_PLAY_ACTIONS + 4 * (k - WW) + COLORS.index(next_color)
+
+def action_request(a: int) -> dict:
+    "The request UnoServer takes for an action id."
+    if a == ACTION_DRAW:
+        return {"action": "Draw card"}
+    if a == ACTION_UNO:
+        return {"action": "Yell UNO"}
+    if a == ACTION_NOTHING:
+        return {"action": "Do nothing"}
+    r = {"action": "Play card", "card": KINDS[ACTION_KIND[a]]}
+    if a >= N_PLAY_ACTIONS:
+        r["nextColor"] = COLORS[ACTION_COLOR[a]]
+    return r
+
+def obs_size(n_players: int) -> int:
+    return OBS_PLAYERS + 3 * n_players
+
+def render_observation(obs: np.ndarray) -> list[str]:
+    "The context UnoServer.build_context would show for an observation (see observe)."
+    n_players = (len(obs) - OBS_PLAYERS) // 3
+    seats, sizes, shields = obs[OBS_PLAYERS:].reshape(3, n_players).tolist()
+    top = int(obs[OBS_TOP])
+
+    messages = []
+    if obs[OBS_MUST_DRAW]:
+        messages.append(f"You must draw {obs[OBS_MUST_DRAW]} card(s)")
+    if KIND_IS_WILD[top]:
+        messages.append(f"Chosen color: {color_str(int(obs[OBS_NEXT_COLOR]))}")
+    return render_context(
+        [KINDS[k] for k in np.repeat(np.arange(N_KINDS), obs[:N_KINDS])],
+        zip((s + 1 for s in seats), sizes, map(bool, shields)),
+        int(obs[OBS_DRAW_LEN]),
+        KINDS[top],
+        messages
+    )
+
+
+class VecUnoServer:
+    def __init__(
+        self, n_games: int, n_players: int, player_starting_hand: int = 7,
+        uno_penalty: int = 7, seed: int | None = None
+    ):
+        """Manages many games of Uno at once.
+
+        Args:
+            n_games (int): How many games to play in lockstep.
+            n_players (int): Players per game. Seat order is starting order.
+            player_starting_hand (int, optional): How many cards to deal to players
+                at game start. Defaults to 7.
+            uno_penalty (int, optional): How many cards a player needs to draw if they
+                caught with one card while unshielded. Defaults to 7.
+            seed (int, optional): Seed for shuffling.
+        """
+        if player_starting_hand * n_players >= len(STANDARD_KINDS):
+            raise ValueError("Not enough cards to deal that many hands.")
+
+        self.n_games = n_games
+        self.n_players = n_players
+        self.player_starting_hand = player_starting_hand
+        self.uno_penalty = uno_penalty
+        self.rng = np.random.default_rng(seed)
+        self._games = np.arange(n_games)
+
+        n, p = n_games, n_players
+        self.hands = np.zeros((n, p, N_KINDS), dtype=np.int16)
+        self.hand_sizes = np.zeros((n, p), dtype=np.int16)
+        self.is_shielded = np.zeros((n, p), dtype=bool)
+
+        # draw pile is a stack. cards are drawn from draw_pile[g, draw_len[g]-1]
+        self.draw_pile = np.zeros((n, len(STANDARD_KINDS)), dtype=np.int8)
+        self.draw_len = np.zeros(n, dtype=np.int16)
+        # discard pile minus the top card. order never matters since it is shuffled.
+        self.discard = np.zeros((n, N_KINDS), dtype=np.int16)
+        self.top = np.zeros(n, dtype=np.int8)
+
+        self.next_color = np.zeros(n, dtype=np.int8)
+        self.direction = np.ones(n, dtype=np.int8)
+        self.current = np.zeros(n, dtype=np.int8)
+        self.must_draw_count = np.zeros(n, dtype=np.int16)
+
+        self.playing = np.zeros(n, dtype=bool)
+        self.winner = np.full(n, -1, dtype=np.int8)
+
+        self.reset()
+
+    def reset(self, decks: np.ndarray | None = None):
+        """Starts a fresh game in every slot.
+
+        Args:
+            decks (np.ndarray, optional): (n_games, 108) card kinds in draw order,
+                last card is drawn first. Shuffled standard decks if not given.
+        """
+        n, p = self.n_games, self.n_players
+        if decks is None:
+            decks = self.rng.permuted(np.tile(STANDARD_KINDS, (n, 1)), axis=1)
+
+        self.hands[:] = 0
+        self.is_shielded[:] = False
+        self.discard[:] = 0
+        self.direction[:] = 1
+        self.current[:] = 0
+        self.must_draw_count[:] = 0
+        self.playing[:] = True
+        self.winner[:] = -1
+
+        # same order as UnoServer: flip the top card, then deal one card at a time.
+        self.draw_pile[:] = decks
+        self.top[:] = decks[:, -1]
+        n_dealt = self.player_starting_hand * p
+        dealt = decks[:, ::-1][:, 1:1 + n_dealt]
+        seats = np.broadcast_to(np.arange(n_dealt) % p, dealt.shape)
+        np.add.at(self.hands, (self._games[:, None], seats, dealt), 1)
+        self.hand_sizes[:] = self.player_starting_hand
+        self.draw_len[:] = len(STANDARD_KINDS) - 1 - n_dealt
+
+        # resolve the top card. resolving iterates the next player at least once so undo.
+        self._resolve(self._games, self.top.copy(), KIND_COLOR[self.top])
+        self.current[:] = (self.current - self.direction) % p
+
+    def step(self, actions: np.ndarray, seats: np.ndarray | None = None) -> np.ndarray:
+        """Applies one action to every game.
+
+        Args:
+            actions (np.ndarray): (n_games,) action ids.
+            seats (np.ndarray, optional): (n_games,) who is acting in each game.
+                Defaults to whoever's turn it is.
+
+        Returns:
+            np.ndarray: (n_games,) status of each action.
+        """
+        actions = np.asarray(actions)
+        seats = self.current.copy() if seats is None else np.asarray(seats)
+        status = np.full(self.n_games, OK, dtype=np.int8)
+        status[~self.playing] = GAME_OVER
+
+        live = self.playing.copy()
+        bad = live & ((actions < 0) | (actions >= N_ACTIONS))
+        status[bad] = INVALID_REQUEST
+
+        play = live & ~bad & (actions < ACTION_DRAW)
+        if play.any():
+            g = self._games[play]
+            status[g] = self._play(g, seats[play], actions[play])
+
+        draw = live & (actions == ACTION_DRAW)
+        if draw.any():
+            g = self._games[draw]
+            status[g] = self._draw_card(g, seats[draw])
+
+        uno = live & (actions == ACTION_UNO)
+        if uno.any():
+            self._yell_uno(self._games[uno], seats[uno])
+
+        return status
+
+    def legal_mask(self, seats: np.ndarray | None = None) -> np.ndarray:
+        """Which actions would do something without being rejected.
+
+        Yell UNO is only legal when it would shield the player or catch somebody.
+        Do nothing is always legal while the game is on.
+
+        Args:
+            seats (np.ndarray, optional): (n_games,) whose actions to list.
+                Defaults to whoever's turn it is.
+
+        Returns:
+            np.ndarray: (n_games, N_ACTIONS) bool mask.
+        """
+        g = self._games
+        seats = self.current if seats is None else np.asarray(seats)
+        mask = np.zeros((self.n_games, N_ACTIONS), dtype=bool)
+
+        can_play = (seats == self.current) & (self.must_draw_count == 0)
+        held = self.hands[g, seats][:, ACTION_KIND] > 0
+        fits = PLAYABLE[
+            ACTION_KIND[None, :], self.top[:, None], self.next_color[:, None]
+        ]
+        mask[:, :ACTION_DRAW] = held & fits & can_play[:, None]
+
+        mask[:, ACTION_DRAW] = (seats == self.current) & self._cards_left(g)
+        # players holding one card shield themselves rather than catching anybody.
+        mask[:, ACTION_UNO] = self._would_shield(g, seats) | (
+            (self.hand_sizes[g, seats] != 1) & (self._catch_target(g, seats) >= 0)
+        )
+        mask[:, ACTION_NOTHING] = True
+        mask[~self.playing] = False
+        return mask
+
+    def observe(self, seats: np.ndarray | None = None) -> np.ndarray:
+        """What every game shows a seat, see the observation layout above.
+
+        Args:
+            seats (np.ndarray, optional): (n_games,) who is looking. Defaults to
+                whoever's turn it is.
+
+        Returns:
+            np.ndarray: (n_games, obs_size(n_players)) int16.
+        """
+        g = self._games
+        seats = self.current if seats is None else np.asarray(seats)
+        is_turn = seats == self.current
+        order = (
+            self.current[:, None].astype(np.int64)
+            + np.arange(self.n_players)[None, :] * self.direction[:, None]
+        ) % self.n_players
+        return np.concatenate([
+            self.hands[g, seats],
+            np.column_stack([
+                self.top, self.next_color, np.where(is_turn, self.must_draw_count, 0),
+                is_turn, self.draw_len
+            ]),
+            order,
+            self.hand_sizes[g[:, None], order],
+            self.is_shielded[g[:, None], order],
+        ], axis=1).astype(np.int16)
+
+    def hand(self, game: int, seat: int) -> list[str]:
+        "The hand of a seat as card strings."
+        counts = self.hands[game, seat]
+        return [KINDS[k] for k in np.repeat(np.arange(N_KINDS), counts)]
+
+    def _play(self, g: np.ndarray, s: np.ndarray, a: np.ndarray) -> np.ndarray:
+        kinds = ACTION_KIND[a]
+        status = np.full(len(g), OK, dtype=np.int8)
+
+        # same order of checks as Player.take_action then UnoServer.play_card
+        held = self.hands[g, s, kinds] > 0
+        turn = s == self.current[g]
+        fits = PLAYABLE[kinds, self.top[g], self.next_color[g]]
+        drawing = self.must_draw_count[g] > 0
+
+        status[~held] = NOT_IN_HAND
+        status[held & ~turn] = NOT_YOUR_TURN
+        status[held & turn & ~fits] = INVALID_CARD
+        status[held & turn & fits & drawing] = MUST_DRAW
+
+        ok = status == OK
+        g, s, kinds, a = g[ok], s[ok], kinds[ok], a[ok]
+        self.hands[g, s, kinds] -= 1
+        self.hand_sizes[g, s] -= 1
+
+        # if player has no cards, they win!
+        won = self.hand_sizes[g, s] == 0
+        self.playing[g[won]] = False
+        self.winner[g[won]] = s[won]
+
+        g, kinds, a = g[~won], kinds[~won], a[~won]
+        self._resolve(g, kinds, ACTION_COLOR[a])
+        self.discard[g, self.top[g]] += 1
+        self.top[g] = kinds
+        return status
+
+    def _resolve(self, g: np.ndarray, kinds: np.ndarray, colors: np.ndarray):
+        "Mirrors UnoServer.resolve. colors is the chosen color for wild cards."
+        v = KIND_VALUE[kinds]
+        d = np.where(v == REVERSE, -self.direction[g], self.direction[g])
+        self.direction[g] = d
+        step = np.where(v == SKIP, 2, 1)
+        self.current[g] = (self.current[g] + step * d) % self.n_players
+        self.must_draw_count[g] += np.where(
+            v == DRAW_TWO, 2, np.where(v == DRAW_FOUR, 4, 0)
+        ).astype(np.int16)
+        self.next_color[g] = np.where(KIND_IS_WILD[kinds], colors, KIND_COLOR[kinds])
+
+    def _draw_card(self, g: np.ndarray, s: np.ndarray) -> np.ndarray:
+        "Mirrors UnoServer.draw"
+        status = np.full(len(g), OK, dtype=np.int8)
+        status[s != self.current[g]] = NOT_YOUR_TURN
+        status[(status == OK) & ~self._cards_left(g)] = NO_CARDS
+
+        ok = status == OK
+        g, s = g[ok], s[ok]
+        self.must_draw_count[g] = np.maximum(0, self.must_draw_count[g] - 1)
+        self._deal(g, s)
+        return status
+
+    def _yell_uno(self, g: np.ndarray, s: np.ndarray):
+        "Mirrors UnoServer.yell_uno"
+        shield = self.hand_sizes[g, s] == 1
+        self.is_shielded[g[shield], s[shield]] = True
+
+        g, s = g[~shield], s[~shield]
+        target = self._catch_target(g, s)
+        caught = target >= 0
+        g, target = g[caught], target[caught]
+        for _ in range(self.uno_penalty):
+            got = self._deal(g, target)
+            g, target = g[got], target[got]
+
+    def _would_shield(self, g: np.ndarray, s: np.ndarray) -> np.ndarray:
+        return (self.hand_sizes[g, s] == 1) & ~self.is_shielded[g, s]
+
+    def _catch_target(self, g: np.ndarray, s: np.ndarray) -> np.ndarray:
+        """Seat that yelling UNO would catch, -1 if nobody. Players are checked in
+        turn order starting at the current player, like UnoServer.players.
+        """
+        order = (
+            self.current[g, None].astype(np.int64)
+            + np.arange(self.n_players)[None, :] * self.direction[g, None]
+        ) % self.n_players
+        rows = np.arange(len(g))[:, None]
+        exposed = (self.hand_sizes[g[:, None], order] == 1) \
+            & ~self.is_shielded[g[:, None], order] \
+            & (order != s[:, None])
+        first = exposed.argmax(axis=1)
+        return np.where(exposed.any(axis=1), order[rows[:, 0], first], -1)
+
+    def _cards_left(self, g: np.ndarray) -> np.ndarray:
+        return (self.draw_len[g] > 0) | (self.discard[g].sum(axis=1) > 0)
+
+    def _deal(self, g: np.ndarray, s: np.ndarray) -> np.ndarray:
+        """Moves one card from each game's draw pile into a hand, reshuffling the
+        discard pile first where needed. Returns which games had a card to give.
+        """
+        for game in g[self.draw_len[g] == 0]:
+            self._reshuffle(game)
+
+        got = self.draw_len[g] > 0
+        g, s = g[got], s[got]
+        self.draw_len[g] -= 1
+        kinds = self.draw_pile[g, self.draw_len[g]]
+        self.hands[g, s, kinds] += 1
+        self.hand_sizes[g, s] += 1
+        return got
+
+    def _reshuffle(self, game: int):
+        "The discard pile (except the top card) becomes the draw pile."
+        cards = np.repeat(np.arange(N_KINDS, dtype=np.int8), self.discard[game])
+        self.rng.shuffle(cards)
+        self.draw_pile[game, :len(cards)] = cards
+        self.draw_len[game] = len(cards)
+        self.discard[game] = 0